@@ -0,0 +1,117 @@
+"""算术求值基准：python -m bench.arith_bench
+
+对比原来的逐次解析 AST 求值（legacy）与 ArithEvaluator（编译缓存 + 开销上限）在大批量表达式上的吞吐，
+表达式按 --distinct 控制重复度（模型在多轮对话里经常重复同样的计算）；另外逐个计时病态表达式，
+确认它们在毫秒内被拒绝。legacy 对病态表达式没有上限，默认不运行，--legacy-pathological 时只运行规模较小的几个。
+"""
+import argparse
+import ast
+import operator as op
+import random
+import time
+
+from utils.arith_util import ArithEvaluator
+
+_LEGACY_OPS = {
+    ast.Add: op.add,
+    ast.Sub: op.sub,
+    ast.Mult: op.mul,
+    ast.Div: op.truediv,
+    ast.Pow: op.pow,
+    ast.Mod: op.mod,
+    ast.UAdd: op.pos,
+    ast.USub: op.neg,
+}
+
+PATHOLOGICAL = ["9**9**9", "10**10**10", "2**(2**64)", "(10**100)**(10**100)", "99999999**99999999",
+                "+".join(["1"] * 120), "1" + "*99999999" * 30]
+# legacy 能在可接受时间内算完的病态表达式
+LEGACY_PATHOLOGICAL = ["9**9**6", "7**1000000", "(10**5000)*(10**5000)"]
+
+
+def _legacy_eval(node):
+    if isinstance(node, ast.Expression):
+        return _legacy_eval(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _LEGACY_OPS:
+        return _LEGACY_OPS[type(node.op)](_legacy_eval(node.left), _legacy_eval(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _LEGACY_OPS:
+        return _LEGACY_OPS[type(node.op)](_legacy_eval(node.operand))
+    raise ValueError("仅支持数字与 + - * / ** % 及括号")
+
+
+def legacy_calculate(expression: str) -> str:
+    """改造前 learn/react/main.py 中的 calculate"""
+    try:
+        value = _legacy_eval(ast.parse(expression, mode="eval"))
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+    except Exception as e:
+        return f"计算错误: {e}"
+
+
+def make_expressions(count: int, distinct: int, seed: int = 0):
+    """生成价格、折扣、人数之类的常见算式，共 distinct 种，随机重复到 count 条"""
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"{rng.randint(1, 20)}*{rng.randint(10, 999)}",
+        lambda: f"({rng.randint(100, 5000)}+{rng.randint(100, 5000)})*{rng.choice([0.8, 0.85, 0.9, 0.95])}",
+        lambda: f"{rng.randint(1000, 20000)}/{rng.randint(2, 8)}",
+        lambda: f"{rng.randint(100, 999)}.{rng.randint(0, 99):02d}*{rng.randint(1, 9)}-{rng.randint(1, 99)}",
+        lambda: f"{rng.randint(2, 9)}**{rng.randint(2, 12)}%{rng.randint(3, 97)}",
+    ]
+    pool = [rng.choice(templates)() for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def run(fn, expressions) -> float:
+    started = time.perf_counter()
+    for expression in expressions:
+        fn(expression)
+    return time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--count", type=int, default=100000, help="每轮计算的表达式条数")
+    arg_parser.add_argument("--distinct", type=int, default=500, help="不同表达式的种数")
+    arg_parser.add_argument("--legacy-pathological", action="store_true")
+    args = arg_parser.parse_args()
+
+    expressions = make_expressions(args.count, args.distinct)
+    evaluators = {
+        "legacy": legacy_calculate,
+        "float": ArithEvaluator(cache_size=max(args.distinct, 1)).calculate,
+        "decimal": ArithEvaluator(decimal=True, cache_size=max(args.distinct, 1)).calculate,
+        "float_nocache": ArithEvaluator(cache_size=1).calculate,
+    }
+    print(f"{args.count} 条表达式，{args.distinct} 种")
+    print(f"{'evaluator':<16}{'total s':>10}{'us/expr':>10}{'speedup':>10}")
+    legacy_seconds = None
+    for name, fn in evaluators.items():
+        seconds = run(fn, expressions)
+        legacy_seconds = legacy_seconds or seconds
+        print(f"{name:<16}{seconds:>10.3f}{seconds / args.count * 1e6:>10.2f}{legacy_seconds / seconds:>10.2f}")
+
+    print("\n病态表达式（ArithEvaluator）")
+    evaluator = ArithEvaluator(decimal=True)
+    for expression in PATHOLOGICAL:
+        started = time.perf_counter()
+        try:
+            result = evaluator.calculate(expression)
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+        print(f"  {expression[:30]:<32}{(time.perf_counter() - started) * 1e3:>8.3f}ms  {result[:60]}")
+
+    if args.legacy_pathological:
+        print("\n病态表达式（legacy）")
+        for expression in LEGACY_PATHOLOGICAL:
+            started = time.perf_counter()
+            result = legacy_calculate(expression)
+            print(f"  {expression[:30]:<32}{(time.perf_counter() - started) * 1e3:>8.1f}ms  {result[:60]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""离线基准使用的确定性替身：按提示词模板返回预设输出的聊天模型和搜索工具，延迟可配置"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from pydantic import ConfigDict, Field, PrivateAttr
+
+# 通过提示词中的特征文本识别模板
+TEMPLATE_MARKERS = [
+    ("batch_summary_prompt", "summaries："),
+    ("route_prompt", "意图分类器"),
+    ("planner_prompt", "旅游规划专家"),
+    ("search_query_prompt", "搜索关键词生成器"),
+    ("reflect_prompt", "任务调度与反思"),
+    ("summary_prompt", "摘要生成器"),
+    ("history_summary_prompt", "执行记录压缩器"),
+]
+
+
+def detect_template(prompt: str) -> str:
+    for template_id, marker in TEMPLATE_MARKERS:
+        if marker in prompt:
+            return template_id
+    return "direct_answer_prompt"
+
+
+class Latency:
+    """对数正态延迟分布，由中位数和 p95（毫秒）确定；两者相等时为固定延迟"""
+
+    def __init__(self, median_ms: float = 0, p95_ms: float = None, seed: int = 0):
+        self.median = median_ms / 1000
+        p95 = (p95_ms if p95_ms is not None else median_ms) / 1000
+        self.sigma = math.log(p95 / self.median) / 1.645 if self.median > 0 and p95 > self.median else 0.0
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * self._random.gauss(0, 1))
+
+
+class ScriptedChatModel(BaseChatModel):
+    """按模板返回预设输出的聊天模型
+
+    script(template_id, prompt) 返回输出文本；latency 为首 token 延迟，chunk_ms 为流式输出时每个 chunk 的间隔。
+    calls 按模板统计调用次数。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    script: Any
+    latency: Latency = Field(default_factory=Latency)
+    chunk_size: int = 8
+    chunk_ms: float = 0
+    streaming: bool = True
+    model_name: str = "scripted"
+    temperature: float = 0.7
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def calls(self) -> Counter:
+        return self._calls
+
+    def _respond(self, messages) -> str:
+        prompt = str(messages[-1].content)
+        template_id = detect_template(prompt)
+        self._calls[template_id] += 1
+        return self.script(template_id, prompt)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        text = self._respond(messages)
+        time.sleep(self.latency.sample())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        text = self._respond(messages)
+        await asyncio.sleep(self.latency.sample())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        text = self._respond(messages)
+        await asyncio.sleep(self.latency.sample())
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.chunk_ms:
+                await asyncio.sleep(self.chunk_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + self.chunk_size]))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+_FACTS = [
+    "{q}开放时间为8:00-18:00，节假日延长至20:00，最晚入场时间为闭馆前一小时。",
+    "{q}门票旺季{n}元、淡季{m}元，学生和60岁以上老人凭证件半价。",
+    "从市区乘坐{k}路公交约40分钟可达{q}附近，自驾可停在东门停车场。",
+    "游客普遍认为{q}值得一去，建议预留半天时间，避开周末上午的人流高峰。",
+    "{q}周边有多家连锁酒店，工作日标间价格在{n}至{m}元之间。",
+    "当地特色小吃集中在{q}附近的老街，推荐水席、不翻汤和浆面条。",
+    "近期{q}一带天气以多云为主，最高气温{k}度，早晚温差较大。",
+    "{q}官方公众号提供实名预约，每日限流{m}人，需提前一天预约。",
+]
+
+
+def fake_search_result(query: str, n: int = 5, sentences: int = 4) -> dict:
+    """构造与 Tavily 返回结构一致的搜索结果，每条结果由若干不同事实句组成"""
+    results = []
+    for i in range(n):
+        facts = [_FACTS[(i * sentences + j) % len(_FACTS)].format(q=query, n=50 + i * 10, m=120 + i * 15, k=i + j + 3)
+                 for j in range(sentences)]
+        results.append({"url": f"https://example.com/{i}", "title": f"{query} - 来源{i + 1}",
+                        "content": "".join(facts), "score": round(1 - i * 0.1, 2), "raw_content": None})
+    return {"query": query, "answer": None, "images": [], "results": results, "response_time": 0.5}
+
+
+class ScriptedSearchTool(BaseTool):
+    """替代 TavilySearch 的搜索工具，返回构造的搜索结果；fail_rate 控制随机失败的比例"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = "tavily_search"
+    description: str = "scripted search"
+    latency: Latency = Field(default_factory=Latency)
+    fail_rate: float = 0.0
+    sentences: int = 4
+    seed: int = 0
+    _calls: int = PrivateAttr(default=0)
+    _random: Any = PrivateAttr(default=None)
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _result(self, query: str) -> dict:
+        self._calls += 1
+        if self._random is None:
+            self._random = random.Random(self.seed)
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise RuntimeError("scripted search failure")
+        return fake_search_result(query, sentences=self.sentences)
+
+    def _run(self, query: str, run_manager=None) -> dict:
+        time.sleep(self.latency.sample())
+        return self._result(query)
+
+    async def _arun(self, query: str, run_manager=None) -> dict:
+        await asyncio.sleep(self.latency.sample())
+        return self._result(query)
+
+
+def current_plan_tasks(prompt: str) -> List[str]:
+    """从 reflect_prompt 的“当前计划”中取出剩余步骤"""
+    section = prompt.split("当前计划：", 1)[-1]
+    return [m.group(1).strip() for m in re.finditer(r"^\s*\d+\.\s*(.+)$", section, flags=re.MULTILINE)]
+
+
+def dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False)
+
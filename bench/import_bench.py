@@ -0,0 +1,53 @@
+"""启动导入耗时基准：python -m bench.import_bench graph.config graph.workflow
+
+在新的解释器中用 -X importtime 导入指定模块，解析 stderr 得到每个模块的自身耗时和累计耗时，
+报告多次运行中累计耗时的最小值和中位数，以及自身耗时最高的模块，便于找出拖慢启动的依赖。
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def import_times(module: str) -> dict:
+    """在新进程中导入 module，返回 {模块名: (自身耗时 us, 累计耗时 us)}"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            times.setdefault(match.group(4), (int(match.group(1)), int(match.group(2))))
+    return times
+
+
+def measure(module: str, repeats: int = 3):
+    """返回 (每次运行的累计耗时 ms 列表, 最后一次运行的明细)"""
+    runs, times = [], {}
+    for _ in range(repeats):
+        times = import_times(module)
+        runs.append(times[module][1] / 1000)
+    return runs, times
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("modules", nargs="*", default=["graph.config", "graph.workflow"])
+    arg_parser.add_argument("--repeats", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=10, help="列出自身耗时最高的前 N 个模块")
+    args = arg_parser.parse_args()
+
+    for module in args.modules:
+        runs, times = measure(module, args.repeats)
+        print(f"== {module}  min {min(runs):.1f}ms  median {statistics.median(runs):.1f}ms  {len(times)} modules")
+        for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+            print(f"   {name:<50}{self_us / 1000:>9.1f}ms{cumulative_us / 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
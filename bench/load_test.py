@@ -0,0 +1,199 @@
+"""并发压测：python -m bench.load_test --ramp 1,8,32
+
+在 Postgres 检查点（AsyncPostgresSaver + AsyncConnectionPool）上并发运行多轮对话，
+逐级提高并发数，每级报告吞吐、单轮对话耗时 p50/p95/p99、连接池等待时间和检查点写入耗时，
+用于上线前确定连接池大小和每个进程承载的会话数。
+默认使用 bench.fakes 中的替身模型和搜索，只需要本地 Postgres（POSTGRES_URI 或 --db-uri）；
+--memory 改用 InMemorySaver，不连接数据库，用于验证脚本本身。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+
+os.environ["INTENT_LOG_PATH"] = ""
+os.environ["METRICS_TRACE_PATH"] = ""
+
+from langgraph.checkpoint.memory import InMemorySaver  # noqa: E402
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver  # noqa: E402
+from langgraph.store.postgres.aio import AsyncPostgresStore  # noqa: E402
+from psycopg.rows import dict_row  # noqa: E402
+from psycopg_pool import AsyncConnectionPool  # noqa: E402
+
+from bench.fakes import Latency, ScriptedChatModel, ScriptedSearchTool  # noqa: E402
+from bench.run_bench import percentile, reset_state  # noqa: E402
+from bench.scenarios import FOLLOW_UP_SCENARIOS, SCENARIOS, make_script  # noqa: E402
+from graph.config import DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, set_llm, set_tavily  # noqa: E402
+from graph.db import ensure_schema  # noqa: E402
+from graph.instrumentation import metrics_handler  # noqa: E402
+from graph.streaming import astream_answer  # noqa: E402
+from graph.workflow import get_app  # noqa: E402
+from utils.logger_util import logger  # noqa: E402
+
+
+def timed_method(obj, method: str, samples: list):
+    """替换实例上的异步方法，把每次调用耗时追加到 samples"""
+    original = getattr(obj, method)
+
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    setattr(obj, method, wrapper)
+
+
+def quantiles(values) -> dict:
+    return {f"p{q}_ms": round(percentile(values, q) * 1000, 2) for q in (50, 95, 99)}
+
+
+async def run_conversation_turns(app, questions, samples) -> bool:
+    """在同一个 thread_id 上依次运行多轮对话，记录每轮耗时；任一轮失败返回 False"""
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}, "callbacks": [metrics_handler]}
+    for question in questions:
+        started = time.perf_counter()
+        try:
+            # 追问时清空上一轮的回答，其余状态（执行记录等）沿用检查点中的值
+            async for event in astream_answer(app, {"question": question, "response": ""}, config):
+                if event["type"] == "done" and not event["response"]:
+                    samples["unanswered"].append(1)
+        except Exception as e:
+            logger.error(f"压测会话 {config['configurable']['thread_id']} 失败：{e}")
+            samples["errors"].append(1)
+            return False
+        samples["turn"].append(time.perf_counter() - started)
+    return True
+
+
+async def run_step(app, concurrency: int, conversations, samples, pool) -> dict:
+    """以固定并发数跑完一批会话，返回本级的统计结果"""
+    for values in samples.values():
+        values.clear()
+    if pool is not None:
+        pool.pop_stats()  # 清零上一级的连接池计数
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(questions):
+        async with semaphore:
+            return await run_conversation_turns(app, questions, samples)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_run(questions) for questions in conversations))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "concurrency": concurrency,
+        "conversations": len(conversations),
+        "failed": results.count(False),
+        "unanswered_turns": len(samples["unanswered"]),
+        "elapsed_s": round(elapsed, 3),
+        "conversations_per_s": round(results.count(True) / elapsed, 2),
+        "turns_per_s": round(len(samples["turn"]) / elapsed, 2),
+        "turn": quantiles(samples["turn"]),
+        "pool_wait": quantiles(samples["pool_wait"]),
+        "checkpoint_put": quantiles(samples["aput"]),
+        "checkpoint_put_writes": quantiles(samples["aput_writes"]),
+    }
+    if pool is not None:
+        stats = pool.pop_stats()
+        report["pool"] = {key: stats.get(key, 0) for key in
+                          ("pool_size", "pool_available", "requests_waiting", "requests_num", "requests_queued",
+                           "requests_wait_ms", "requests_errors", "connections_errors")}
+    return report
+
+
+def build_conversations(count: int, follow_up_rate: float, rng: random.Random):
+    """按场景轮流生成会话，每个会话以 follow_up_rate 的概率带上该场景的追问"""
+    conversations = []
+    for i in range(count):
+        scenario = SCENARIOS[i % len(SCENARIOS)]
+        questions = [scenario.question]
+        if scenario.follow_ups and rng.random() < follow_up_rate:
+            questions += scenario.follow_ups
+        conversations.append(questions)
+    return conversations
+
+
+def print_step(report: dict):
+    def fmt(q):
+        return f"{q['p50_ms']:>9.1f}{q['p95_ms']:>8.1f}{q['p99_ms']:>8.1f}"
+
+    print(f"{report['concurrency']:>5}{report['conversations_per_s']:>9.2f}{report['turns_per_s']:>9.2f}"
+          f"{fmt(report['turn'])}{fmt(report['pool_wait'])}{fmt(report['checkpoint_put'])}"
+          f"{fmt(report['checkpoint_put_writes'])}{report['failed']:>7}{report['unanswered_turns']:>11}")
+
+
+async def load_test(args, checkpointer, pool=None):
+    samples = defaultdict(list)
+    timed_method(checkpointer, "aput", samples["aput"])
+    timed_method(checkpointer, "aput_writes", samples["aput_writes"])
+    if pool is not None:
+        timed_method(pool, "getconn", samples["pool_wait"])
+    app = get_app(checkpointer)
+
+    rng = random.Random(args.seed)
+    columns = "".join(f"{f'{name} p50':>9}{'p95':>8}{'p99':>8}" for name in ("turn", "pool", "put", "wrt"))
+    print(f"{'conc':>5}{'conv/s':>9}{'turn/s':>9}{columns}{'failed':>7}{'unanswered':>11}  (ms)")
+    reports = []
+    for concurrency in args.ramp:
+        reset_state(args.warm_cache)
+        count = max(args.conversations_per_step, concurrency)
+        report = await run_step(app, concurrency, build_conversations(count, args.follow_up_rate, rng), samples, pool)
+        print_step(report)
+        reports.append(report)
+    return reports
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--db-uri", default=os.getenv("POSTGRES_URI"))
+    arg_parser.add_argument("--memory", action="store_true", help="使用 InMemorySaver，不连接数据库")
+    arg_parser.add_argument("--ramp", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16, 32],
+                            help="逐级并发数，逗号分隔")
+    arg_parser.add_argument("--conversations-per-step", type=int, default=32, help="每级运行的会话数（不少于并发数）")
+    arg_parser.add_argument("--follow-up-rate", type=float, default=0.5, help="带追问的会话比例")
+    arg_parser.add_argument("--pool-min", type=int, default=DB_POOL_MIN_SIZE)
+    arg_parser.add_argument("--pool-max", type=int, default=DB_POOL_MAX_SIZE)
+    arg_parser.add_argument("--pool-timeout", type=float, default=DB_POOL_TIMEOUT, help="获取连接的超时时间（秒）")
+    arg_parser.add_argument("--real-backends", action="store_true", help="使用真实的 DeepSeek 和 Tavily（会产生费用）")
+    arg_parser.add_argument("--llm-latency", type=float, nargs=2, default=[40, 120], metavar=("P50", "P95"))
+    arg_parser.add_argument("--chunk-ms", type=float, default=2)
+    arg_parser.add_argument("--search-latency", type=float, nargs=2, default=[60, 200], metavar=("P50", "P95"))
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--warm-cache", action="store_true", help="各级之间不清空大模型和搜索缓存")
+    arg_parser.add_argument("--json", help="把各级结果写入该文件")
+    arg_parser.add_argument("--verbose", action="store_true", help="保留 graph 的日志输出")
+    args = arg_parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+    if not args.real_backends:
+        llm = ScriptedChatModel(script=make_script(SCENARIOS + FOLLOW_UP_SCENARIOS),
+                                latency=Latency(*args.llm_latency, seed=args.seed), chunk_ms=args.chunk_ms)
+        set_llm(llm)
+        set_tavily(ScriptedSearchTool(latency=Latency(*args.search_latency, seed=args.seed + 1)))
+
+    if args.memory:
+        reports = await load_test(args, InMemorySaver())
+    else:
+        connection_kwargs = {"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row}
+        async with AsyncConnectionPool(args.db_uri, min_size=args.pool_min, max_size=args.pool_max,
+                                       timeout=args.pool_timeout, kwargs=connection_kwargs, open=False) as pool:
+            await pool.wait()
+            checkpointer = AsyncPostgresSaver(pool)
+            await ensure_schema(pool, checkpointer, AsyncPostgresStore(pool))
+            reports = await load_test(args, checkpointer, pool)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
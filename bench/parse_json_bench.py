@@ -0,0 +1,67 @@
+"""流式 JSON 解析基准：python -m bench.parse_json_bench
+
+对语料库中的每条规划输出模拟逐 chunk 流式到达，统计首个步骤在第几个 chunk 可用（相对整段输出结束提前多少），
+并对比 JsonArrayStream 与 parse_llm_json 的解析耗时。
+"""
+import argparse
+import json
+import os
+import time
+
+from utils.parse_llm_json_util import JsonArrayStream, parse_llm_json
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "planner_outputs.jsonl")
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_step_chunk(text: str, chunk_size: int):
+    """返回 (首个步骤可用时的 chunk 序号, 总 chunk 数)，没有步骤时序号为 None"""
+    parser = JsonArrayStream("steps")
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    for n, chunk in enumerate(chunks, 1):
+        if parser.feed(chunk):
+            return n, len(chunks)
+    return None, len(chunks)
+
+
+def time_it(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--chunk-size", type=int, default=4, help="每个流式 chunk 的字符数")
+    arg_parser.add_argument("--rounds", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    print(f"{'case':<28}{'first/total chunks':>20}{'saved':>8}{'stream us':>12}{'full us':>10}")
+    for case in load_corpus():
+        text = case["text"]
+        first, total = first_step_chunk(text, args.chunk_size)
+        saved = f"{1 - first / total:.0%}" if first else "-"
+
+        def run_stream():
+            parser = JsonArrayStream("steps")
+            for i in range(0, len(text), args.chunk_size):
+                parser.feed(text[i:i + args.chunk_size])
+
+        def run_full():
+            try:
+                parse_llm_json(text)
+            except ValueError:
+                pass
+
+        stream_us = time_it(run_stream, args.rounds)
+        full_us = time_it(run_full, args.rounds)
+        print(f"{case['name']:<28}{f'{first}/{total}':>20}{saved:>8}{stream_us:>12.1f}{full_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
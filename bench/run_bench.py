@@ -0,0 +1,220 @@
+"""离线基准：python -m bench.run_bench
+
+用 bench.fakes 中的替身替换 DeepSeek 和 Tavily，在无网络环境下运行编译后的 workflow，
+按场景统计端到端耗时、首 token 耗时、各节点耗时及各模板的大模型调用次数。
+--json 保存结果（可作为基线），--baseline 与基线对比，耗时或调用次数超出容忍范围时以非零状态码退出。
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+# 基准运行不写路由日志和追踪文件
+os.environ["INTENT_LOG_PATH"] = ""
+os.environ["METRICS_TRACE_PATH"] = ""
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langgraph.checkpoint.memory import InMemorySaver  # noqa: E402
+
+import graph.nodes  # noqa: E402
+from bench.fakes import Latency, ScriptedChatModel, ScriptedSearchTool  # noqa: E402
+from bench.scenarios import SCENARIOS, make_script  # noqa: E402
+from graph.config import set_llm, set_tavily  # noqa: E402
+from graph.context import history_context  # noqa: E402
+from graph.hedge import HedgedChatModel  # noqa: E402
+from graph.instrumentation import metrics_handler  # noqa: E402
+from graph.intent import IntentClassifier  # noqa: E402
+from graph.llm_cache import llm_cache  # noqa: E402
+from graph.search_cache import search_cache  # noqa: E402
+from graph.step_reuse import step_result_cache  # noqa: E402
+from graph.streaming import astream_answer  # noqa: E402
+from graph.workflow import get_app  # noqa: E402
+from utils.logger_util import logger  # noqa: E402
+
+
+class NodeTimer(BaseCallbackHandler):
+    """按节点名收集每次执行的耗时（秒）"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self.durations = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def _finish(self, run_id):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, at = started
+                self.durations[node].append(time.perf_counter() - at)
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(values) -> dict:
+    return {"count": len(values), "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0}
+
+
+def reset_state(warm_cache: bool):
+    """每个场景从相同的初始状态开始，避免上一个场景的缓存和分类器训练影响结果；同一场景的多次对话之间共享缓存"""
+    graph.nodes.intent_classifier = IntentClassifier(log_path="")
+    if not warm_cache:
+        llm_cache.invalidate()
+        if search_cache is not None:
+            search_cache.clear()
+        if step_result_cache is not None:
+            step_result_cache.clear()
+        history_context.clear()
+
+
+async def run_once(app, question: str, timer: NodeTimer) -> dict:
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}, "callbacks": [metrics_handler, timer]}
+    started = time.perf_counter()
+    done = {}
+    async for event in astream_answer(app, {"question": question}, config):
+        if event["type"] == "done":
+            done = event
+    return {"e2e": time.perf_counter() - started, "ttft": done.get("ttft"), "answered": bool(done.get("response"))}
+
+
+async def run_scenario(app, scenario, llm, search_tool, repeats: int, concurrency: int, warm_cache: bool) -> dict:
+    reset_state(warm_cache)
+    timer = NodeTimer()
+    llm_calls_before, search_calls_before = Counter(llm.calls), search_tool.calls
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run():
+        async with semaphore:
+            return await run_once(app, scenario.question, timer)
+
+    runs = await asyncio.gather(*(_run() for _ in range(repeats)))
+    llm_calls = Counter(llm.calls)
+    llm_calls.subtract(llm_calls_before)
+    return {
+        "e2e": summarize([r["e2e"] for r in runs]),
+        "ttft": summarize([r["ttft"] for r in runs if r["ttft"] is not None]),
+        "answered": sum(r["answered"] for r in runs),
+        "nodes": {node: summarize(values) for node, values in sorted(timer.durations.items())},
+        # 每次对话的平均调用次数，替身输出是确定的，正常情况下为整数
+        "llm_calls": {k: v / repeats for k, v in sorted(llm_calls.items()) if v},
+        "search_calls": (search_tool.calls - search_calls_before) / repeats,
+    }
+
+
+def print_report(results: dict):
+    for name, result in results.items():
+        e2e, ttft = result["e2e"], result["ttft"]
+        print(f"\n== {name}  e2e p50 {e2e['p50_ms']}ms p95 {e2e['p95_ms']}ms  ttft p50 {ttft['p50_ms']}ms  "
+              f"answered {result['answered']}/{e2e['count']}  search {result['search_calls']:g}")
+        print("   llm calls: " + ", ".join(f"{k}={v:g}" for k, v in result["llm_calls"].items()))
+        for node, stats in result["nodes"].items():
+            print(f"   {node:<16}{stats['count']:>6} runs  p50 {stats['p50_ms']:>9}ms  p95 {stats['p95_ms']:>9}ms")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """与基线对比，返回回退项：端到端 p50/p95 变慢超过 tolerance，或任一模板调用次数增加"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            now, before = result["e2e"][key], base["e2e"][key]
+            if before and now > before * (1 + tolerance):
+                regressions.append(f"{name}: e2e {key} {before} -> {now}")
+        for template, count in result["llm_calls"].items():
+            before = base["llm_calls"].get(template, 0)
+            if count > before:
+                regressions.append(f"{name}: {template} 调用次数 {before:g} -> {count:g}")
+        if result["answered"] < base["answered"]:
+            regressions.append(f"{name}: 有回答的对话数 {base['answered']} -> {result['answered']}")
+    return regressions
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--scenario", action="append", help="只运行指定场景，可重复")
+    arg_parser.add_argument("--repeats", type=int, default=5, help="每个场景运行的对话数")
+    arg_parser.add_argument("--concurrency", type=int, default=1, help="同一场景并发运行的对话数")
+    arg_parser.add_argument("--llm-latency", type=float, nargs=2, default=[40, 120], metavar=("P50", "P95"),
+                            help="大模型首 token 延迟（毫秒）")
+    arg_parser.add_argument("--chunk-ms", type=float, default=2, help="大模型流式输出每个 chunk 的间隔（毫秒）")
+    arg_parser.add_argument("--search-latency", type=float, nargs=2, default=[60, 200], metavar=("P50", "P95"),
+                            help="搜索延迟（毫秒）")
+    arg_parser.add_argument("--hedge-nodes", help="开启对冲请求的节点（逗号分隔），默认不对冲")
+    arg_parser.add_argument("--search-fail-rate", type=float, default=0.0)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--warm-cache", action="store_true", help="场景之间不清空大模型和搜索缓存")
+    arg_parser.add_argument("--json", help="把结果写入该文件")
+    arg_parser.add_argument("--baseline", help="与该基线结果文件对比")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="耗时允许变慢的比例")
+    arg_parser.add_argument("--verbose", action="store_true", help="保留 graph 的日志输出")
+    args = arg_parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    llm = ScriptedChatModel(script=make_script(SCENARIOS), latency=Latency(*args.llm_latency, seed=args.seed),
+                            chunk_ms=args.chunk_ms)
+    search_tool = ScriptedSearchTool(latency=Latency(*args.search_latency, seed=args.seed + 1),
+                                     fail_rate=args.search_fail_rate, seed=args.seed)
+    hedged = None
+    if args.hedge_nodes:
+        hedged = HedgedChatModel(inner=llm, nodes={n.strip() for n in args.hedge_nodes.split(",")}, streaming=True)
+    set_llm(hedged or llm)
+    set_tavily(search_tool)
+    app = get_app(InMemorySaver())
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = await run_scenario(app, scenario, llm, search_tool, args.repeats, args.concurrency,
+                                                    args.warm_cache)
+    print_report(results)
+    if hedged is not None:
+        print("\n对冲请求：" + ", ".join(f"{node} {stats}" for node, stats in hedged.stats().items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n性能回退：")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n与基线相比无回退")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""基准场景：每个场景给出用户问题，以及路由、规划、反思、直接回答各模板的预设输出"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bench.fakes import current_plan_tasks, dumps
+
+
+def step(task: str, depends_on=(), query: str = None) -> dict:
+    return {"task": task, "depends_on": list(depends_on), "query": query if query is not None else task}
+
+
+@dataclass
+class Scenario:
+    """route 为 None 表示由本地意图分类器直接决定，不会调用路由模型
+
+    replans：已完成步骤数 -> 反思时追加的新步骤；malformed：需要输出畸形 JSON 的模板 id；
+    follow_ups：在同一 thread_id 上继续追问的问题，对应的场景定义在 FOLLOW_UP_SCENARIOS 中
+    """
+    name: str
+    question: str
+    route: Optional[str] = "planner"
+    steps: List[dict] = field(default_factory=list)
+    replans: Dict[int, List[dict]] = field(default_factory=dict)
+    malformed: set = field(default_factory=set)
+    follow_ups: List[str] = field(default_factory=list)
+    answer: str = "根据查询结果，为您整理如下：\n\n- 行程安排合理，注意提前预约。\n- 祝您旅途愉快！"
+
+
+def _malform(text: str) -> str:
+    """包上 Markdown 代码块并在前后加说明文字，模型常见的不规范输出"""
+    return f"好的，结果如下：\n```json\n{text}\n```\n以上。"
+
+
+def _search_query(prompt: str) -> str:
+    task = prompt.rsplit("## 任务", 1)[-1].strip()
+    return " ".join(re.findall(r"[\u4e00-\u9fff]{2,4}", task)[:3]) or task
+
+
+def _summary(prompt: str) -> str:
+    source = prompt.split("## 输入", 1)[-1].strip()
+    return dumps({"summary": source[:120]})
+
+
+def _batch_summary(prompt: str) -> str:
+    count = int(re.search(r"长度必须为 (\d+)", prompt).group(1))
+    return dumps({"summaries": [f"第{i + 1}份原文摘要：开放时间8:00-18:00，旺季门票约90元，学生半价，市区乘公交约40分钟可达。"
+                                for i in range(count)]})
+
+
+def _task_deps(steps: List[dict]) -> Dict[str, List[str]]:
+    """步骤 -> 其依赖的步骤内容，用于在重新编号后的计划中还原依赖关系"""
+    return {s["task"]: [steps[d]["task"] for d in s["depends_on"]] for s in steps}
+
+
+def _reflect(scenario: Scenario, prompt: str) -> str:
+    done = prompt.count("已完成步骤：")
+    tasks = current_plan_tasks(prompt)
+    deps = _task_deps(scenario.steps)
+    extra = scenario.replans.get(done) or []
+    if extra:
+        deps.update(_task_deps(extra))
+        tasks += [s["task"] for s in extra]
+    if not tasks:
+        return dumps({"response": scenario.answer, "next_plan": []})
+    # 保留剩余计划并追加新步骤，依赖序号按 next_plan 重新编号，已完成的依赖不再列出
+    plan = [{"task": task, "depends_on": [tasks.index(d) for d in deps.get(task, []) if d in tasks]}
+            for task in tasks]
+    return dumps({"response": "", "next_plan": plan})
+
+
+def make_script(scenarios: List[Scenario]):
+    """返回供 ScriptedChatModel 使用的 script(template_id, prompt)；按提示词中的问题原文匹配场景"""
+
+    def script(template_id: str, prompt: str) -> str:
+        if template_id == "search_query_prompt":
+            return _search_query(prompt)
+        if template_id in ("summary_prompt", "history_summary_prompt"):
+            return _summary(prompt)
+        if template_id == "batch_summary_prompt":
+            return _batch_summary(prompt)
+
+        # 模板本身可能包含较短的问题原文（如“你好”），取匹配到的最长问题
+        scenario = max((s for s in scenarios if s.question in prompt), key=lambda s: len(s.question), default=None)
+        if scenario is None:
+            return scenarios[0].answer if template_id == "direct_answer_prompt" else "{}"
+        if template_id == "route_prompt":
+            text = dumps({"route": scenario.route or "planner"})
+        elif template_id == "planner_prompt":
+            text = dumps({"steps": scenario.steps})
+        elif template_id == "reflect_prompt":
+            text = _reflect(scenario, prompt)
+        else:
+            return scenario.answer
+        return _malform(text) if template_id in scenario.malformed else text
+
+    return script
+
+
+SCENARIOS = [
+    Scenario(
+        name="chitchat",
+        question="你好",
+        route=None,
+        answer="你好！我是你的旅行助手，有什么可以帮你的吗？",
+    ),
+    Scenario(
+        name="direct_llm_routed",
+        question="为什么秋天的树叶会变黄",
+        route="direct_answer",
+        answer="秋天气温降低、日照变短，叶绿素分解速度快于合成，叶片中原本被掩盖的叶黄素和胡萝卜素显现出来，所以树叶变黄。",
+    ),
+    Scenario(
+        name="short_plan",
+        question="帮我查一下洛阳明天的天气",
+        steps=[step("查询洛阳明天天气", query="洛阳 明天 天气"),
+               step("查询洛阳明天空气质量", query="洛阳 空气质量")],
+    ),
+    Scenario(
+        name="long_plan",
+        question="我想去洛阳玩两天，帮我规划一下",
+        steps=[
+            step("查询洛阳未来两天天气", query="洛阳 天气 预报"),
+            step("查询龙门石窟门票和开放时间", query="龙门石窟 门票 开放时间"),
+            step("查询白马寺门票和开放时间", query="白马寺 门票 开放时间"),
+            step("查询老城区附近酒店", query="洛阳 老城 酒店"),
+            step("查询洛阳特色美食", query="洛阳 美食 推荐"),
+            step("根据景点位置规划交通路线", depends_on=[1, 2, 3], query="洛阳 景点 交通"),
+            step("根据天气和路线安排两天行程", depends_on=[0, 5], query=""),
+        ],
+        follow_ups=["刚才提到了哪些美食"],
+    ),
+    Scenario(
+        name="replan_loop",
+        question="下周末去开封玩，预算一千元以内",
+        steps=[step("查询开封下周末天气", query="开封 天气"),
+               step("查询清明上河园门票", query="清明上河园 门票")],
+        # 第一轮结果显示需要补充住宿，第二次反思再补充交通
+        replans={2: [step("查询开封平价住宿", query="")],
+                 3: [step("查询郑州到开封的交通方式", query="")]},
+        follow_ups=["那边晚上有什么好逛的"],
+    ),
+    Scenario(
+        name="malformed_outputs",
+        question="洛阳牡丹节期间怎么安排",
+        route="planner",
+        steps=[step("查询牡丹节举办时间", query="洛阳 牡丹节 时间"),
+               step("查询王城公园门票", query="王城公园 门票"),
+               step("安排赏花路线", depends_on=[0, 1], query="")],
+        replans={2: [step("查询牡丹节期间酒店价格", query="")]},
+        malformed={"route_prompt", "planner_prompt", "reflect_prompt"},
+    ),
+]
+
+# 多轮对话中的追问，规划时会带上前几轮的执行记录
+FOLLOW_UP_SCENARIOS = [
+    Scenario(
+        name="follow_up_food",
+        question="刚才提到了哪些美食",
+        steps=[step("整理洛阳特色美食及推荐店铺", query="洛阳 美食 老店")],
+    ),
+    Scenario(
+        name="follow_up_night",
+        question="那边晚上有什么好逛的",
+        route="planner",
+        steps=[step("查询开封夜市和夜游景点", query="开封 夜市 夜游")],
+    ),
+]
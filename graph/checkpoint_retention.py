@@ -0,0 +1,216 @@
+import asyncio
+import os
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from graph.config import (CHECKPOINT_KEEP_LAST, CHECKPOINT_KEEP_TURNS, CHECKPOINT_MAX_AGE_DAYS,
+                          CHECKPOINT_COMPACT_IDLE_SECONDS, CHECKPOINT_RETENTION_BATCH)
+from graph.instrumentation import metrics
+from utils.logger_util import logger
+
+# 多个 worker 同时启动清理任务时，只有拿到该咨询锁的一个实际执行
+ADVISORY_LOCK_KEY = 0x636B7074
+
+metrics.describe("agent_checkpoint_reclaimed_rows_total", "检查点清理删除的行数")
+metrics.describe("agent_checkpoint_reclaimed_bytes_total", "检查点清理删除的数据量（行大小之和，实际磁盘空间在 VACUUM 后释放）")
+
+# 按 thread_id 分页遍历会话，标出空闲的（根命名空间最新检查点早于 idle 秒）：
+# 递归 CTE 在主键索引 (thread_id, checkpoint_ns, checkpoint_id) 上逐个跳到下一个 thread_id，
+# 每个会话只按索引倒序取一行最新检查点、解析一次 ts，每页的代价与页大小成正比，不扫描整张表
+IDLE_THREADS_SQL = """
+WITH RECURSIVE threads AS (
+    (SELECT thread_id FROM checkpoints WHERE thread_id > %(after)s ORDER BY thread_id LIMIT 1)
+    UNION ALL
+    SELECT (SELECT c.thread_id FROM checkpoints c WHERE c.thread_id > t.thread_id ORDER BY c.thread_id LIMIT 1)
+    FROM threads t
+    WHERE t.thread_id IS NOT NULL
+)
+SELECT t.thread_id,
+       coalesce(latest.ts < now() - make_interval(secs => %(idle)s), false) AS idle
+FROM threads t
+LEFT JOIN LATERAL (
+    SELECT (c.checkpoint ->> 'ts')::timestamptz AS ts FROM checkpoints c
+    WHERE c.thread_id = t.thread_id AND c.checkpoint_ns = ''
+    ORDER BY c.checkpoint_id DESC
+    LIMIT 1
+) latest ON true
+WHERE t.thread_id IS NOT NULL
+LIMIT %(limit)s
+"""
+
+# 按策略删除单个会话的检查点及其 pending writes：
+# 保留最新检查点、最近 keep_last 个（>0 时）、每轮对话的最后一个（下一个检查点由新输入产生，keep_turns 时）；
+# 早于 max_age 的无论是否在保留范围内都删除，最新检查点也过期时整个会话被删除
+DELETE_CHECKPOINTS_SQL = """
+WITH ranked AS (
+    SELECT checkpoint_ns, checkpoint_id,
+           row_number() OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC) AS rank_desc,
+           lead(metadata ->> 'source') OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id) AS next_source,
+           (checkpoint ->> 'ts')::timestamptz AS ts
+    FROM checkpoints
+    WHERE thread_id = %(thread_id)s
+), doomed AS (
+    SELECT checkpoint_ns, checkpoint_id FROM ranked
+    WHERE (%(max_age)s::float8 IS NOT NULL AND ts < now() - make_interval(secs => %(max_age)s::float8))
+       OR ((%(keep_last)s > 0 OR %(keep_turns)s)
+           AND rank_desc > 1
+           AND NOT (%(keep_last)s > 0 AND rank_desc <= %(keep_last)s)
+           AND NOT (%(keep_turns)s AND next_source = 'input'))
+), deleted_writes AS (
+    DELETE FROM checkpoint_writes w USING doomed d
+    WHERE w.thread_id = %(thread_id)s AND w.checkpoint_ns = d.checkpoint_ns AND w.checkpoint_id = d.checkpoint_id
+    RETURNING pg_column_size(w.*) AS size
+), deleted_checkpoints AS (
+    DELETE FROM checkpoints c USING doomed d
+    WHERE c.thread_id = %(thread_id)s AND c.checkpoint_ns = d.checkpoint_ns AND c.checkpoint_id = d.checkpoint_id
+    RETURNING pg_column_size(c.*) AS size
+)
+SELECT (SELECT count(*) FROM deleted_checkpoints) AS checkpoints,
+       (SELECT coalesce(sum(size), 0) FROM deleted_checkpoints) AS checkpoint_bytes,
+       (SELECT count(*) FROM deleted_writes) AS writes,
+       (SELECT coalesce(sum(size), 0) FROM deleted_writes) AS write_bytes
+"""
+
+# 删除不再被任何剩余检查点引用的通道值（past_steps 等每个版本各存一份完整副本）
+DELETE_ORPHAN_BLOBS_SQL = """
+WITH live AS (
+    SELECT DISTINCT c.checkpoint_ns, v.key AS channel, v.value AS version
+    FROM checkpoints c, jsonb_each_text(c.checkpoint -> 'channel_versions') v
+    WHERE c.thread_id = %(thread_id)s
+), deleted AS (
+    DELETE FROM checkpoint_blobs b
+    WHERE b.thread_id = %(thread_id)s
+      AND NOT EXISTS (SELECT 1 FROM live l
+                      WHERE l.checkpoint_ns = b.checkpoint_ns AND l.channel = b.channel AND l.version = b.version)
+    RETURNING pg_column_size(b.*) AS size
+)
+SELECT count(*) AS blobs, coalesce(sum(size), 0) AS blob_bytes FROM deleted
+"""
+
+STAT_KEYS = ("threads", "checkpoints", "checkpoint_bytes", "writes", "write_bytes", "blobs", "blob_bytes")
+
+
+class CheckpointRetention:
+    """PostgresSaver 检查点的保留与压缩
+
+    只处理空闲超过 idle_seconds 的会话，避免与正在写入的检查点（先写 blobs 再写 checkpoints）竞争。
+    run_once() 执行一轮清理并返回删除的行数与字节数，start() 在后台按间隔循环执行。
+    """
+
+    def __init__(self, pool, keep_last: int = CHECKPOINT_KEEP_LAST, keep_turns: bool = CHECKPOINT_KEEP_TURNS,
+                 max_age_days: float = CHECKPOINT_MAX_AGE_DAYS, idle_seconds: int = CHECKPOINT_COMPACT_IDLE_SECONDS,
+                 batch_size: int = CHECKPOINT_RETENTION_BATCH):
+        self.pool = pool
+        self.params = {
+            "keep_last": keep_last,
+            "keep_turns": keep_turns,
+            "max_age": max_age_days * 86400 if max_age_days > 0 else None,
+        }
+        self.idle_seconds = idle_seconds
+        self.batch_size = batch_size
+        self.totals = dict.fromkeys(STAT_KEYS, 0)
+        self._task = None
+
+    async def compact_thread(self, thread_id: str) -> dict:
+        """按策略清理单个会话，返回删除的行数与字节数"""
+        params = dict(self.params, thread_id=thread_id)
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                cur = conn.cursor(row_factory=dict_row)
+                await cur.execute(DELETE_CHECKPOINTS_SQL, params)
+                stats = await cur.fetchone()
+                if stats["checkpoints"]:
+                    await cur.execute(DELETE_ORPHAN_BLOBS_SQL, params)
+                    stats.update(await cur.fetchone())
+        stats = {key: int(stats.get(key, 0)) for key in STAT_KEYS if key != "threads"}
+        stats["threads"] = int(stats["checkpoints"] > 0)
+        return stats
+
+    async def run_once(self) -> dict:
+        """清理所有空闲会话；其他 worker 正在清理时直接跳过"""
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        async with self.pool.connection() as lock_conn:
+            cur = lock_conn.cursor(row_factory=dict_row)
+            await cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (ADVISORY_LOCK_KEY,))
+            if not (await cur.fetchone())["locked"]:
+                logger.info("其他 worker 正在清理检查点，本轮跳过")
+                return stats
+            try:
+                after = ""
+                while True:
+                    rows = await self._thread_page(after)
+                    for row in rows:
+                        if not row["idle"]:
+                            continue
+                        for key, value in (await self.compact_thread(row["thread_id"])).items():
+                            stats[key] += value
+                    if len(rows) < self.batch_size:
+                        break
+                    after = rows[-1]["thread_id"]
+            finally:
+                await lock_conn.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+
+        for key, value in stats.items():
+            self.totals[key] += value
+        for table in ("checkpoints", "writes", "blobs"):
+            metrics.inc("agent_checkpoint_reclaimed_rows_total", stats[table], table=table)
+        metrics.inc("agent_checkpoint_reclaimed_bytes_total", stats["checkpoint_bytes"], table="checkpoints")
+        metrics.inc("agent_checkpoint_reclaimed_bytes_total", stats["write_bytes"], table="writes")
+        metrics.inc("agent_checkpoint_reclaimed_bytes_total", stats["blob_bytes"], table="blobs")
+        logger.info(f"检查点清理完成：{stats}")
+        return stats
+
+    async def _thread_page(self, after: str):
+        """thread_id 大于 after 的 batch_size 个会话，返回 [{"thread_id", "idle"}]"""
+        async with self.pool.connection() as conn:
+            cur = conn.cursor(row_factory=dict_row)
+            await cur.execute(IDLE_THREADS_SQL, {"after": after, "idle": self.idle_seconds, "limit": self.batch_size})
+            return await cur.fetchall()
+
+    def start(self, interval: float):
+        """在当前事件循环中启动后台清理任务，每 interval 秒执行一次"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(interval))
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self, interval: float):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"检查点清理失败：{e}")
+            await asyncio.sleep(interval)
+
+
+async def history_page(app, thread_id: str, limit: int = 20, before: str = None):
+    """分页读取会话的检查点历史（按 checkpoint_id 倒序，走主键索引），
+    返回 (本页快照列表, 下一页的 before)；before 为上一页最后一个快照的 checkpoint_id，没有更多时为 None"""
+    config = {"configurable": {"thread_id": thread_id}}
+    before_config = {"configurable": {"thread_id": thread_id, "checkpoint_id": before}} if before else None
+    snapshots = [s async for s in app.aget_state_history(config, before=before_config, limit=limit)]
+    next_before = snapshots[-1].config["configurable"]["checkpoint_id"] if len(snapshots) == limit else None
+    return snapshots, next_before
+
+
+async def main():
+    """单独执行一轮清理，供 cron 等外部调度使用：python -m graph.checkpoint_retention"""
+    async with AsyncConnectionPool(os.getenv("POSTGRES_URI"), min_size=1, max_size=2,
+                                   kwargs={"autocommit": True, "prepare_threshold": 0}) as pool:
+        stats = await CheckpointRetention(pool).run_once()
+    print(stats)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
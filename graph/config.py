@@ -1,40 +1,247 @@
 import operator
 import os
+import threading
 from typing import Annotated, List, Tuple, TypedDict
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_tavily import TavilySearch
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 load_dotenv()
-llm = ChatOpenAI(
-    model="deepseek-chat",
-    api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url=os.getenv('DEEPSEEK_BASE_URL'),
-    temperature=0.7,
-    streaming=True  # 开启流式
-)
-tavily_tool = TavilySearch(max_results=5)
+
+# 大模型和搜索客户端在第一次使用时才创建：导入 langchain_openai、langchain_tavily 需要数秒，
+# 只读取配置或编译图的进程（CLI、短任务 worker、测试）不必付出这部分开销
+_llm = None
+_tavily_tool = None
+_tokenizer = None
+_client_lock = threading.Lock()
+
+
+def get_llm():
+    """进程内共用的大模型客户端，第一次调用时创建"""
+    global _llm
+    if _llm is None:
+        with _client_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                from graph.transport import endpoint_timeout, get_async_http_client, get_http_client
+                llm = ChatOpenAI(
+                    model="deepseek-chat",
+                    api_key=os.getenv('DEEPSEEK_API_KEY'),
+                    base_url=os.getenv('DEEPSEEK_BASE_URL'),
+                    temperature=0.7,
+                    streaming=True,  # 开启流式
+                    timeout=endpoint_timeout("llm"),
+                    http_client=get_http_client("llm"),  # 共用长连接池
+                    http_async_client=get_async_http_client("llm"),
+                )
+                if HEDGE_NODES:
+                    from graph.hedge import HedgedChatModel
+                    llm = HedgedChatModel(inner=llm, streaming=llm.streaming)
+                _llm = llm
+    return _llm
+
+
+def get_tavily():
+    """进程内共用的 Tavily 搜索工具，第一次调用时创建"""
+    global _tavily_tool
+    if _tavily_tool is None:
+        with _client_lock:
+            if _tavily_tool is None:
+                from langchain_tavily import TavilySearch
+                from graph.tavily_client import PooledTavilySearchAPIWrapper
+                _tavily_tool = TavilySearch(max_results=5, api_wrapper=PooledTavilySearchAPIWrapper())
+    return _tavily_tool
+
+
+def get_tokenizer():
+    """进程内共用的 token 计数器（历史记录预算、搜索结果压缩、用量估算都用它），编码在第一次计数时才加载"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _client_lock:
+            if _tokenizer is None:
+                from utils.tokenizer_util import Tokenizer
+                _tokenizer = Tokenizer(TOKENIZER)
+    return _tokenizer
+
+
+def set_llm(llm):
+    """替换大模型客户端（基准测试、单元测试注入替身），传 None 恢复为按需创建"""
+    global _llm
+    _llm = llm
+
+
+def set_tavily(tool):
+    """替换搜索工具，传 None 恢复为按需创建"""
+    global _tavily_tool
+    _tavily_tool = tool
+
+
+# 生成最终回答的大模型调用带上该 tag，便于从 LangGraph 消息流中筛选出回答 token
+FINAL_ANSWER_TAG = "final_answer"
+
+# 每一轮最多并行执行的步骤数，0 表示不限制
+MAX_PARALLEL_STEPS = int(os.getenv("MAX_PARALLEL_STEPS", "0"))
+# 规划时直接为每个步骤生成搜索关键词，执行时省掉一次生成关键词的大模型调用
+PLANNER_EMITS_QUERIES = os.getenv("PLANNER_EMITS_QUERIES", "true").lower() == "true"
+# 流式解析规划结果，规划还没输出完就提前执行已经完整输出、且没有依赖的步骤
+PLANNER_PREFETCH = os.getenv("PLANNER_PREFETCH", "true").lower() == "true"
+
+# 反思策略：every_step（每轮执行后都反思）/ every_n（每执行 N 个步骤反思一次）/
+# plan_exhausted（计划执行完才反思）/ on_failure（有步骤失败或结果过少时反思）
+REFLECT_POLICY = os.getenv("REFLECT_POLICY", "every_step")
+REFLECT_EVERY_N = int(os.getenv("REFLECT_EVERY_N", "3"))
+REFLECT_MIN_RESULT_CHARS = int(os.getenv("REFLECT_MIN_RESULT_CHARS", "30"))  # 结果少于该字数视为信息不足
+
+# 搜索结果缓存：memory（仅进程内）/ sqlite（本机多进程共享）/ postgres（按 POSTGRES_URI 跨机器共享）/ none
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "86400"))  # 秒
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))  # 进程内条目上限
+SEARCH_CACHE_MAX_ROWS = int(os.getenv("SEARCH_CACHE_MAX_ROWS", "100000"))  # 持久层条目上限
+SEARCH_CACHE_SQLITE_PATH = os.getenv("SEARCH_CACHE_SQLITE_PATH", "search_cache.db")
+
+# 大模型响应缓存：按节点开启（逗号分隔），只适合输入重复度高、输出可复用的节点
+LLM_CACHE_NODES = {n.strip() for n in os.getenv("LLM_CACHE_NODES", "router,search_query,summary").split(",") if n.strip()}
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))  # 秒
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "4096"))
+
+# 对冲请求：在开启的图节点（逗号分隔，如 executor,reflect）中，首 token 迟迟未到时再发一个相同请求，取先返回的一个
+HEDGE_NODES = {n.strip() for n in os.getenv("HEDGE_NODES", "").split(",") if n.strip()}  # 默认关闭
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))  # 等待时间取该节点近期首 token 耗时的分位数
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "200"))  # 等待时间下限，避免分布很窄时几乎每次都对冲
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # 样本不足时不对冲
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))  # 每个节点保留的最近首 token 耗时样本数
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))  # 额外请求数不超过总请求数的比例
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))  # 预算最多累积的额外请求数
+
+# 本地意图分类：规则命中或本地模型足够可靠时直接决定路由，否则交给大模型
+# 本地模型的置信度门槛按留出样本校准：取留出准确率不低于该值的最低置信度
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.9"))
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "logs/intent/routes.jsonl")  # 大模型路由结果，作为本地模型的训练数据
+INTENT_MIN_SAMPLES = int(os.getenv("INTENT_MIN_SAMPLES", "100"))  # 训练样本少于该值时只使用规则
+INTENT_MIN_CALIBRATION = int(os.getenv("INTENT_MIN_CALIBRATION", "30"))  # 置信度门槛以上至少要有这么多留出样本
+INTENT_CALIBRATION_WINDOW = int(os.getenv("INTENT_CALIBRATION_WINDOW", "1000"))  # 保留最近多少个留出样本
+INTENT_FEATURE_DIMS = int(os.getenv("INTENT_FEATURE_DIMS", "65536"))  # 特征哈希的维度
+
+# 摘要合并：时间窗口内并发到达的摘要请求合并为一次请求
+SUMMARY_BATCH_MODE = os.getenv("SUMMARY_BATCH_MODE", "multi_doc")  # multi_doc（多文档单次请求）/ batch（llm.abatch）/ off，只合并同一会话的请求
+SUMMARY_BATCH_WINDOW_MS = int(os.getenv("SUMMARY_BATCH_WINDOW_MS", "30"))
+SUMMARY_BATCH_MAX_SIZE = int(os.getenv("SUMMARY_BATCH_MAX_SIZE", "4"))
+
+# 搜索结果抽取式压缩：只把最相关的内容送去摘要，压缩后足够短时直接跳过摘要
+SEARCH_TOKEN_BUDGET = int(os.getenv("SEARCH_TOKEN_BUDGET", "800"))
+SUMMARY_SKIP_TOKENS = int(os.getenv("SUMMARY_SKIP_TOKENS", "300"))
+
+# 历史执行记录的 token 预算：最近的步骤原样保留，放不下的较早步骤合并为滚动摘要（带缓存）
+# 搜索结果压缩和接口未返回用量时的 token 估算也用同一个编码计数
+TOKENIZER = os.getenv("TOKENIZER", "o200k_base")  # tiktoken 编码名（与 DeepSeek 分词器不同，计数为近似值），heuristic 表示按字符估算
+PLANNER_HISTORY_TOKENS = int(os.getenv("PLANNER_HISTORY_TOKENS", "600"))
+REFLECT_HISTORY_TOKENS = int(os.getenv("REFLECT_HISTORY_TOKENS", "2400"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "400"))  # 预算中留给滚动摘要的上限
+HISTORY_FOLD_RATIO = float(os.getenv("HISTORY_FOLD_RATIO", "0.5"))  # 需要合并时多合并一些，使原样保留部分降到该比例，减少摘要次数
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "4096"))
+
+# 指标与追踪：Prometheus textfile 和 JSONL 追踪文件路径，留空表示不导出
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", "logs/metrics/agent.prom")
+METRICS_TRACE_PATH = os.getenv("METRICS_TRACE_PATH", "logs/trace/trace.jsonl")
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "2"))  # 每百万输入 token 价格
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "8"))  # 每百万输出 token 价格
+
+# 数据库：检查点和长期记忆 Store 共用一个连接池
+POSTGRES_URI = os.getenv("POSTGRES_URI")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # 获取连接的超时时间（秒）
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # 空闲连接超过该时长（秒）被关闭，直到只剩 min_size 个
+DB_POOL_WARMUP = os.getenv("DB_POOL_WARMUP", "true").lower() == "true"  # 启动时先建好 min_size 个连接
+
+# 大模型和搜索共用的 HTTP 连接池（按端点各一个同步、一个异步客户端）：保持长连接，避免每次请求重新握手
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))  # 每个客户端的连接数上限
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))  # 每个客户端保留的空闲长连接数
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))  # 空闲长连接保留时长（秒）
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "auto")  # auto（安装了 h2 时启用）/ true / false
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))  # 等待空闲连接的超时时间
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))  # 大模型两次读到数据之间的最长间隔（流式输出时按 chunk 计）
+SEARCH_READ_TIMEOUT = float(os.getenv("SEARCH_READ_TIMEOUT", "30"))
+
+# 长期记忆：向量化方式为 hashing（字符 n-gram 特征哈希）或 "模块路径:工厂函数"，检索使用进程内 NumPy 索引
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_DIMS = int(os.getenv("EMBEDDING_DIMS", "512"))
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))  # 规划时最多注入的偏好、事实条数
+MEMORY_RECALL_THRESHOLD = float(os.getenv("MEMORY_RECALL_THRESHOLD", "0.3"))  # 事实与问题的相似度达到该值才注入
+MEMORY_SKIP_THRESHOLD = float(os.getenv("MEMORY_SKIP_THRESHOLD", "0.8"))  # 步骤与已有事实的相似度达到该值时跳过执行
+MEMORY_UPSERT_BATCH = int(os.getenv("MEMORY_UPSERT_BATCH", "64"))  # 索引攒够该条数再合并进矩阵
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", "10000"))  # 进程内常驻索引的用户数上限
+
+# 跨会话复用步骤结果：任务描述与已有结果的相似度达到阈值且未过期时直接复用，所有用户共享
+STEP_REUSE_ENABLED = os.getenv("STEP_REUSE_ENABLED", "true").lower() == "true"
+STEP_REUSE_THRESHOLD = float(os.getenv("STEP_REUSE_THRESHOLD", "0.85"))
+# 不含具体地点、时间的泛化任务（如“查询当地酒店价格”）要求更高的相似度，且只在原问题相同时复用
+STEP_REUSE_GENERIC_THRESHOLD = float(os.getenv("STEP_REUSE_GENERIC_THRESHOLD", "0.95"))
+STEP_REUSE_MAX_ENTRIES = int(os.getenv("STEP_REUSE_MAX_ENTRIES", "50000"))  # 进程内最多保留的结果条数
+# 各主题类别结果的保鲜时间（秒），步骤复用和长期记忆中的事实共用，格式为 "类别=秒数,..."，0 表示该类别不复用
+STEP_REUSE_TTLS = {"weather": 3 * 3600, "price": 86400, "ticket": 7 * 86400, "news": 86400, "guide": 30 * 86400,
+                   "default": 86400}
+STEP_REUSE_TTLS.update({topic.strip(): int(seconds) for topic, _, seconds in
+                        (item.partition("=") for item in os.getenv("STEP_REUSE_TTLS", "").split(",") if "=" in item)})
+
+# 检查点保留与压缩：保留最近 N 个检查点（0 表示不按数量清理）和每轮对话的最终检查点，超过保留天数的删除（0 表示不过期）
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "10"))
+CHECKPOINT_KEEP_TURNS = os.getenv("CHECKPOINT_KEEP_TURNS", "true").lower() == "true"
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("CHECKPOINT_MAX_AGE_DAYS", "30"))
+CHECKPOINT_COMPACT_IDLE_SECONDS = int(os.getenv("CHECKPOINT_COMPACT_IDLE_SECONDS", "600"))  # 只清理空闲超过该时长的会话
+CHECKPOINT_RETENTION_INTERVAL = int(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "3600"))  # 后台清理间隔（秒），0 表示不启动
+CHECKPOINT_RETENTION_BATCH = int(os.getenv("CHECKPOINT_RETENTION_BATCH", "100"))  # 每页遍历的会话数（只清理其中空闲的）
 
 
 class PlanExecuteState(TypedDict):
     """定义状态"""
     question: str  # 用户问题
-    plan: List[str]  # 待执行的任务列表
+    plan: List[dict]  # 待执行的任务列表，元素为 {"id", "task", "depends_on"}
     past_steps: Annotated[List[Tuple], operator.add]  # 已完成的步骤（步骤名，结果）
     response: str  # 最终回复
     route: str # 路由意图
+    ready_steps: List[dict]  # 本轮调度出来、可并行执行的步骤
+    reflected_steps: int  # 上次规划/反思时 past_steps 的长度，用于判断有多少步骤还没有反思过
+
+
+class StepState(TypedDict):
+    """单个步骤的执行输入（由调度器通过 Send 分发）"""
+    step: dict
+    question: str
+
+
+class Step(BaseModel):
+    """(结构化输出) 单个步骤"""
+    task: str = Field(description="具体的步骤，例如查询天气，查询景点等")
+    depends_on: List[int] = Field(default_factory=list, description="依赖的步骤序号（从0开始），无依赖则为空")
+    query: str = Field(default="", description="搜索关键词，为空时由执行者生成")
+
+
+def _coerce_steps(steps):
+    """兼容大模型直接输出字符串数组的情况"""
+    return [{"task": s} if isinstance(s, str) else s for s in steps or []]
 
 
 class Plan(BaseModel):
     """(结构化输出) 规划列表"""
-    steps: List[str] = Field(description="一系列具体的步骤，例如查询天气，查询景点等")  # 计划列表结构
+    steps: List[Step] = Field(description="一系列具体的步骤")  # 计划列表结构
+
+    @field_validator("steps", mode="before")
+    @classmethod
+    def coerce_steps(cls, steps):
+        return _coerce_steps(steps)
 
 
 class Response(BaseModel):
     """（结构化输出）重新规划或结束"""
     response: str = Field(description="最终回答，如果还需要继续执行步骤，则为空字符串")
-    next_plan: List[str] = Field(description="剩余未完成的步骤列表")
+    next_plan: List[Step] = Field(description="剩余未完成的步骤列表")
+
+    @field_validator("next_plan", mode="before")
+    @classmethod
+    def coerce_steps(cls, steps):
+        return _coerce_steps(steps)
 
 
@@ -0,0 +1,118 @@
+import hashlib
+from typing import List, Tuple
+
+from graph.config import (get_llm, get_tokenizer, HISTORY_SUMMARY_TOKENS, HISTORY_FOLD_RATIO, HISTORY_SUMMARY_CACHE_SIZE)
+from graph.instrumentation import metrics, record_cache
+from graph.prompts import history_summary_prompt
+from utils.cache_util import TTLCache
+from utils.logger_util import logger
+from utils.parse_llm_json_util import parse_llm_json
+from utils.tokenizer_util import Tokenizer
+
+metrics.describe("agent_history_tokens", "注入提示词的历史执行记录 token 数")
+
+
+def _fold_count(costs: List[int], limit: float) -> int:
+    """最少合并前多少个步骤，剩下的步骤总 token 数才不超过 limit"""
+    total = sum(costs)
+    k = 0
+    while k < len(costs) and total > limit:
+        total -= costs[k]
+        k += 1
+    return k
+
+
+def _prefix_hashes(past_steps) -> List[str]:
+    """每个前缀的链式哈希，第 i 个对应前 i 个步骤；past_steps 只会追加，前缀不变时哈希不变"""
+    hashes = [""]
+    for step, result in past_steps:
+        hashes.append(hashlib.sha256(f"{hashes[-1]}|{step}|{result}".encode("utf-8")).hexdigest()[:32])
+    return hashes
+
+
+class HistoryContext:
+    """在 token 预算内构造历史执行记录：最近的步骤原样保留，较早的步骤合并为滚动摘要
+
+    past_steps 只追加不修改，摘要按“前 k 个步骤”的哈希缓存；新的摘要在最近一次缓存的摘要基础上
+    只合并新增的步骤。需要合并时按 HISTORY_FOLD_RATIO 多合并一些，之后几轮可以直接复用同一份摘要。
+    """
+
+    def __init__(self, tokenizer: Tokenizer = None, summary_tokens: int = HISTORY_SUMMARY_TOKENS,
+                 fold_ratio: float = HISTORY_FOLD_RATIO, cache_size: int = HISTORY_SUMMARY_CACHE_SIZE):
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.summary_tokens = summary_tokens
+        self.fold_ratio = fold_ratio
+        self._summaries = TTLCache(max_entries=cache_size)  # (摘要 token 上限, 前缀哈希) -> 摘要
+
+    async def build(self, past_steps: List[Tuple], budget: int, line_format: str, node: str) -> str:
+        """返回不超过 budget 个 token 的历史记录文本，line_format 含 {step} 和 {result} 两个占位符"""
+        if not past_steps:
+            return ""
+        await self.tokenizer.aload()
+        lines = [line_format.format(step=step, result=result) for step, result in past_steps]
+        costs = [self.tokenizer.count(line) + 1 for line in lines]
+        if sum(costs) <= budget:
+            text = "\n".join(lines)
+        else:
+            text = await self._fit(past_steps, lines, costs, budget)
+        metrics.observe("agent_history_tokens", self.tokenizer.count(text), node=node)
+        return text
+
+    async def _fit(self, past_steps, lines, costs, budget) -> str:
+        summary_tokens = min(self.summary_tokens, budget // 3)
+        recent_budget = budget - summary_tokens
+        hashes = _prefix_hashes(past_steps)
+        n = len(lines)
+        # 至少保留最后一个步骤原样（过长时截断）
+        need = min(_fold_count(costs, recent_budget), n - 1)
+
+        # 已有覆盖更多步骤的摘要时直接使用，只要剩下的步骤放得下
+        fold = next((k for k in range(max(need, 1), n) if self._summaries.get((summary_tokens, hashes[k])) is not None),
+                    None)
+        if fold is None:
+            fold = max(min(_fold_count(costs, recent_budget * self.fold_ratio), n - 1), need)
+        summary = await self._summary(past_steps, hashes, fold, summary_tokens) if fold else ""
+
+        recent = lines[fold:]
+        if sum(costs[fold:]) > recent_budget:
+            recent[-1] = self.tokenizer.truncate(recent[-1], recent_budget - sum(costs[fold:-1]))
+        parts = [f"较早步骤摘要：{summary}"] if summary else []
+        return "\n".join(parts + recent)
+
+    async def _summary(self, past_steps, hashes, fold: int, max_tokens: int) -> str:
+        cached = self._summaries.get((max_tokens, hashes[fold]))
+        record_cache("history_summary", cached is not None)
+        if cached is not None:
+            return cached
+
+        # 在最近一次缓存的较短前缀摘要基础上滚动合并
+        start, previous = 0, ""
+        for j in range(fold - 1, 0, -1):
+            previous = self._summaries.get((max_tokens, hashes[j]))
+            if previous is not None:
+                start = j
+                break
+        history = "\n".join(f"已完成步骤：{step}\n执行结果：{result}" for step, result in past_steps[start:fold])
+        if start:
+            history = f"此前摘要：{previous}\n{history}"
+
+        # 提示词按字数限制长度，按原文的字数与 token 数之比换算
+        chars_per_token = len(history) / max(self.tokenizer.count(history), 1)
+        prompt = history_summary_prompt.format(max_chars=int(max_tokens * chars_per_token), history=history)
+        try:
+            response = await get_llm().ainvoke(prompt, config={"run_name": "history_summary_prompt"})
+            summary = str(parse_llm_json(response.content).get("summary", "")).strip()
+        except Exception as e:
+            logger.error(f"历史记录摘要失败：{e}")
+            summary = ""
+        # 摘要失败时退化为截断原文，保证预算
+        summary = self.tokenizer.truncate(summary or history, max_tokens)
+        self._summaries.set((max_tokens, hashes[fold]), summary)
+        logger.info(f"合并前 {fold} 个步骤为摘要（从第 {start} 个步骤开始增量合并）")
+        return summary
+
+    def clear(self):
+        self._summaries.clear()
+
+
+history_context = HistoryContext()
@@ -0,0 +1,90 @@
+import time
+from contextlib import asynccontextmanager
+
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.store.postgres.aio import AsyncPostgresStore
+from psycopg import errors
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from graph.config import (POSTGRES_URI, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_MAX_IDLE,
+                          DB_POOL_WARMUP)
+from utils.logger_util import logger
+
+# 迁移期间持有的咨询锁，多个 worker 同时冷启动时只有一个执行迁移
+MIGRATION_LOCK_KEY = 0x6D696772
+
+SCHEMA_VERSION_SQL = """
+SELECT (SELECT max(v) FROM checkpoint_migrations) AS checkpoint_version,
+       (SELECT max(v) FROM store_migrations) AS store_version
+"""
+
+
+def build_pool(conninfo: str = POSTGRES_URI) -> AsyncConnectionPool:
+    """检查点和 Store 共用的连接池（未打开），大小与超时取自 DB_POOL_* 配置"""
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=max(DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE),
+        timeout=DB_POOL_TIMEOUT,
+        max_idle=DB_POOL_MAX_IDLE,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=False,
+    )
+
+
+async def schema_versions(conn) -> dict:
+    """库中已执行到的迁移版本，表还不存在时为 None"""
+    try:
+        cur = await conn.execute(SCHEMA_VERSION_SQL)
+        return await cur.fetchone()
+    except errors.UndefinedTable:
+        return {"checkpoint_version": None, "store_version": None}
+
+
+def schema_up_to_date(versions: dict) -> bool:
+    return (versions["checkpoint_version"] == len(AsyncPostgresSaver.MIGRATIONS) - 1
+            and versions["store_version"] == len(AsyncPostgresStore.MIGRATIONS) - 1)
+
+
+async def ensure_schema(pool, checkpointer, store) -> bool:
+    """版本已是最新时只做一次查询；否则持咨询锁执行 setup() 迁移，返回是否执行了迁移
+
+    咨询锁占用一个连接，setup() 还要从同一个连接池再取连接，所以需要迁移时连接池上限至少为 2，
+    否则直接报错，而不是等到获取连接超时。
+    """
+    async with pool.connection() as conn:
+        if schema_up_to_date(await schema_versions(conn)):
+            return False
+    if pool.max_size < 2:
+        raise ValueError(f"数据库需要迁移，迁移期间至少需要 2 个连接，当前连接池上限为 {pool.max_size}"
+                         f"（调大 DB_POOL_MAX_SIZE）")
+    async with pool.connection() as lock_conn:
+        await lock_conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            # 等锁期间其他 worker 可能已经迁移完成
+            if schema_up_to_date(await schema_versions(lock_conn)):
+                return False
+            await checkpointer.setup()
+            await store.setup()
+        finally:
+            await lock_conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    logger.info("数据库表结构已迁移到最新版本")
+    return True
+
+
+@asynccontextmanager
+async def open_persistence(conninfo: str = POSTGRES_URI, warmup: bool = DB_POOL_WARMUP):
+    """打开共用连接池，返回 (pool, checkpointer, store)
+
+    warmup 为 True 时等连接池建好 min_size 个连接再返回，避免第一批请求排队建连。
+    """
+    started = time.perf_counter()
+    async with build_pool(conninfo) as pool:
+        if warmup:
+            await pool.wait(timeout=DB_POOL_TIMEOUT)
+        checkpointer = AsyncPostgresSaver(pool)
+        store = AsyncPostgresStore(pool)
+        migrated = await ensure_schema(pool, checkpointer, store)
+        logger.info(f"数据库就绪，耗时 {time.perf_counter() - started:.3f}s（{'执行了迁移' if migrated else '无需迁移'}）")
+        yield pool, checkpointer, store
@@ -1,6 +1,18 @@
-from graph.config import PlanExecuteState, llm
-from graph.prompts import summary_prompt
-from utils.parse_llm_json_util import parse_llm_json
+import asyncio
+import json
+from typing import List
+
+from langgraph.types import Send
+
+from graph.config import (PlanExecuteState, Response, get_llm, MAX_PARALLEL_STEPS, SUMMARY_BATCH_MODE, SUMMARY_BATCH_WINDOW_MS,
+                          SUMMARY_BATCH_MAX_SIZE, REFLECT_POLICY, REFLECT_EVERY_N, REFLECT_MIN_RESULT_CHARS)
+from graph.instrumentation import current_thread_id, timed
+from graph.llm_cache import llm_cache
+from graph.prompts import summary_prompt, batch_summary_prompt
+from utils.logger_util import logger, log_sampled
+from utils.parse_llm_json_util import parse_llm_json, JsonStringFieldStream
+
+SEARCH_FAILED_PREFIX = "搜索失败"
 
 
 def route_by_intent(state: PlanExecuteState):
@@ -15,10 +27,192 @@ def should_end(state: PlanExecuteState):
     else:
         return False
 
-def abstract(content: str):
+
+def parse_reflection(content: str) -> Response:
+    """解析反思输出；整体不是合法 JSON 但 response 字段已完整输出时，仍以它为最终回答
+
+    回答 token 是从流式输出的 response 字段中实时推送给用户的（见 graph/streaming.py），
+    这里与推送时的提取规则一致，避免用户已经看到的回答因 JSON 其余部分出错而作废。
+    """
+    try:
+        return Response.model_validate(parse_llm_json(content))
+    except Exception as e:
+        extractor = JsonStringFieldStream("response")
+        response = extractor.feed(content)
+        if extractor.done and response.strip():
+            logger.warning(f"重新规划输出不是合法 JSON，使用已完整输出的 response 字段：{e}")
+            return Response(response=response, next_plan=[])
+        logger.error(f"重新规划解析失败：{e}")
+        return Response(response="", next_plan=[])
+
+
+def is_weak_result(result: str) -> bool:
+    """步骤失败或返回的信息过少"""
+    return result.startswith(SEARCH_FAILED_PREFIX) or len(result.strip()) < REFLECT_MIN_RESULT_CHARS
+
+
+def need_reflection(state: PlanExecuteState):
+    """根据反思策略判断执行完本轮步骤后是否需要反思"""
+    past_steps = state.get("past_steps") or []
+    pending = len(past_steps) - state.get("reflected_steps", 0)
+    if pending <= 0:
+        return False
+    if not state.get("plan"):
+        # 计划已执行完，需要反思生成最终回答
+        return True
+    if REFLECT_POLICY == "every_n":
+        return pending >= REFLECT_EVERY_N
+    if REFLECT_POLICY == "plan_exhausted":
+        return False
+    if REFLECT_POLICY == "on_failure":
+        return any(is_weak_result(result) for _, result in past_steps[-pending:])
+    return True
+
+
+def dispatch_steps(state: PlanExecuteState):
+    """把调度出来的步骤并行分发给执行者，没有可执行步骤时直接进入反思"""
+    ready_steps = state.get("ready_steps") or []
+    if not ready_steps:
+        return "reflect"
+    return [Send("executor", {"step": step, "question": state["question"]}) for step in ready_steps]
+
+
+def to_plan(steps):
+    """将结构化输出的步骤转换为带编号的计划，去掉越界和指向自身的依赖"""
+    plan = []
+    for i, step in enumerate(steps):
+        depends_on = [d for d in step.depends_on if 0 <= d < len(steps) and d != i]
+        plan.append({"id": i, "task": step.task, "depends_on": depends_on, "query": step.query.strip()})
+    return plan
+
+
+def pick_ready_steps(plan):
+    """选出依赖已全部完成的步骤，返回 (本轮执行的步骤, 剩余计划)"""
+    pending_ids = {step["id"] for step in plan}
+    ready = [step for step in plan if not pending_ids.intersection(step.get("depends_on", []))]
+    if not ready and plan:
+        # 依赖成环或无法满足时退化为顺序执行，避免卡死
+        ready = plan[:1]
+    if MAX_PARALLEL_STEPS > 0:
+        ready = ready[:MAX_PARALLEL_STEPS]
+    ready_ids = {step["id"] for step in ready}
+    rest = [step for step in plan if step["id"] not in ready_ids]
+    return ready, rest
+
+
+def _parse_summary(content) -> str:
+    return parse_llm_json(content).get('summary', '')
+
+
+async def _abstract_one(content: str):
+    prompt = summary_prompt.format(search_results=content)
+    response = await llm_cache.ainvoke(get_llm(), prompt, template_id="summary_prompt", node="summary")
+    return _parse_summary(response.content)
+
+
+async def abstract_batch(contents: List[str]) -> List[str]:
+    """批量提取摘要：命中缓存的直接返回，其余合并为一次多文档请求（或 llm.abatch），再按顺序拆分回每一份"""
+    llm = get_llm()
+    prompts = [summary_prompt.format(search_results=content) for content in contents]
+    summaries = [None] * len(contents)
+    todo = []
+    for i, prompt in enumerate(prompts):
+        cached = llm_cache.lookup(llm, prompt, template_id="summary_prompt", node="summary")
+        if cached is not None:
+            summaries[i] = _parse_summary(cached)
+        else:
+            todo.append(i)
+
+    if len(todo) == 1:
+        summaries[todo[0]] = await _abstract_one(contents[todo[0]])
+    elif todo and SUMMARY_BATCH_MODE == "multi_doc":
+        search_results = "\n\n".join(f"### 原文 {n + 1}\n{contents[i]}" for n, i in enumerate(todo))
+        response = await llm.ainvoke(batch_summary_prompt.format(count=len(todo), search_results=search_results),
+                                     config={"run_name": "batch_summary_prompt"})
+        try:
+            batch = parse_llm_json(response.content).get('summaries', [])
+        except Exception as e:
+            logger.error(f"批量摘要解析失败：{e}")
+            batch = []
+        if len(batch) == len(todo):
+            for i, summary in zip(todo, batch):
+                summaries[i] = str(summary)
+                llm_cache.save(llm, prompts[i], "summary_prompt", "summary",
+                               json.dumps({"summary": summaries[i]}, ensure_ascii=False))
+        else:
+            # 条数对不上时无法可靠拆分，逐条重新生成
+            logger.error(f"批量摘要条数不符：期望 {len(todo)}，实际 {len(batch)}，改为逐条摘要")
+            for i, summary in zip(todo, await asyncio.gather(*(_abstract_one(contents[i]) for i in todo))):
+                summaries[i] = summary
+    elif todo:
+        responses = await llm.abatch([prompts[i] for i in todo], config={"run_name": "summary_prompt"})
+        for i, response in zip(todo, responses):
+            llm_cache.save(llm, prompts[i], "summary_prompt", "summary", response.content)
+            summaries[i] = _parse_summary(response.content)
+
+    logger.info(f"批量摘要完成：{len(contents)} 份，实际请求 {len(todo)} 份")
+    return summaries
+
+
+class SummaryBatcher:
+    """把同一会话在同一时间窗口内并发到达的摘要请求合并成一批，交给 abstract_batch 处理
+
+    只在会话内合并：multi_doc 模式把一批搜索结果放进同一个提示词，若跨会话合并，
+    某一条拆分错位时摘要会落到另一个用户的步骤里。
+    """
+
+    def __init__(self, window_ms: int = SUMMARY_BATCH_WINDOW_MS, max_size: int = SUMMARY_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending = {}  # thread_id -> [(content, future)]
+        self._timers = {}  # thread_id -> 定时 flush
+        self._tasks = set()  # 事件循环只弱引用任务，这里持有引用，避免批次任务被回收后 future 永远不返回
+
+    async def submit(self, content: str, thread_id: str = None) -> str:
+        thread_id = thread_id if thread_id is not None else current_thread_id()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(thread_id, [])
+        pending.append((content, future))
+        if len(pending) >= self.max_size:
+            self._flush(thread_id)
+        elif thread_id not in self._timers:
+            self._timers[thread_id] = loop.call_later(self.window, self._flush, thread_id)
+        return await future
+
+    def _flush(self, thread_id):
+        timer = self._timers.pop(thread_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(thread_id, [])
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _run(batch):
+        try:
+            summaries = await abstract_batch([content for content, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), summary in zip(batch, summaries):
+            if not future.done():
+                future.set_result(summary)
+
+
+summary_batcher = SummaryBatcher()
+
+
+async def abstract(content: str):
     """将搜索结果提取为摘要"""
-    response = llm.invoke(summary_prompt.format(search_results=content))
-    summary = parse_llm_json(response.content).get('summary', '')
-    from utils.logger_util import logger
-    logger.info(f"搜索结果摘要内容为: {summary}")
+    with timed("abstract"):
+        if SUMMARY_BATCH_MODE == "off" or SUMMARY_BATCH_MAX_SIZE <= 1:
+            summary = await _abstract_one(content)
+        else:
+            summary = await summary_batcher.submit(content)
+    log_sampled("summary", "搜索结果摘要内容为: {}", summary)
     return summary
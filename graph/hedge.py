@@ -0,0 +1,219 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+from langgraph.config import get_config
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from graph.config import (HEDGE_NODES, HEDGE_PERCENTILE, HEDGE_MIN_DELAY_MS, HEDGE_MIN_SAMPLES, HEDGE_WINDOW,
+                          HEDGE_MAX_RATIO, HEDGE_BURST)
+from graph.instrumentation import metrics
+from utils.logger_util import log_sampled
+
+metrics.describe("agent_llm_hedge_total", "对冲请求次数：fired 发出、won 备份请求先返回、lost 原请求先返回、"
+                                          "skipped_budget 超出预算未发出")
+metrics.describe("agent_llm_hedge_delay_seconds", "发出对冲请求前等待的时间")
+
+_DONE = object()
+
+
+class HedgeBudget:
+    """额外请求预算：每个请求积累 ratio 个额度，最多累积 burst 个，每次对冲消耗 1 个"""
+
+    def __init__(self, ratio: float = HEDGE_MAX_RATIO, burst: float = HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._credits = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._credits = min(self.burst, self._credits + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            return True
+
+
+class LatencyWindow:
+    """各节点最近的首 token 耗时样本，用于计算对冲等待时间"""
+
+    def __init__(self, size: int = HEDGE_WINDOW):
+        self.size = size
+        self._samples = {}
+
+    def add(self, node: str, seconds: float):
+        self._samples.setdefault(node, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, node: str, q: float, min_samples: int) -> Optional[float]:
+        samples = self._samples.get(node)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    def clear(self):
+        self._samples.clear()
+
+
+async def _pump(stream, queue: asyncio.Queue):
+    """把一次请求的输出（流式 chunk 或完整结果）依次放入队列，结束放 _DONE，出错放异常"""
+    try:
+        async with aclosing(stream):
+            async for item in stream:
+                queue.put_nowait(item)
+        queue.put_nowait(_DONE)
+    except Exception as e:
+        queue.put_nowait(e)
+
+
+async def _once(coro):
+    yield await coro
+
+
+class HedgedChatModel(BaseChatModel):
+    """对冲请求包装：在开启的节点中，若等待 percentile 分位的首 token 耗时后仍无输出，且预算允许，
+    再发一个相同的请求，取先输出首 token 的一个，取消另一个。
+
+    非流式调用以完整响应作为"首 token"。回调（耗时、token 用量、流式事件）只记录在包装模型这一次调用上，
+    被取消的请求不计入。节点取自 LangGraph 运行配置中的 langgraph_node 元数据，图外调用不对冲。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    nodes: set = Field(default_factory=lambda: set(HEDGE_NODES))
+    percentile: float = HEDGE_PERCENTILE
+    min_delay: float = HEDGE_MIN_DELAY_MS / 1000
+    min_samples: int = HEDGE_MIN_SAMPLES
+    streaming: bool = False
+    _window: LatencyWindow = PrivateAttr(default_factory=LatencyWindow)
+    _budget: HedgeBudget = PrivateAttr(default_factory=HedgeBudget)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged-{self.inner._llm_type}"
+
+    # 供响应缓存生成缓存键
+    @property
+    def model_name(self):
+        return getattr(self.inner, "model_name", None) or getattr(self.inner, "model", "")
+
+    @property
+    def temperature(self):
+        return getattr(self.inner, "temperature", "")
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return self.inner._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        node = self._node(run_manager)
+        if node not in self.nodes:
+            return await self.inner._agenerate(messages, stop=stop, **kwargs)
+        result, _, _ = await self._race(node, lambda: _once(self.inner._agenerate(messages, stop=stop, **kwargs)))
+        return result
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        node = self._node(run_manager)
+        if node not in self.nodes:
+            async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                yield chunk
+            return
+        item, queue, task = await self._race(node, lambda: self.inner._astream(messages, stop=stop, **kwargs))
+        try:
+            while item is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                item = await queue.get()
+        finally:
+            task.cancel()
+
+    @staticmethod
+    def _node(run_manager) -> Optional[str]:
+        # 流式路径下 langchain 不把 run_manager 传给 _astream，从当前运行配置中取节点名
+        if run_manager is not None:
+            return run_manager.metadata.get("langgraph_node")
+        try:
+            return get_config().get("metadata", {}).get("langgraph_node")
+        except RuntimeError:
+            return None
+
+    async def _race(self, node: str, start):
+        """发出请求，超过等待时间仍无输出时对冲，返回先产出首个输出的请求的 (首个输出, 队列, 请求任务)"""
+        self._budget.deposit()
+        attempts = []  # (队列, 请求任务, 取首个输出的任务, 开始时间)
+
+        def launch():
+            queue = asyncio.Queue()
+            attempts.append((queue, asyncio.ensure_future(_pump(start(), queue)), asyncio.ensure_future(queue.get()),
+                             time.perf_counter()))
+
+        launch()
+        delay = self._delay(node)
+        winner = None
+        try:
+            if delay is not None:
+                await asyncio.wait([attempts[0][2]], timeout=delay)
+                if not attempts[0][2].done():
+                    if self._budget.withdraw():
+                        metrics.inc("agent_llm_hedge_total", node=node, outcome="fired")
+                        metrics.observe("agent_llm_hedge_delay_seconds", delay, node=node)
+                        log_sampled("hedge", "对冲请求：{} 等待 {}ms 仍无输出", node, round(delay * 1000))
+                        launch()
+                    else:
+                        metrics.inc("agent_llm_hedge_total", node=node, outcome="skipped_budget")
+            pending = list(attempts)
+            while winner is None:
+                await asyncio.wait([attempt[2] for attempt in pending], return_when=asyncio.FIRST_COMPLETED)
+                attempt = next(attempt for attempt in pending if attempt[2].done())
+                # 一个请求出错而另一个仍在进行时，等另一个
+                if isinstance(attempt[2].result(), Exception) and len(pending) > 1:
+                    pending.remove(attempt)
+                    continue
+                winner = attempt
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt[1].cancel()
+                    attempt[2].cancel()
+
+        queue, task, first, _ = winner
+        first = first.result()
+        if isinstance(first, Exception):
+            raise first
+        # 样本是原请求的首 token 耗时，从原请求开始计时：对冲请求胜出时原请求的耗时至少为此值，
+        # 只记胜出请求自身的耗时会让分位数偏低，等待时间越来越短
+        self._window.add(node, time.perf_counter() - attempts[0][3])
+        if len(attempts) > 1:
+            metrics.inc("agent_llm_hedge_total", node=node, outcome="won" if winner is attempts[1] else "lost")
+        return first, queue, task
+
+    def _delay(self, node: str) -> Optional[float]:
+        delay = self._window.percentile(node, self.percentile, self.min_samples)
+        return None if delay is None else max(delay, self.min_delay)
+
+    def stats(self) -> dict:
+        """各节点的对冲次数、备份请求胜出率和当前等待时间"""
+        stats = {}
+        for node in sorted(self.nodes):
+            counts = {outcome: metrics.value("agent_llm_hedge_total", node=node, outcome=outcome)
+                      for outcome in ("fired", "won", "lost", "skipped_budget")}
+            delay = self._delay(node)
+            stats[node] = dict(counts, win_rate=round(counts["won"] / counts["fired"], 4) if counts["fired"] else None,
+                               delay_ms=round(delay * 1000, 1) if delay is not None else None)
+        return stats
+
+    def clear(self):
+        """清空延迟样本和预算（基准测试在场景之间调用）"""
+        self._window.clear()
+        self._budget = HedgeBudget(self._budget.ratio, self._budget.burst)
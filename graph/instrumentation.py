@@ -0,0 +1,184 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from graph.config import METRICS_TRACE_PATH, LLM_PRICE_INPUT_PER_M, LLM_PRICE_OUTPUT_PER_M, get_tokenizer
+from utils.cache_util import TTLCache
+from utils.metrics_util import MetricsRegistry, TraceWriter
+from utils.tokenizer_util import estimate_tokens
+
+metrics = MetricsRegistry()
+trace = TraceWriter(METRICS_TRACE_PATH)
+
+metrics.describe("agent_node_duration_seconds", "节点执行耗时")
+metrics.describe("agent_node_queue_wait_seconds", "节点从上一个超步结束到开始执行的等待时间")
+metrics.describe("agent_llm_duration_seconds", "大模型调用耗时")
+metrics.describe("agent_llm_tokens_total", "大模型 token 数，estimated=true 表示接口未返回用量、为本地估算")
+metrics.describe("agent_llm_cost_total", "按 LLM_PRICE_* 估算的大模型费用")
+metrics.describe("agent_tool_duration_seconds", "工具调用耗时（如 Tavily 搜索）")
+metrics.describe("agent_function_duration_seconds", "非节点函数耗时（如 abstract）")
+metrics.describe("agent_cache_requests_total", "各类缓存的命中与未命中次数")
+metrics.describe("agent_retries_total", "重试次数：kind=http 为大模型 SDK 在共用 HTTP 客户端上的重试（见 graph/transport.py）")
+metrics.describe("agent_errors_total", "节点、大模型、工具调用失败次数")
+metrics.describe("agent_ttft_seconds", "最终回答首 token 耗时")
+metrics.describe("agent_ttlt_seconds", "最终回答末 token 耗时")
+
+
+def current_thread_id():
+    """在节点内部调用时返回当前会话的 thread_id"""
+    try:
+        from langgraph.config import get_config
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+def record_cache(cache: str, hit: bool):
+    metrics.inc("agent_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def timed(fn: str):
+    """记录一段非节点代码的耗时，如 abstract()"""
+    thread_id = current_thread_id()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        metrics.observe("agent_function_duration_seconds", duration, fn=fn)
+        trace.write({"kind": "function", "name": fn, "thread_id": thread_id, "duration": duration, "status": status})
+
+
+def _usage(response, prompt_text: str):
+    """从 LLMResult 中取 token 用量，接口没有返回时用本地估算"""
+    generation = response.generations[0][0] if response.generations and response.generations[0] else None
+    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0), False
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage:
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0), False
+    completion = generation.text if generation else ""
+    # 回调在事件循环上同步执行，编码还没加载（见 astream_answer）时按字符估算，不在这里加载
+    tokenizer = get_tokenizer()
+    count = tokenizer.count if tokenizer.loaded else estimate_tokens
+    return count(prompt_text), count(completion), True
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """通过 LangChain 回调记录每个节点、每次大模型和工具调用的耗时、等待、token、费用、重试，按 thread_id 打标"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}  # run_id -> 开始时的上下文
+        self._last_end = TTLCache(max_entries=10000, ttl=3600)  # thread_id -> 上一个节点结束时间
+
+    def _start(self, run_id, **info):
+        info["started"] = time.perf_counter()
+        with self._lock:
+            self._runs[run_id] = info
+
+    def _pop(self, run_id):
+        with self._lock:
+            return self._runs.pop(run_id, None)
+
+    # ---- 节点 ----
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if node is None or kwargs.get("name") != node:
+            return
+        thread_id = metadata.get("thread_id")
+        self._start(run_id, kind="node", name=node, thread_id=thread_id)
+        last_end = self._last_end.get(thread_id)
+        if last_end is not None:
+            wait = max(time.perf_counter() - last_end, 0.0)
+            metrics.observe("agent_node_queue_wait_seconds", wait, node=node)
+            self._runs[run_id]["queue_wait"] = wait
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish_node(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish_node(run_id, "error")
+
+    def _finish_node(self, run_id, status):
+        info = self._pop(run_id)
+        if info is None:
+            return
+        now = time.perf_counter()
+        duration = now - info["started"]
+        self._last_end.set(info["thread_id"], now)
+        metrics.observe("agent_node_duration_seconds", duration, node=info["name"])
+        if status != "ok":
+            metrics.inc("agent_errors_total", kind="node", name=info["name"])
+        trace.write({"kind": "node", "name": info["name"], "thread_id": info["thread_id"], "duration": duration,
+                     "queue_wait": info.get("queue_wait"), "status": status})
+
+    # ---- 大模型 ----
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None,
+                            **kwargs):
+        metadata = metadata or {}
+        prompt_text = "".join(str(m.content) for batch in messages for m in batch)
+        self._start(run_id, kind="llm", name=kwargs.get("name") or "llm", node=metadata.get("langgraph_node"),
+                    thread_id=metadata.get("thread_id"), prompt_text=prompt_text)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        info = self._pop(run_id)
+        if info is None:
+            return
+        duration = time.perf_counter() - info["started"]
+        prompt_tokens, completion_tokens, estimated = _usage(response, info["prompt_text"])
+        cost = (prompt_tokens * LLM_PRICE_INPUT_PER_M + completion_tokens * LLM_PRICE_OUTPUT_PER_M) / 1e6
+        labels = {"node": info["node"], "call": info["name"]}
+        metrics.observe("agent_llm_duration_seconds", duration, **labels)
+        metrics.inc("agent_llm_tokens_total", prompt_tokens, type="prompt", estimated=str(estimated).lower(), **labels)
+        metrics.inc("agent_llm_tokens_total", completion_tokens, type="completion", estimated=str(estimated).lower(),
+                    **labels)
+        metrics.inc("agent_llm_cost_total", cost, **labels)
+        trace.write({"kind": "llm", "name": info["name"], "node": info["node"], "thread_id": info["thread_id"],
+                     "duration": duration, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "estimated": estimated, "cost": cost, "status": "ok"})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish_error(run_id, error)
+
+    # ---- 工具 ----
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, kind="tool", name=name, node=metadata.get("langgraph_node"),
+                    thread_id=metadata.get("thread_id"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        info = self._pop(run_id)
+        if info is None:
+            return
+        duration = time.perf_counter() - info["started"]
+        metrics.observe("agent_tool_duration_seconds", duration, tool=info["name"])
+        trace.write({"kind": "tool", "name": info["name"], "node": info["node"], "thread_id": info["thread_id"],
+                     "duration": duration, "status": "ok"})
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_error(run_id, error)
+
+    def _finish_error(self, run_id, error):
+        info = self._pop(run_id)
+        if info is None:
+            return
+        duration = time.perf_counter() - info["started"]
+        metrics.inc("agent_errors_total", kind=info["kind"], name=info["name"])
+        trace.write({"kind": info["kind"], "name": info["name"], "node": info.get("node"),
+                     "thread_id": info["thread_id"], "duration": duration, "status": "error", "error": str(error)})
+
+
+metrics_handler = MetricsCallbackHandler()
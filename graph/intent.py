@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+
+from graph.config import (INTENT_CONFIDENCE_THRESHOLD, INTENT_LOG_PATH, INTENT_MIN_SAMPLES, INTENT_MIN_CALIBRATION,
+                          INTENT_CALIBRATION_WINDOW, INTENT_FEATURE_DIMS)
+from utils.logger_util import logger
+
+ROUTES = ("planner", "direct_answer")
+
+# 明显的闲聊：整句只有问候、感谢、告别、语气词
+_CHITCHAT_RE = re.compile(
+    r"^\s*(你好|您好|hi|hello|hey|嗨|哈喽|早上好|中午好|晚上好|晚安|谢谢|多谢|感谢|谢啦|再见|拜拜|bye|好的|好滴|嗯+|哦+|ok|哈+|"
+    r"你是谁|你叫什么)[\s!！。.~～?？呀啊呢吧哈]*$",
+    re.IGNORECASE,
+)
+# 需要联网查询或多步规划的信号词
+_PLANNER_RE = re.compile(r"天气|航班|机票|高铁|火车|酒店|住宿|攻略|行程|旅游|旅行|景点|门票|美食|路线|签证|新闻|汇率|价格|[一两二三四五六七八九十\d]+天")
+
+
+def _features(text: str):
+    """字符一元、二元组特征"""
+    text = re.sub(r"\s+", "", text.lower())
+    return list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+class IntentClassifier:
+    """本地意图分类器：规则 + 基于路由日志在线训练的朴素贝叶斯模型，只在有把握时给出结果
+
+    特征为字符一元、二元组，哈希到 feature_dims 维；各路由的特征计数存成矩阵，打分是一次向量运算。
+    朴素贝叶斯的后验概率普遍接近 1，不能直接当作置信度：每条新的大模型标注样本先用当前模型预测
+    （此时模型还没见过它，相当于留出样本）再学习，置信度门槛取留出准确率不低于 threshold 的最低置信度，
+    留出样本不足时只使用规则。重复的问题只学习一次。
+    """
+
+    def __init__(self, threshold: float = INTENT_CONFIDENCE_THRESHOLD, log_path: str = INTENT_LOG_PATH,
+                 min_samples: int = INTENT_MIN_SAMPLES, min_calibration: int = INTENT_MIN_CALIBRATION,
+                 calibration_window: int = INTENT_CALIBRATION_WINDOW, feature_dims: int = INTENT_FEATURE_DIMS):
+        self.threshold = threshold
+        self.log_path = log_path
+        self.min_samples = min_samples
+        self.min_calibration = min_calibration
+        self.feature_dims = feature_dims
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._counts = np.zeros((len(ROUTES), feature_dims))  # 路由 x 特征 的出现次数
+        self._totals = np.zeros(len(ROUTES))  # 各路由的特征总数
+        self._doc_counts = np.zeros(len(ROUTES))
+        self._present = np.zeros(feature_dims, dtype=bool)  # 出现过的特征，用于拉普拉斯平滑的词表大小
+        self._vocab_size = 0
+        self._seen = set()  # 已学习问题的哈希
+        self._calibration = deque(maxlen=calibration_window)  # 留出样本的 (置信度, 是否预测正确)
+        self._cutoff = None
+        self._cutoff_dirty = False
+        self.total = 0  # 分类请求数
+        self.avoided_llm_calls = 0  # 本地直接决定、省下的大模型调用数
+        self._load()
+
+    def _load(self):
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._learn(record["question"], record["route"])
+                except Exception:
+                    continue
+
+    def _feature_ids(self, question: str) -> np.ndarray:
+        return np.fromiter((zlib.crc32(f.encode("utf-8")) % self.feature_dims for f in _features(question)),
+                           dtype=np.int64)
+
+    @property
+    def training_samples(self) -> int:
+        return int(self._doc_counts.sum())
+
+    def _learn(self, question: str, route: str) -> bool:
+        """学习一条样本，返回 False 表示路由无效或问题已经学习过"""
+        if route not in ROUTES:
+            return False
+        key = hashlib.sha1(re.sub(r"\s+", "", question.lower()).encode("utf-8")).hexdigest()
+        if key in self._seen:
+            return False
+        if self.training_samples >= self.min_samples:
+            predicted, confidence = self._predict(question)
+            self._calibration.append((confidence, predicted == route))
+            self._cutoff_dirty = True
+        ids = self._feature_ids(question)
+        r = ROUTES.index(route)
+        with self._lock:
+            self._seen.add(key)
+            np.add.at(self._counts[r], ids, 1)
+            self._totals[r] += len(ids)
+            self._doc_counts[r] += 1
+            unique = np.unique(ids)
+            self._vocab_size += int((~self._present[unique]).sum())
+            self._present[unique] = True
+        return True
+
+    async def record(self, question: str, route: str):
+        """记录大模型给出的路由结果：在线更新模型，并在线程池中追加到日志，供下次启动时加载"""
+        if not self._learn(question, route) or not self.log_path:
+            return
+        await asyncio.to_thread(self._append, {"question": question, "route": route})
+
+    def _append(self, record: dict):
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"路由日志写入失败：{e}")
+
+    def _predict(self, question: str):
+        """朴素贝叶斯后验概率最高的路由及其概率"""
+        ids = self._feature_ids(question)
+        with self._lock:
+            prior = np.log((self._doc_counts + 1) / (self._doc_counts.sum() + len(ROUTES)))
+            scores = (prior + np.log(self._counts[:, ids] + 1).sum(axis=1)
+                      - len(ids) * np.log(self._totals + self._vocab_size + 1))
+        posterior = np.exp(scores - scores.max())
+        posterior /= posterior.sum()
+        best = int(posterior.argmax())
+        return ROUTES[best], float(posterior[best])
+
+    def confidence_cutoff(self):
+        """留出准确率不低于 threshold、且门槛以上至少有 min_calibration 个样本的最低置信度；达不到时为 None"""
+        if self._cutoff_dirty:
+            cutoff, correct = None, 0
+            for n, (confidence, ok) in enumerate(sorted(self._calibration, reverse=True), 1):
+                correct += ok
+                if n >= self.min_calibration and correct / n >= self.threshold:
+                    cutoff = confidence
+            self._cutoff, self._cutoff_dirty = cutoff, False
+        return self._cutoff
+
+    def classify(self, question: str):
+        """返回 (路由, 置信度)；没有把握时路由为 None，需要交给大模型判断"""
+        self.total += 1
+        text = question.strip()
+        if _CHITCHAT_RE.match(text):
+            route, confidence = "direct_answer", 1.0
+        elif _PLANNER_RE.search(text):
+            route, confidence = "planner", 1.0
+        else:
+            cutoff = self.confidence_cutoff()
+            if self.training_samples < self.min_samples or cutoff is None:
+                return None, 0.0
+            route, confidence = self._predict(text)
+            if confidence < cutoff:
+                return None, confidence
+        self.avoided_llm_calls += 1
+        return route, confidence
+
+    def stats(self) -> dict:
+        return {"total": self.total, "avoided_llm_calls": self.avoided_llm_calls,
+                "training_samples": self.training_samples, "calibration_samples": len(self._calibration),
+                "confidence_cutoff": self.confidence_cutoff()}
+
+
+intent_classifier = IntentClassifier()
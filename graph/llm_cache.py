@@ -0,0 +1,72 @@
+import hashlib
+
+from langchain_core.messages import AIMessage
+
+from graph import prompts
+from graph.config import LLM_CACHE_NODES, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+from graph.instrumentation import record_cache
+from utils.cache_util import TTLCache
+from utils.logger_util import log_sampled
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """大模型响应的精确匹配缓存
+
+    缓存键由模型名、温度、提示词模板 id 及其版本、渲染后提示词的哈希组成。
+    模板版本取模板原文的哈希，修改 graph/prompts.py 中的模板后旧缓存自动失效；
+    也可以调用 invalidate() 手动失效。store 只需实现 get / set / clear，默认为进程内 TTLCache。
+    """
+
+    def __init__(self, store=None, nodes=None):
+        self.store = store if store is not None else TTLCache(max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL)
+        self.nodes = set(LLM_CACHE_NODES if nodes is None else nodes)
+        self._generations = {}  # template_id -> 手动失效次数
+
+    def enabled(self, node: str) -> bool:
+        return node in self.nodes
+
+    def template_version(self, template_id: str) -> str:
+        template = getattr(prompts, template_id, "")
+        return f"{_sha256(template)[:12]}.{self._generations.get(template_id, 0)}"
+
+    def make_key(self, llm, template_id: str, prompt: str) -> str:
+        model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+        temperature = getattr(llm, "temperature", "")
+        return f"{model}|{temperature}|{template_id}@{self.template_version(template_id)}|{_sha256(prompt)}"
+
+    def invalidate(self, template_id: str = None):
+        """失效某个模板的全部缓存，不传则清空整个缓存"""
+        if template_id is None:
+            self.store.clear()
+        else:
+            self._generations[template_id] = self._generations.get(template_id, 0) + 1
+
+    def lookup(self, llm, prompt: str, template_id: str, node: str):
+        """返回缓存的响应文本，节点未开启缓存或未命中时返回 None"""
+        if not self.enabled(node):
+            return None
+        content = self.store.get(self.make_key(llm, template_id, prompt))
+        record_cache(f"llm_{node}", content is not None)
+        if content is not None:
+            log_sampled("cache", "大模型缓存命中：{}", node)
+        return content
+
+    def save(self, llm, prompt: str, template_id: str, node: str, content: str):
+        if self.enabled(node) and content:
+            self.store.set(self.make_key(llm, template_id, prompt), content)
+
+    async def ainvoke(self, llm, prompt: str, template_id: str, node: str):
+        """节点开启缓存时先查缓存，未命中再调用大模型并写入缓存"""
+        content = self.lookup(llm, prompt, template_id, node)
+        if content is not None:
+            return AIMessage(content=content, response_metadata={"cache_hit": True})
+        response = await llm.ainvoke(prompt, config={"run_name": template_id})
+        self.save(llm, prompt, template_id, node, response.content)
+        return response
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import re
+import time
+
+from langgraph.store.base import PutOp
+
+from graph.config import (EMBEDDING_BACKEND, EMBEDDING_DIMS, MEMORY_TOP_K, MEMORY_RECALL_THRESHOLD,
+                          MEMORY_SKIP_THRESHOLD, MEMORY_UPSERT_BATCH, MEMORY_MAX_USERS, STEP_REUSE_TTLS)
+from graph.instrumentation import record_cache
+from utils.cache_util import TTLCache
+from utils.embedding_util import load_embedder
+from utils.logger_util import logger
+from utils.vector_index_util import VectorIndex
+
+# 表达偏好或约束的子句，如“我不吃辣”“预算两千以内”“带着孩子”
+_PREFERENCE_RE = re.compile(r"喜欢|爱吃|偏好|偏爱|想住|不喜欢|不吃|不要|讨厌|不想|怕|过敏|忌口|素食|预算|带着?(孩子|小孩|老人|父母)|自驾|穷游")
+_CLAUSE_SPLIT_RE = re.compile(r"[，。！？；,.!?;\n]")
+_DIGITS_RE = re.compile(r"\d+")
+
+# 步骤和事实的主题类别，决定结果的保鲜时间（步骤复用和长期记忆共用）；按顺序匹配，第一个命中的生效
+TOPIC_RULES = [
+    ("weather", re.compile(r"天气|气温|降雨|下雨|温度|预报")),
+    ("price", re.compile(r"酒店|住宿|民宿|机票|航班|高铁|火车|票价|价格|汇率|优惠")),
+    ("ticket", re.compile(r"门票|开放时间|预约|营业时间|闭馆")),
+    ("news", re.compile(r"新闻|活动|节日|展览|演出|最新")),
+    ("guide", re.compile(r"美食|小吃|景点|攻略|路线|交通|历史|介绍")),
+]
+
+
+def extract_preferences(question: str):
+    """从用户输入中找出表达偏好或约束的子句"""
+    return [clause.strip() for clause in _CLAUSE_SPLIT_RE.split(question)
+            if clause.strip() and _PREFERENCE_RE.search(clause)]
+
+
+def topic_of(task: str) -> str:
+    for topic, pattern in TOPIC_RULES:
+        if pattern.search(task):
+            return topic
+    return "default"
+
+
+def digits_of(task: str) -> str:
+    """任务中的数字（日期、天数、人数），数字不同的任务不能共用结果（步骤复用和长期记忆共用）"""
+    return ",".join(sorted(set(_DIGITS_RE.findall(task))))
+
+
+def is_fresh(record: dict, now: float = None, ttls: dict = STEP_REUSE_TTLS) -> bool:
+    """事实按主题类别的保鲜时间（与步骤复用相同）判断是否仍可使用，偏好不过期"""
+    if record.get("kind") != "fact":
+        return True
+    topic = topic_of(record["text"])
+    ttl = ttls.get(topic, ttls.get("default", 86400))
+    return (now or time.time()) - record.get("ts", 0) < ttl
+
+
+def memory_owner(config) -> str:
+    """记忆按用户隔离：优先 user_id，没有时退化为 thread_id（只在同一会话内共享）"""
+    configurable = config.get("configurable", {})
+    return str(configurable.get("user_id") or configurable.get("thread_id") or "anonymous")
+
+
+def _key(kind: str, text: str) -> str:
+    return hashlib.sha256(f"{kind}|{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class LongTermMemory:
+    """基于向量检索的长期记忆：用户偏好（preference）和查询得到的事实（fact）
+
+    事实记录写入时间，检索时按主题类别的保鲜时间过滤（见 is_fresh），过期的天气、价格不会再注入规划或跳过步骤。
+
+    每个用户一个进程内 VectorIndex 负责检索（最近访问的 MEMORY_MAX_USERS 个用户常驻内存）；
+    传入 LangGraph Store 时同时持久化到 ("memories", 用户) 命名空间，进程首次访问某个用户时从 Store 加载。
+    向量化函数可通过 EMBEDDING_BACKEND 替换。
+    """
+
+    def __init__(self, embedder=None, dims: int = EMBEDDING_DIMS, batch_size: int = MEMORY_UPSERT_BATCH):
+        self.embedder = embedder or load_embedder(EMBEDDING_BACKEND, dims)
+        self.dims = dims
+        self.batch_size = batch_size
+        self._owners = TTLCache(max_entries=MEMORY_MAX_USERS)  # 用户 -> (VectorIndex, 从 Store 加载的任务)
+
+    async def embed(self, texts):
+        return await asyncio.to_thread(self.embedder, list(texts))
+
+    async def _owner_index(self, store, owner: str) -> VectorIndex:
+        """取用户的索引，进程内首次访问（或被淘汰后再次访问）时从 Store 加载"""
+        entry = self._owners.get(owner)
+        if entry is None:
+            index = VectorIndex(self.dims, self.batch_size)
+            loading = asyncio.ensure_future(self._load(store, owner, index)) if store is not None else None
+            entry = (index, loading)
+            self._owners.set(owner, entry)
+        index, loading = entry
+        if loading is not None:
+            await loading
+        return index
+
+    async def _load(self, store, owner: str, index: VectorIndex):
+        items, offset = [], 0
+        try:
+            while True:
+                page = await store.asearch(("memories", owner), limit=100, offset=offset)
+                items += page
+                if len(page) < 100:
+                    break
+                offset += 100
+        except Exception as e:
+            logger.error(f"长期记忆加载失败：{e}")
+            return
+        if items:
+            vectors = await self.embed([item.value["text"] for item in items])
+            index.upsert([item.key for item in items], vectors, [item.value for item in items])
+        logger.info(f"已加载用户 {owner} 的 {len(items)} 条长期记忆")
+
+    async def remember(self, store, owner: str, records):
+        """批量写入记忆，records 为 {"kind", "text", ...} 字典列表，相同 kind 和 text 的记录会被覆盖"""
+        records = [dict(record, ts=time.time()) for record in records if record.get("text")]
+        if not records:
+            return
+        index = await self._owner_index(store, owner)
+        keys = [_key(record["kind"], record["text"]) for record in records]
+        vectors = await self.embed([record["text"] for record in records])
+        index.upsert(keys, vectors, records)
+        if store is not None:
+            try:
+                await store.abatch([PutOp(("memories", owner), key, record, index=False)
+                                    for key, record in zip(keys, records)])
+            except Exception as e:
+                logger.error(f"长期记忆持久化失败：{e}")
+
+    async def recall(self, store, owner: str, query: str, kind: str, k: int = MEMORY_TOP_K,
+                     threshold: float = MEMORY_RECALL_THRESHOLD):
+        """检索与 query 最相近的某类记忆，返回 [(相似度, 记录)]"""
+        return (await self.recall_many(store, owner, [query], kind, k, threshold))[0]
+
+    async def recall_many(self, store, owner: str, queries, kind: str, k: int = MEMORY_TOP_K,
+                          threshold: float = MEMORY_RECALL_THRESHOLD):
+        index = await self._owner_index(store, owner)
+        if not len(index) or not queries:
+            return [[] for _ in queries]
+        vectors = await self.embed(queries)
+        now = time.time()
+        results = index.search(vectors, k=k, threshold=threshold,
+                               where=lambda record: record["kind"] == kind and is_fresh(record, now))
+        return [[(score, record) for _, score, record in hits] for hits in results]
+
+    async def planner_context(self, store, owner: str, question: str) -> str:
+        """规划前注入的记忆：用户偏好（按相关度取前 k 条，不设阈值）和与问题相关的已知事实"""
+        preferences = await self.recall(store, owner, question, "preference", threshold=-1.0)
+        facts = await self.recall(store, owner, question, "fact")
+        lines = []
+        if preferences:
+            lines.append("\n\n用户偏好（规划时需要遵守）：")
+            lines += [f"- {record['text']}" for _, record in preferences]
+        if facts:
+            lines.append("\n\n已知信息（来自之前的查询，不用重复查询）：")
+            lines += [f"- {record['text']}：{record['result'][:200]}" for _, record in facts]
+        return "\n".join(lines)
+
+    async def match_steps(self, store, owner: str, steps, threshold: float = MEMORY_SKIP_THRESHOLD):
+        """找出已经有足够相近事实的步骤，返回 {步骤 id: 记忆中的结果}
+
+        向量相似只说明问的是同一类事情，还要求任务中的数字一致，“5月1日洛阳天气”不能代替“5月3日洛阳天气”。
+        """
+        hits = await self.recall_many(store, owner, [step["task"] for step in steps], "fact", threshold=threshold)
+        matched = {}
+        for step, step_hits in zip(steps, hits):
+            scope = digits_of(step["task"])
+            record = next((record for _, record in step_hits if digits_of(record["text"]) == scope), None)
+            record_cache("memory_fact", record is not None)
+            if record is not None:
+                matched[step["id"]] = record["result"]
+        return matched
+
+
+long_term_memory = LongTermMemory()
@@ -1,20 +1,52 @@
+import functools
 import json
+from typing import Optional
 
-from graph.config import PlanExecuteState, tavily_tool, Response, Plan
-from graph.config import llm
-from graph.function import abstract
-from graph.prompts import route_prompt, direct_answer_prompt, planner_prompt, search_query_prompt, reflect_prompt
-from utils.logger_util import logger
-from utils.parse_llm_json_util import parse_llm_json
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore
 
+from graph.config import PlanExecuteState, StepState, get_tavily, get_tokenizer, Plan, Step
+from graph.config import (get_llm, FINAL_ANSWER_TAG, MAX_PARALLEL_STEPS, PLANNER_EMITS_QUERIES, PLANNER_PREFETCH,
+                          SEARCH_TOKEN_BUDGET, SUMMARY_SKIP_TOKENS, MEMORY_ENABLED,
+                          PLANNER_HISTORY_TOKENS, REFLECT_HISTORY_TOKENS)
+from graph.context import history_context
+from graph.function import (abstract, to_plan, pick_ready_steps, need_reflection, is_weak_result, parse_reflection,
+                            SEARCH_FAILED_PREFIX)
+from graph.instrumentation import record_cache, current_thread_id
+from graph.intent import intent_classifier
+from graph.llm_cache import llm_cache
+from graph.memory import long_term_memory, memory_owner, extract_preferences
+from graph.prefetch import step_prefetcher
+from graph.search_cache import search_cache
+from graph.step_reuse import step_result_cache
+from graph.prompts import (route_prompt, direct_answer_prompt, planner_prompt, planner_query_field, search_query_prompt,
+                           reflect_prompt)
+from utils.compress_util import compress_search_result
+from utils.logger_util import logger, log_sampled
+from utils.parse_llm_json_util import parse_llm_json, JsonArrayStream
 
-def router_node(state: PlanExecuteState):
+
+async def router_node(state: PlanExecuteState, config: RunnableConfig, store: Optional[BaseStore] = None):
     """路由节点：判断意图"""
     logger.info("🚀路由师正在判断意图")
     question = state["question"]
 
+    # 记录用户表达的偏好，供之后的规划使用
+    preferences = extract_preferences(question) if MEMORY_ENABLED else []
+    if preferences:
+        log_sampled("memory", "记录用户偏好：{}", preferences)
+        await long_term_memory.remember(store, memory_owner(config),
+                                        [{"kind": "preference", "text": text} for text in preferences])
+
+    # 本地分类器有把握时直接决定，省掉一次大模型调用
+    route, confidence = intent_classifier.classify(question)
+    record_cache("intent", route is not None)
+    if route:
+        logger.info(f"用户意图（本地判断，置信度 {confidence:.2f}）：{route}")
+        return {"route": route}
+
     prompt = route_prompt.format(user_request=question)
-    raw = llm.invoke(prompt)
+    raw = await llm_cache.ainvoke(get_llm(), prompt, template_id="route_prompt", node="router")
     try:
         data = parse_llm_json(raw.content)
         route = str(data.get("route", "")).strip()
@@ -25,21 +57,24 @@ def router_node(state: PlanExecuteState):
     if route not in {"planner", "direct_answer"}:
         logger.info(f"路由结果无效，默认走 planner: {route}")
         route = "planner"
+    elif not raw.response_metadata.get("cache_hit"):
+        # 缓存命中的是之前已经记录过的结果，不重复学习
+        await intent_classifier.record(question, route)
 
     logger.info(f"用户意图：{route}")
     return {"route": route}
 
 
-def direct_answer_node(state: PlanExecuteState):
+async def direct_answer_node(state: PlanExecuteState):
     """直接回答：无需工具"""
     logger.info("🚀直接回答中")
     question = state["question"]
     prompt = direct_answer_prompt.format(user_request=question)
-    raw = llm.invoke(prompt)
+    raw = await get_llm().ainvoke(prompt, config={"tags": [FINAL_ANSWER_TAG], "run_name": "direct_answer_prompt"})
     return {"response": raw.content}
 
 
-def planner_node(state: PlanExecuteState):
+async def planner_node(state: PlanExecuteState, config: RunnableConfig, store: Optional[BaseStore] = None):
     """接收用户问题，生成初始计划"""
     logger.info("🚀规划师正在规划任务")
     question = state["question"]
@@ -47,66 +82,160 @@ def planner_node(state: PlanExecuteState):
     # 如果是多轮对话，past_steps其中会有之前的执行记录
     past_steps_context = ""
     if state.get("past_steps"):
-        past_info = "\n".join([f"步骤：{step}，结果摘要：{res[:50]}..." for step, res in state["past_steps"]])
+        past_info = await history_context.build(state["past_steps"], PLANNER_HISTORY_TOKENS,
+                                                "步骤：{step}，结果摘要：{result}", node="planner")
         past_steps_context = f"\n\n已知历史信息（不用重复查询）：\n{past_info}"
 
-    prompt = planner_prompt.format(user_request=question, past_steps_context=past_steps_context)
+    # 长期记忆：用户偏好和之前查到的相关事实
+    owner = memory_owner(config)
+    memory_context = await long_term_memory.planner_context(store, owner, question) if MEMORY_ENABLED else ""
 
-    raw = llm.invoke(prompt)
+    query_field = planner_query_field if PLANNER_EMITS_QUERIES else ""
+    prompt = planner_prompt.format(user_request=question, past_steps_context=past_steps_context,
+                                   memory_context=memory_context, query_field=query_field)
+
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if PLANNER_PREFETCH and thread_id:
+        # 流式解析计划，每完整输出一个无依赖的步骤就提前开始执行
+        parser = JsonArrayStream("steps")
+        async for chunk in get_llm().astream(prompt, config={"run_name": "planner_prompt"}):
+            for element in parser.feed(chunk.content):
+                await _prefetch_step(thread_id, element, store, owner, question)
+        content = parser.text
+    else:
+        content = (await get_llm().ainvoke(prompt, config={"run_name": "planner_prompt"})).content
     try:
-        data = parse_llm_json(raw.content)
+        data = parse_llm_json(content)
         parsed = Plan.model_validate(data)
-        steps = parsed.steps
-        logger.info(f"规划结果：{steps}")
+        steps = to_plan(parsed.steps)
+        log_sampled("plan", "规划结果：{}", steps)
     except Exception as e:
         logger.error(f"规划解析失败：{e}")
         steps = []
-    return {"plan": steps}
 
+    # 长期记忆中已有足够相近结果的步骤不再执行，结果直接作为已完成步骤交给反思
+    remembered = await long_term_memory.match_steps(store, owner, steps) if MEMORY_ENABLED and steps else {}
+    if remembered:
+        logger.info(f"长期记忆命中 {len(remembered)} 个步骤，跳过执行")
+    memory_steps = [(step["task"], remembered[step["id"]]) for step in steps if step["id"] in remembered]
+    steps = [step for step in steps if step["id"] not in remembered]
+    if thread_id:
+        step_prefetcher.discard(thread_id, keep={step["task"] for step in steps})
+    # 记忆中的结果算作已反思，否则按默认策略第一次调度时还没执行任何步骤就会先反思一次
+    reflected_steps = len(state.get("past_steps") or []) + len(memory_steps)
+    return {"plan": steps, "past_steps": memory_steps, "reflected_steps": reflected_steps}
 
-def executor_node(state: PlanExecuteState):
-    """执行者：取出计划中的第一个任务"""
-    plan = state['plan']
+
+async def _prefetch_step(thread_id: str, element, store, owner: str, question: str):
+    try:
+        step = Step.model_validate({"task": element} if isinstance(element, str) else element)
+    except Exception:
+        return
+    if step.depends_on:
+        return
+    if 0 < MAX_PARALLEL_STEPS <= step_prefetcher.count(thread_id):
+        return
+    if MEMORY_ENABLED and await long_term_memory.match_steps(store, owner, [{"id": 0, "task": step.task}]):
+        return
+    step_prefetcher.start(thread_id, {"task": step.task, "query": step.query.strip()},
+                          functools.partial(execute_step, question=question))
+
+
+async def scheduler_node(state: PlanExecuteState):
+    """调度者：按反思策略决定先反思，还是选出依赖已满足的步骤交给执行者并行执行"""
+    if need_reflection(state):
+        return {"ready_steps": []}
+    plan = state.get('plan') or []
     if not plan:
         logger.error("计划为空")
-        return {"past_steps": [], "response": ""}
-    task = plan[0]
+        return {"ready_steps": []}
+    ready, rest = pick_ready_steps(plan)
+    logger.info(f"🚀调度者本轮并行执行 {len(ready)} 个步骤，剩余 {len(rest)} 个步骤")
+    return {"ready_steps": ready, "plan": rest}
+
 
-    logger.info(f"🚀执行者正在执行任务：{task}")
+async def executor_node(state: StepState, config: RunnableConfig, store: Optional[BaseStore] = None):
+    """执行者：执行调度者分发的单个任务"""
+    task = state['step']['task']
 
-    # 1) 生成搜索关键词
-    search_query_prompt_text = search_query_prompt.format(task=task)
-    keywords_text = llm.invoke(search_query_prompt_text)
-    search_query = keywords_text.content.strip()
-    logger.info(f"搜索关键词：{search_query}")
+    thread_id = config.get("configurable", {}).get("thread_id")
+    prefetched = step_prefetcher.pop(thread_id, task) if thread_id else None
+    record_cache("prefetch", prefetched is not None)
+    if prefetched is not None:
+        logger.info("🚀执行者使用规划阶段提前执行的结果：{}", task)
+        result_str = await prefetched
+    else:
+        logger.info("🚀执行者正在执行任务：{}", task)
+        result_str = await execute_step(state['step'], state.get('question', ''))
+
+    # 查到的结果写入长期记忆，之后的规划可以直接使用
+    if MEMORY_ENABLED and not is_weak_result(result_str):
+        await long_term_memory.remember(store, memory_owner(config), [{
+            "kind": "fact", "text": task, "result": result_str, "thread_id": thread_id,
+        }])
+    return {"past_steps": [(task, result_str)]}
+
+
+async def execute_step(step: dict, question: str = "") -> str:
+    """执行单个步骤：生成关键词、搜索、压缩、摘要，返回步骤结果
+
+    其他会话已执行过范围相同、足够相近且未过期的步骤时直接复用其结果，不再搜索和摘要。
+    question 为用户的原问题，用于判断泛化任务（如“查询当地酒店价格”）能否复用。
+    """
+    task = step['task']
+
+    # 1) 生成搜索关键词：规划师已给出时直接使用，重新规划新增的步骤才需要调用大模型
+    search_query = step.get('query', '')
+    if not search_query:
+        search_query_prompt_text = search_query_prompt.format(task=task)
+        keywords_text = await llm_cache.ainvoke(get_llm(), search_query_prompt_text, template_id="search_query_prompt",
+                                                node="search_query")
+        search_query = keywords_text.content.strip()
+    log_sampled("step", "搜索关键词：{}", search_query)
 
-    # 2）调用 Tavily工具
+    # 关键词中带有地名、时间，复用时要求一致
+    if step_result_cache is not None:
+        reused = await step_result_cache.lookup(task, search_query, question)
+        if reused is not None:
+            return reused
+
+    # 2）调用 Tavily工具（优先读取搜索缓存）
     try:
-        search_result = tavily_tool.invoke(search_query)
+        if search_cache is not None:
+            search_result = await search_cache.aget_or_fetch(search_query, get_tavily().ainvoke)
+        else:
+            search_result = await get_tavily().ainvoke(search_query)
         result_str = json.dumps(search_result, ensure_ascii=False)
     except Exception as e:
+        # 并行执行时不能直接写 response，失败信息作为步骤结果交给反思节点处理
         logger.error(f"搜索失败：{e}")
-        return {"response": f"搜索失败：{e}"}
-    logger.info(f"搜索结果长度为：{len(result_str)}")
+        return f"{SEARCH_FAILED_PREFIX}：{e}"
 
-    # 3）提取摘要
-    result_str = abstract(result_str)
-    logger.info(f"摘要长度为: {len(result_str)}")
+    # 3）抽取式压缩：去掉 url 等无用字段和重复内容，只保留与任务最相关的句子
+    tokenizer = get_tokenizer()
+    await tokenizer.aload()
+    compressed = compress_search_result(search_result, f"{task} {search_query}", SEARCH_TOKEN_BUDGET, tokenizer.count)
+    compressed_tokens = tokenizer.count(compressed)
+    log_sampled("step", "搜索结果长度为：{}，压缩后约 {} tokens", len(result_str), compressed_tokens)
 
-    return {
-        "past_steps": [(task, result_str)],
-        "plan": plan[1:] # 剔除第一个任务
-    }
+    # 4）提取摘要，压缩后已经足够短时直接使用压缩结果
+    if compressed_tokens <= SUMMARY_SKIP_TOKENS:
+        result_str = compressed
+    else:
+        result_str = await abstract(compressed)
+    log_sampled("step", "摘要长度为: {}", len(result_str))
+    if step_result_cache is not None and not is_weak_result(result_str):
+        await step_result_cache.save(task, search_query, result_str, question, thread_id=current_thread_id())
+    return result_str
 
 
-def reflect_node(state: PlanExecuteState):
+async def reflect_node(state: PlanExecuteState, config: RunnableConfig):
     """重新规划器：根据执行结果，判断是否需要重新规划"""
     logger.info(f"🚀重新规划师正在判断是否需要重新规划")
-    past_steps_str = ""
-    for step, result in state['past_steps']:
-        past_steps_str += f"已完成步骤：{step}\n执行结果：{result}\n"
+    past_steps_str = await history_context.build(state['past_steps'], REFLECT_HISTORY_TOKENS,
+                                                 "已完成步骤：{step}\n执行结果：{result}", node="reflect")
 
-    current_plan_str = "\n".join(state['plan'])
+    current_plan_str = "\n".join(f"{step['id']}. {step['task']}" for step in state['plan'])
 
     prompt = reflect_prompt.format(
         question=state['question'],
@@ -114,18 +243,22 @@ def reflect_node(state: PlanExecuteState):
         current_plan=current_plan_str,
     )
 
-    raw = llm.invoke(prompt)
-    try:
-        data = parse_llm_json(raw.content)
-        result = Response.model_validate(data)
-    except Exception as e:
-        logger.error(f"重新规划解析失败：{e}")
-        result = Response(response="", next_plan=[])
+    raw = await get_llm().ainvoke(prompt, config={"tags": [FINAL_ANSWER_TAG], "run_name": "reflect_prompt"})
+    result = parse_reflection(raw.content)
 
+    reflected_steps = len(state['past_steps'])
     if result.response and result.response.strip() != "":
         logger.info("任务完成，生成最终回答。")
-        return {"response": result.response, "plan": []}
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id:
+            step_prefetcher.discard(thread_id)
+        return {"response": result.response, "plan": [], "reflected_steps": reflected_steps}
     else:
-        logger.info(f"重新规划师决策：继续执行，剩余计划：{len(result.next_plan)}个步骤")
-        logger.info(f"剩余计划：{result.next_plan}")
-        return {"plan": result.next_plan}
\ No newline at end of file
+        next_plan = to_plan(result.next_plan)
+        # 保留下来的原计划步骤沿用规划时生成的搜索关键词
+        known_queries = {step['task']: step.get('query', '') for step in state['plan']}
+        for step in next_plan:
+            step['query'] = step['query'] or known_queries.get(step['task'], '')
+        logger.info(f"重新规划师决策：继续执行，剩余计划：{len(next_plan)}个步骤")
+        log_sampled("plan", "剩余计划：{}", next_plan)
+        return {"plan": next_plan, "reflected_steps": reflected_steps}
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from utils.logger_util import log_sampled
+
+# 预执行结果超过该秒数仍未被取用则丢弃
+PREFETCH_TTL = 300
+
+
+class StepPrefetcher:
+    """规划师流式输出计划时，提前执行已完整输出且没有依赖的步骤，执行者直接取用结果"""
+
+    def __init__(self, ttl: float = PREFETCH_TTL):
+        self.ttl = ttl
+        self._tasks = {}  # (thread_id, task) -> (创建时间, asyncio.Task)
+        self.started = 0
+        self.used = 0
+
+    def start(self, thread_id: str, step: dict, run):
+        """用 run(step) 在后台执行步骤，同一会话的同一步骤只执行一次"""
+        self._sweep()
+        key = (thread_id, step["task"])
+        if key in self._tasks:
+            return
+        self._tasks[key] = (time.monotonic(), asyncio.ensure_future(run(step)))
+        self.started += 1
+        log_sampled("step", "规划未完成，提前执行步骤：{}", step['task'])
+
+    def pop(self, thread_id: str, task: str):
+        """取出预执行的 asyncio.Task，没有则返回 None"""
+        entry = self._tasks.pop((thread_id, task), None)
+        if entry is None:
+            return None
+        self.used += 1
+        return entry[1]
+
+    def count(self, thread_id: str) -> int:
+        return sum(1 for tid, _ in self._tasks if tid == thread_id)
+
+    def discard(self, thread_id: str, keep=()):
+        """取消该会话中不在 keep 里的预执行步骤（如最终计划里已经没有这一步）"""
+        for key in [key for key in self._tasks if key[0] == thread_id and key[1] not in keep]:
+            self._cancel(key)
+
+    def _sweep(self):
+        now = time.monotonic()
+        for key in [key for key, (created, _) in self._tasks.items() if now - created > self.ttl]:
+            self._cancel(key)
+
+    def _cancel(self, key):
+        _, task = self._tasks.pop(key)
+        if task.done():
+            if not task.cancelled():
+                task.exception()  # 取走异常，避免 "exception was never retrieved"
+        else:
+            task.cancel()
+
+
+step_prefetcher = StepPrefetcher()
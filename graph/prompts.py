@@ -13,6 +13,9 @@ route_prompt = """
 {user_request}
 """
 
+planner_query_field = """  - query：字符串，执行该步骤时使用的搜索关键词，简洁精准，保留地名、时间、对象等关键要素，用空格分隔，不要标点
+"""
+
 direct_answer_prompt = """
 {user_request}
 """
@@ -26,12 +29,14 @@ planner_prompt = """
 
 ## 输出格式
 仅输出 JSON，包含一个字段：
-- steps：字符串数组（string[]），每个元素为一个具体、可执行的步骤。
-
+- steps：对象数组，每个元素为一个具体、可执行的步骤，包含：
+  - task：字符串，步骤内容
+  - depends_on：整数数组，该步骤依赖的前序步骤序号（从0开始）；可以独立查询的步骤（如天气、住宿、美食）留空数组，便于并行执行
+{query_field}
 不要包含任何额外文本、解释、注释或 Markdown。
 
 ## 用户需求
-{user_request}{past_steps_context}
+{user_request}{past_steps_context}{memory_context}
 """
 
 search_query_prompt = """
@@ -64,7 +69,7 @@ reflect_prompt = """
 ## 输出格式
 仅输出 JSON，包含两个字段：
 - response：字符串（最终回答，信息足够时填写；否则为空字符串）
-- next_plan：字符串数组（下一步要执行的计划步骤）
+- next_plan：对象数组（下一步要执行的计划步骤），每个元素包含 task（字符串）和 depends_on（依赖的 next_plan 中步骤序号，整数数组，无依赖为空数组）
 
 不要包含任何额外文本、解释或格式。
 
@@ -95,3 +100,46 @@ summary_prompt = """
 ## 输入
 {search_results}
 """
+
+batch_summary_prompt = """
+# 你是一个专业的摘要生成器
+
+## 任务说明
+下面给出多份相互独立的搜索结果原文，请分别为每一份提取一个简洁、信息密集的中文摘要。去除冗余与重复，统一术语与单位，保留关键事实（时间、地点、对象、数量/价格、限制条件）。
+
+## 行为准则
+- 每份摘要只使用对应编号的原文，不要混用其他原文的信息。
+- 不编造；若信息存在冲突，指出冲突并以权威来源为主。
+- 优先采用最新时间与最权威来源的信息。
+- 语言简洁明确，避免空话。
+
+## 输出格式
+仅输出 JSON，包含一个字段：
+- summaries：字符串数组，长度必须为 {count}，第 i 个元素是第 i 份原文的摘要（每份尽量控制在300字内）
+
+不要包含任何额外文本、解释或 Markdown。
+
+## 输入
+{search_results}
+"""
+
+history_summary_prompt = """
+# 你是一个执行记录压缩器
+
+## 任务说明
+下面是一次旅游规划过程中较早的执行记录（可能包含上一次压缩得到的摘要）。请把它们合并压缩成一段简洁的中文摘要，供后续规划和反思参考。
+
+## 行为准则
+- 保留对后续决策有用的关键事实（时间、地点、价格、开放时间、交通、限制条件）和已经确认查不到的信息。
+- 不编造；按主题归并，去掉重复和过程性描述。
+- 摘要不超过 {max_chars} 字。
+
+## 输出格式
+仅输出 JSON，包含一个字段：
+- summary：字符串
+
+不要包含任何额外文本、解释或 Markdown。
+
+## 输入
+{history}
+"""
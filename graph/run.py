@@ -1,47 +1,94 @@
+import asyncio
 import os
 import uuid
 
-from langgraph.checkpoint.postgres import PostgresSaver
-from psycopg_pool import ConnectionPool
-
-from graph.workflow import workflow
+from graph.checkpoint_retention import CheckpointRetention
+from graph.config import METRICS_PROM_PATH, CHECKPOINT_RETENTION_INTERVAL
+from graph.db import open_persistence
+from graph.instrumentation import metrics, metrics_handler, trace
+from graph.streaming import astream_answer
+from graph.transport import aclose_http_clients, connection_stats
+from graph.workflow import get_app
 from utils.logger_util import logger
 
-if __name__ == "__main__":
-    uuid = uuid.uuid4().hex
-    DB_URI = os.getenv("POSTGRES_URI")
-    with ConnectionPool(DB_URI) as pool:
-        # 1) 初始化PgSaver
-        checkpointer = PostgresSaver(pool)
+# 单个进程内同时处理的会话数上限
+MAX_CONCURRENT_CONVERSATIONS = int(os.getenv("MAX_CONCURRENT_CONVERSATIONS", "200"))
+
+
+async def run_conversation(app, question: str, thread_id: str = None, on_event=None):
+    """在指定 thread_id 上运行一轮对话，返回最终回答；on_event 用于接收节点进度和回答 token"""
+    config = {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}, "callbacks": [metrics_handler]}
+    # 同一会话的后续轮次会从检查点恢复上一轮的状态，清空上一轮的回答，否则第一次反思后就会带着旧回答结束
+    state = {"question": question, "response": ""}
+    final_response = ""
+    async for event in astream_answer(app, state, config):
+        if on_event is not None:
+            on_event(event)
+        if event["type"] == "done":
+            final_response = event["response"]
+    # 输出最终回答
+    logger.info(f"问题：{question}")
+    logger.info(f"最终回答：{final_response}")
+    return final_response
+
+
+def print_event(event):
+    """把回答 token 实时打印到终端"""
+    if event["type"] == "progress":
+        logger.info(f"节点完成：{event['node']}")
+    elif event["type"] == "token":
+        print(event["text"], end="", flush=True)
+    elif event["type"] == "discard":
+        print("\n（以上回答未完成，已作废）", flush=True)
+    elif event["type"] == "done":
+        print(flush=True)
+
+
+async def serve(app, conversations, concurrency: int = MAX_CONCURRENT_CONVERSATIONS, on_event=None):
+    """在同一个事件循环上并发处理多个会话，conversations 为 (thread_id, question) 列表"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(thread_id, question):
+        async with semaphore:
+            try:
+                return await run_conversation(app, question, thread_id, on_event)
+            except Exception as e:
+                logger.error(f"会话 {thread_id} 运行失败：{e}")
+                return ""
 
-        # 2) 首次运行，必须执行 setup()，它会自动在库里创建两张表（checkpoints、checkpoint_writes）
-        checkpointer.setup()
+    return await asyncio.gather(*(_run(thread_id, question) for thread_id, question in conversations))
 
-        app = workflow.compile(checkpointer=checkpointer)
 
-        config = {"configurable": {"thread_id": uuid}}
+async def main():
+    # 1) 打开检查点和长期记忆共用的连接池，表结构版本已是最新时不再执行 setup()
+    async with open_persistence() as (pool, checkpointer, store):
+        app = get_app(checkpointer, store)
+
+        # 2) 后台按保留策略清理空闲会话的历史检查点
+        retention = CheckpointRetention(pool)
+        if CHECKPOINT_RETENTION_INTERVAL > 0:
+            retention.start(CHECKPOINT_RETENTION_INTERVAL)
+
+        thread_id = uuid.uuid4().hex
 
         # 运行第一轮
         question = "我想去洛阳玩两天"
-        state = {"question": question}
         logger.info("第一轮运行开始")
-        for event in app.stream(state, config=config):
-            pass
-        # 输出最终回答
-        final_state = app.get_state(config)
-        final_response = final_state.values.get('response', '')
-        logger.info(f"问题：{question}")
-        logger.info(f"最终回答：{final_response}")
-
-        # # 运行第二轮（测试记忆）
+        await serve(app, [(thread_id, question)], on_event=print_event)
+
+        # # 运行第二轮（测试记忆）：同一 thread_id 上继续对话
         # logger.info("第二轮运行开始")
-        # new_question = "刚才提到了哪些美食"
-        # app.update_state(config, {"question": new_question, "response": ""})
-        # # 传入None，表示延续状态
-        # for event in app.stream(None, config=config):
-        #     pass
-        # # 输出最终回答
-        # final_state = app.get_state(config)
-        # final_response = final_state.values.get('response', '')
-        # logger.info(f"问题：{question}")
-        # logger.info(f"最终回答：{final_response}")
\ No newline at end of file
+        # await run_conversation(app, "刚才提到了哪些美食", thread_id, on_event=print_event)
+
+        await retention.stop()
+
+        # 导出指标和追踪
+        if METRICS_PROM_PATH:
+            metrics.export_prometheus(METRICS_PROM_PATH)
+        await asyncio.to_thread(trace.flush)
+        logger.info(f"HTTP 连接复用：{connection_stats()}")
+        await aclose_http_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from graph.config import (SEARCH_CACHE_BACKEND, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_ROWS,
+                          SEARCH_CACHE_SQLITE_PATH)
+from graph.instrumentation import record_cache
+from utils.cache_util import TTLCache
+from utils.logger_util import log_sampled, logger
+
+# 持久层每写入多少次做一次过期清理和容量淘汰
+EVICT_EVERY = 100
+
+
+def normalize_query(query: str) -> str:
+    """归一化搜索关键词：全半角统一、小写、合并空白，使“洛阳　美食”和“洛阳  美食”命中同一条缓存
+
+    词序和重复词保留：“郑州 洛阳 高铁”和“洛阳 郑州 高铁”方向不同，不能共用结果。
+    """
+    text = unicodedata.normalize("NFKC", query).lower()
+    return " ".join(text.split())
+
+
+class SqliteSearchBackend:
+    """本机 SQLite 持久层，同一台机器上的多个 worker 进程共享"""
+
+    def __init__(self, path: str, max_rows: int):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, query TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed_at_idx ON search_cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM search_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, query: str, value, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, query, json.dumps(value, ensure_ascii=False), expires_at, time.time()),
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目，返回删除条数"""
+        with self._lock:
+            expired = self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,)
+            ).rowcount
+            self._conn.commit()
+        return expired + overflow
+
+
+class PostgresSearchBackend:
+    """Postgres 持久层，使用同一个 POSTGRES_URI 的所有 worker 共享"""
+
+    def __init__(self, conninfo: str, max_rows: int):
+        from psycopg.types.json import Jsonb
+        from psycopg_pool import ConnectionPool
+
+        self.max_rows = max_rows
+        self._jsonb = Jsonb
+        self._pool = ConnectionPool(conninfo, min_size=1, max_size=4, kwargs={"autocommit": True})
+        with self._pool.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, query TEXT NOT NULL, value JSONB NOT NULL, "
+                "expires_at DOUBLE PRECISION, accessed_at DOUBLE PRECISION NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed_at_idx ON search_cache (accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "UPDATE search_cache SET accessed_at = %s "
+                "WHERE key = %s AND (expires_at IS NULL OR expires_at > %s) RETURNING value", (now, key, now)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, query: str, value, expires_at: float):
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO search_cache (key, query, value, expires_at, accessed_at) VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at, "
+                "accessed_at = EXCLUDED.accessed_at",
+                (key, query, self._jsonb(value), expires_at, time.time()),
+            )
+
+    def evict(self) -> int:
+        with self._pool.connection() as conn:
+            expired = conn.execute("DELETE FROM search_cache WHERE expires_at <= %s", (time.time(),)).rowcount
+            overflow = conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY accessed_at DESC OFFSET %s)", (self.max_rows,)
+            ).rowcount
+        return expired + overflow
+
+
+class SearchCache:
+    """两级搜索结果缓存：进程内 LRU + 可选的持久层，并合并同一关键词的并发请求"""
+
+    def __init__(self, backend=None, ttl: int = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.local = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.backend = backend
+        self.backend_hits = 0
+        self.backend_evictions = 0
+        self.fetches = 0
+        self._writes = 0
+        self._inflight = {}
+
+    async def aget_or_fetch(self, query: str, fetch):
+        """命中缓存直接返回，否则调用 fetch(query) 获取结果并写入缓存"""
+        key = normalize_query(query)
+        value = self.local.get(key)
+        record_cache("search_local", value is not None)
+        if value is not None:
+            log_sampled("cache", "搜索缓存命中（进程内）：{}", query)
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, query, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, query: str, fetch):
+        value = await self._backend_call("get", key)
+        if self.backend is not None:
+            record_cache("search_backend", value is not None)
+        if value is not None:
+            self.backend_hits += 1
+            log_sampled("cache", "搜索缓存命中（持久层）：{}", query)
+        else:
+            self.fetches += 1
+            value = await fetch(query)
+            await self._backend_call("set", key, query, value, time.time() + self.ttl if self.ttl else None)
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self.backend_evictions += await self._backend_call("evict") or 0
+        self.local.set(key, value)
+        return value
+
+    async def _backend_call(self, method: str, *args):
+        """持久层读写放到线程池中执行，失败只记录日志，不影响搜索"""
+        if self.backend is None:
+            return None
+        try:
+            return await asyncio.to_thread(getattr(self.backend, method), *args)
+        except Exception as e:
+            logger.error(f"搜索缓存持久层 {method} 失败：{e}")
+            return None
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        """各级命中、未命中及淘汰计数"""
+        local = self.local.stats()
+        return {
+            "local_hits": local["hits"],
+            "local_size": local["size"],
+            "local_evictions": local["evictions"],
+            "backend_hits": self.backend_hits,
+            "backend_evictions": self.backend_evictions,
+            "misses": self.fetches,
+        }
+
+
+def build_search_cache():
+    """根据 SEARCH_CACHE_BACKEND 构造搜索缓存，返回 None 表示不启用缓存"""
+    backend_name = SEARCH_CACHE_BACKEND.lower()
+    if backend_name == "none":
+        return None
+    backend = None
+    try:
+        if backend_name == "sqlite":
+            backend = SqliteSearchBackend(SEARCH_CACHE_SQLITE_PATH, SEARCH_CACHE_MAX_ROWS)
+        elif backend_name == "postgres":
+            backend = PostgresSearchBackend(os.getenv("POSTGRES_URI"), SEARCH_CACHE_MAX_ROWS)
+    except Exception as e:
+        logger.error(f"搜索缓存持久层初始化失败，仅使用进程内缓存：{e}")
+    return SearchCache(backend=backend)
+
+
+search_cache = build_search_cache()
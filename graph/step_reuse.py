@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+
+from langgraph.store.base import PutOp
+
+from graph.config import (STEP_REUSE_ENABLED, STEP_REUSE_THRESHOLD, STEP_REUSE_GENERIC_THRESHOLD, STEP_REUSE_TTLS,
+                          STEP_REUSE_MAX_ENTRIES, EMBEDDING_DIMS, MEMORY_UPSERT_BATCH)
+from graph.instrumentation import metrics, record_cache, trace
+from graph.memory import long_term_memory, topic_of, digits_of
+from graph.search_cache import normalize_query
+from utils.logger_util import logger, log_sampled
+from utils.vector_index_util import VectorIndex
+
+NAMESPACE = ("step_results",)
+
+# 指代性的地点、时间：任务本身不足以确定查询对象，要结合用户的原问题
+GENERIC_RE = re.compile(r"当地|本地|该地|该市|此地|那里|这里|目的地|附近|周边|当天|近期|最近|这几天")
+_PUNCT_RE = re.compile(r"[\s\W_]+")
+
+metrics.describe("agent_step_reuse_age_seconds", "复用的步骤结果距离生成时的时长")
+
+
+def is_generic(task: str, query: str) -> bool:
+    return not query or bool(GENERIC_RE.search(task))
+
+
+def scope_of(task: str, query: str, question: str = "") -> str:
+    """复用范围：只有范围完全相同的结果才可能复用
+
+    由归一化的搜索关键词（带有地名、时间等要素）和任务中的数字（日期、天数、人数）组成；
+    泛化任务的关键词同样泛化，再加上归一化的原问题。
+    """
+    parts = [normalize_query(query), digits_of(task)]
+    if is_generic(task, query):
+        parts.append(_PUNCT_RE.sub("", unicodedata.normalize("NFKC", question).lower()))
+    return "|".join(parts)
+
+
+def _current_store():
+    """节点（及其创建的预执行任务）内部返回编译图时传入的 Store"""
+    try:
+        from langgraph.config import get_store
+        return get_store()
+    except RuntimeError:
+        return None
+
+
+class StepResultCache:
+    """跨会话复用步骤结果：复用范围（见 scope_of）相同、任务描述的向量相似度达到阈值且未过期时直接返回已有结果
+
+    所有用户共享，所以除了任务相似，还要求关键词和任务中的数字一致，避免把另一个城市、另一天的结果给出去；
+    泛化任务使用更高的阈值 generic_threshold。结果按主题类别设置保鲜时间（STEP_REUSE_TTLS），记录来源会话、关键词和生成时间。
+    有 Store 时持久化到 ("step_results",) 命名空间，进程首次使用时加载，供多个 worker 共享。
+    """
+
+    def __init__(self, threshold: float = STEP_REUSE_THRESHOLD, ttls: dict = None,
+                 max_entries: int = STEP_REUSE_MAX_ENTRIES, generic_threshold: float = STEP_REUSE_GENERIC_THRESHOLD):
+        self.threshold = threshold
+        self.generic_threshold = generic_threshold
+        self.ttls = ttls or STEP_REUSE_TTLS
+        self.max_entries = max_entries
+        self.index = VectorIndex(EMBEDDING_DIMS, MEMORY_UPSERT_BATCH)
+        self._loading = None
+        self.hits = 0
+        self.misses = 0
+
+    async def _ensure_loaded(self, store):
+        if store is None:
+            return
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load(store))
+        await self._loading
+
+    async def _load(self, store):
+        items, offset = [], 0
+        try:
+            while len(items) < self.max_entries:
+                page = await store.asearch(NAMESPACE, limit=100, offset=offset)
+                items += [item for item in page if item.value.get("expires_at", 0) > time.time()]
+                if len(page) < 100:
+                    break
+                offset += 100
+        except Exception as e:
+            logger.error(f"步骤结果加载失败：{e}")
+            return
+        if items:
+            vectors = await long_term_memory.embed([item.value["task"] for item in items])
+            self.index.upsert([item.key for item in items], vectors, [item.value for item in items])
+        logger.info(f"已加载 {len(items)} 条可复用的步骤结果")
+
+    async def lookup(self, task: str, query: str, question: str = "", store=None):
+        """返回可复用的步骤结果，没有范围相同、足够相近且未过期的结果时返回 None"""
+        store = store if store is not None else _current_store()
+        await self._ensure_loaded(store)
+        if not len(self.index):
+            return None
+        now = time.time()
+        scope = scope_of(task, query, question)
+        threshold = self.generic_threshold if is_generic(task, query) else self.threshold
+        vector = await long_term_memory.embed([task])
+        hits = self.index.search(vector, k=1, threshold=threshold,
+                                 where=lambda record: record["expires_at"] > now and record.get("scope") == scope)[0]
+        record_cache("step_reuse", bool(hits))
+        if not hits:
+            self.misses += 1
+            return None
+        self.hits += 1
+        _, score, record = hits[0]
+        age = now - record["created_at"]
+        metrics.observe("agent_step_reuse_age_seconds", age, topic=record["topic"])
+        trace.write({"kind": "step_reuse", "task": task, "matched_task": record["task"], "score": round(score, 4),
+                     "topic": record["topic"], "age": age, "source_thread_id": record.get("thread_id"),
+                     "query": record.get("query")})
+        log_sampled("cache", "复用步骤结果：{} ≈ {}（相似度 {:.2f}，来自会话 {}，{:.0f} 分钟前）",
+                    task, record['task'], score, record.get('thread_id'), age / 60)
+        return record["result"]
+
+    async def save(self, task: str, query: str, result: str, question: str = "", thread_id: str = None, store=None):
+        store = store if store is not None else _current_store()
+        await self._ensure_loaded(store)
+        topic = topic_of(task)
+        ttl = self.ttls.get(topic, self.ttls.get("default", 86400))
+        if ttl <= 0:
+            return
+        now = time.time()
+        scope = scope_of(task, query, question)
+        record = {"task": task, "query": query, "scope": scope, "result": result, "topic": topic,
+                  "thread_id": thread_id, "created_at": now, "expires_at": now + ttl}
+        key = hashlib.sha256(f"{scope}|{task}".encode("utf-8")).hexdigest()[:32]
+        vector = await long_term_memory.embed([task])
+        self.index.upsert([key], vector, [record])
+        if len(self.index) > self.max_entries:
+            self._evict(now)
+        if store is not None:
+            try:
+                await store.abatch([PutOp(NAMESPACE, key, record, index=False)])
+            except Exception as e:
+                logger.error(f"步骤结果持久化失败：{e}")
+
+    def _evict(self, now: float):
+        """先删除过期的结果，仍超出上限时删除最早生成的"""
+        items = self.index.items()
+        doomed = [key for key, record in items if record["expires_at"] <= now]
+        overflow = len(items) - len(doomed) - self.max_entries
+        if overflow > 0:
+            alive = sorted((record["created_at"], key) for key, record in items if record["expires_at"] > now)
+            doomed += [key for _, key in alive[:overflow]]
+        self.index.delete(doomed)
+
+    def clear(self):
+        """清空进程内索引（不删除 Store 中的记录），下次使用时重新从 Store 加载"""
+        self.index = VectorIndex(EMBEDDING_DIMS, MEMORY_UPSERT_BATCH)
+        self._loading = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.index)}
+
+
+step_result_cache = StepResultCache() if STEP_REUSE_ENABLED else None
@@ -0,0 +1,75 @@
+import time
+
+from graph.config import FINAL_ANSWER_TAG, get_tokenizer
+from graph.instrumentation import metrics
+from utils.logger_util import logger
+from utils.parse_llm_json_util import JsonStringFieldStream
+
+
+async def astream_answer(app, state, config):
+    """流式运行一轮对话
+
+    依次产出四类事件：
+    - {"type": "progress", "node": 节点名}：某个节点执行完成
+    - {"type": "token", "node": 节点名, "text": 文本}：最终回答的增量 token
+    - {"type": "discard", "node": 节点名}：此前推送的 token 作废（反思输出的回答没有写完，最终决定继续执行）
+    - {"type": "done", "response": 最终回答, "ttft": 首 token 耗时, "ttlt": 末 token 耗时}：对话结束，耗时单位为秒
+    direct_answer 的输出直接透传；reflect 输出的是 JSON，只提取其中 response 字段的内容：字段为空（继续执行）时
+    不推送任何内容，字段非空即为最终回答，提取规则与 parse_reflection 一致。只有 response 字段没有完整输出时
+    反思节点才会改为继续执行，此时补发 discard。
+    """
+    # token 计数器的编码在线程池中加载，之后节点和回调中的计数不会在事件循环上读文件或下载
+    await get_tokenizer().aload()
+    started = time.perf_counter()
+    first_token_at = last_token_at = None
+    extractors = {}  # 每次反思调用各自独立提取 response 字段
+    streamed = []
+    reflect_streamed = 0  # 当前这次反思已推送的 token 数
+
+    async for mode, chunk in app.astream(state, config=config, stream_mode=["updates", "messages"]):
+        if mode == "updates":
+            for node, update in chunk.items():
+                if node == "reflect":
+                    if reflect_streamed and not (isinstance(update, dict) and update.get("response")):
+                        del streamed[-reflect_streamed:]
+                        if not streamed:
+                            first_token_at = last_token_at = None
+                        yield {"type": "discard", "node": node}
+                    reflect_streamed = 0
+                yield {"type": "progress", "node": node}
+            continue
+
+        message, metadata = chunk
+        if FINAL_ANSWER_TAG not in metadata.get("tags", []) or not isinstance(message.content, str):
+            continue
+        node = metadata.get("langgraph_node")
+        if node == "reflect":
+            extractor = extractors.setdefault(message.id, JsonStringFieldStream("response"))
+            text = extractor.feed(message.content)
+        else:
+            text = message.content
+        if not text:
+            continue
+        last_token_at = time.perf_counter()
+        if first_token_at is None:
+            first_token_at = last_token_at
+        streamed.append(text)
+        if node == "reflect":
+            reflect_streamed += 1
+        yield {"type": "token", "node": node, "text": text}
+
+    final_state = await app.aget_state(config)
+    response = final_state.values.get("response", "")
+    if not streamed and response:
+        # 回答不是流式生成的（如直接命中缓存），一次性补发
+        last_token_at = first_token_at = time.perf_counter()
+        yield {"type": "token", "node": None, "text": response}
+
+    ttft = first_token_at - started if first_token_at else None
+    ttlt = last_token_at - started if last_token_at else None
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if ttft is not None:
+        metrics.observe("agent_ttft_seconds", ttft)
+        metrics.observe("agent_ttlt_seconds", ttlt)
+        logger.info(f"会话 {thread_id} 首 token 耗时 {ttft:.3f}s，末 token 耗时 {ttlt:.3f}s")
+    yield {"type": "done", "response": response, "ttft": ttft, "ttlt": ttlt}
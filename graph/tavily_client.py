@@ -0,0 +1,37 @@
+from typing import Any, Dict
+
+from langchain_tavily._utilities import TAVILY_API_URL, TavilySearchAPIWrapper
+
+from graph.transport import get_async_http_client, get_http_client
+
+
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """Tavily 接口封装：请求改走共用的长连接客户端
+
+    原实现同步调用每次 requests.post、异步调用每次新建 aiohttp 会话，都要重新 TCP + TLS 握手。
+    """
+
+    def _request(self, query: str, kwargs: dict):
+        params = {k: v for k, v in {"query": query, **kwargs}.items() if v is not None}
+        headers = {
+            "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+            "Content-Type": "application/json",
+            "X-Client-Source": "langchain-tavily",
+        }
+        return f"{self.api_base_url or TAVILY_API_URL}/search", params, headers
+
+    @staticmethod
+    def _check(response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            detail = response.json().get("detail", {})
+            error_message = detail.get("error") if isinstance(detail, dict) else "Unknown error"
+            raise ValueError(f"Error {response.status_code}: {error_message}")
+        return response.json()
+
+    def raw_results(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        url, params, headers = self._request(query, kwargs)
+        return self._check(get_http_client("search").post(url, json=params, headers=headers))
+
+    async def raw_results_async(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        url, params, headers = self._request(query, kwargs)
+        return self._check(await get_async_http_client("search").post(url, json=params, headers=headers))
@@ -0,0 +1,127 @@
+import importlib.util
+import threading
+import time
+
+import httpx
+
+from graph.config import (HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, HTTP2_ENABLED,
+                          HTTP_CONNECT_TIMEOUT, HTTP_POOL_TIMEOUT, LLM_READ_TIMEOUT, SEARCH_READ_TIMEOUT)
+from graph.instrumentation import metrics
+from utils.logger_util import logger
+
+# 各端点的读超时；连接、等待连接池的超时所有端点相同
+READ_TIMEOUTS = {"llm": LLM_READ_TIMEOUT, "search": SEARCH_READ_TIMEOUT}
+
+metrics.describe("agent_http_requests_total", "经共用连接池发出的 HTTP 请求数")
+metrics.describe("agent_http_connections_total", "新建的 HTTP 连接数，tls=true 表示完成了 TLS 握手")
+metrics.describe("agent_http_connect_seconds", "新建连接（TCP + TLS）耗时")
+
+_clients = {}  # (端点, 是否异步) -> 客户端
+_lock = threading.Lock()
+
+
+def http2_enabled() -> bool:
+    if HTTP2_ENABLED == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return HTTP2_ENABLED.lower() == "true"
+
+
+def endpoint_timeout(endpoint: str) -> httpx.Timeout:
+    read = READ_TIMEOUTS.get(endpoint, SEARCH_READ_TIMEOUT)
+    return httpx.Timeout(connect=HTTP_CONNECT_TIMEOUT, read=read, write=read, pool=HTTP_POOL_TIMEOUT)
+
+
+def _tracer(endpoint: str):
+    """httpcore 的 trace 扩展：统计请求数、新建连接数和建连耗时，请求数减去新建连接数即为复用次数"""
+    connect = {}
+
+    def trace(event: str, info: dict):
+        if event == "connection.connect_tcp.started":
+            connect["started"] = time.perf_counter()
+        elif event == "connection.start_tls.complete":
+            connect["tls"] = "true"
+        elif event.endswith("send_request_headers.started"):
+            metrics.inc("agent_http_requests_total", endpoint=endpoint)
+            if "started" in connect:  # 本次请求新建了连接
+                metrics.inc("agent_http_connections_total", endpoint=endpoint, tls=connect.get("tls", "false"))
+                metrics.observe("agent_http_connect_seconds", time.perf_counter() - connect.pop("started"),
+                                endpoint=endpoint)
+
+    return trace
+
+
+def _count_retry(endpoint: str, request: httpx.Request):
+    """OpenAI SDK 的每次重试都是一个新请求，请求头 x-stainless-retry-count 为已重试次数"""
+    if request.headers.get("x-stainless-retry-count", "0") not in ("", "0"):
+        metrics.inc("agent_retries_total", kind="http", name=endpoint)
+
+
+def _event_hooks(endpoint: str, is_async: bool):
+    if is_async:
+        async def on_request(request: httpx.Request):
+            trace = _tracer(endpoint)
+
+            async def async_trace(event, info):
+                trace(event, info)
+
+            request.extensions["trace"] = async_trace
+            _count_retry(endpoint, request)
+    else:
+        def on_request(request: httpx.Request):
+            request.extensions["trace"] = _tracer(endpoint)
+            _count_retry(endpoint, request)
+    return {"request": [on_request]}
+
+
+def _build(endpoint: str, is_async: bool):
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                          keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    client_cls = httpx.AsyncClient if is_async else httpx.Client
+    client = client_cls(limits=limits, timeout=endpoint_timeout(endpoint), http2=http2_enabled(),
+                        event_hooks=_event_hooks(endpoint, is_async))
+    logger.info(f"创建共用 HTTP 客户端：{endpoint}（{'异步' if is_async else '同步'}，HTTP/2 {http2_enabled()}）")
+    return client
+
+
+def _get(endpoint: str, is_async: bool):
+    client = _clients.get((endpoint, is_async))
+    if client is None or client.is_closed:
+        with _lock:
+            client = _clients.get((endpoint, is_async))
+            if client is None or client.is_closed:
+                client = _clients[(endpoint, is_async)] = _build(endpoint, is_async)
+    return client
+
+
+def get_http_client(endpoint: str) -> httpx.Client:
+    """端点（llm / search）共用的同步客户端"""
+    return _get(endpoint, False)
+
+
+def get_async_http_client(endpoint: str) -> httpx.AsyncClient:
+    """端点共用的异步客户端；连接属于创建时的事件循环，同一进程内应只在一个事件循环中使用"""
+    return _get(endpoint, True)
+
+
+def connection_stats() -> dict:
+    """各端点的请求数、新建连接数和连接复用率"""
+    stats = {}
+    for endpoint in READ_TIMEOUTS:
+        requests = metrics.value("agent_http_requests_total", endpoint=endpoint)
+        connections = sum(metrics.value("agent_http_connections_total", endpoint=endpoint, tls=tls)
+                          for tls in ("true", "false"))
+        stats[endpoint] = {"requests": requests, "connections": connections,
+                           "reuse_rate": round(1 - connections / requests, 4) if requests else None}
+    return stats
+
+
+async def aclose_http_clients():
+    """进程退出前关闭所有共用客户端"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            client.close()
@@ -1,13 +1,16 @@
+import threading
+
 from langgraph.graph import END, StateGraph, START
 
 from graph.config import PlanExecuteState
-from graph.function import route_by_intent, should_end
-from graph.nodes import router_node, planner_node, executor_node, direct_answer_node, reflect_node
+from graph.function import route_by_intent, should_end, dispatch_steps
+from graph.nodes import router_node, planner_node, scheduler_node, executor_node, direct_answer_node, reflect_node
 
 workflow = StateGraph(PlanExecuteState)
 
 workflow.add_node("router", router_node)
 workflow.add_node("planner", planner_node)
+workflow.add_node("scheduler", scheduler_node)
 workflow.add_node("executor", executor_node)
 workflow.add_node("reflect", reflect_node)
 workflow.add_node("direct_answer", direct_answer_node)
@@ -22,8 +25,10 @@ workflow.add_conditional_edges(
     }
 )
 workflow.add_edge("direct_answer", END)
-workflow.add_edge("planner", "executor")  # 规划 -> 执行者
-workflow.add_edge("executor", "reflect")  # 执行者 -> 反思
+workflow.add_edge("planner", "scheduler")  # 规划 -> 调度者
+# 调度者把依赖已满足的步骤通过 Send 并行分发给执行者；按反思策略需要反思或没有可执行步骤时进入反思
+workflow.add_conditional_edges("scheduler", dispatch_steps, ["executor", "reflect"])
+workflow.add_edge("executor", "scheduler")  # 执行者（本轮全部完成后）-> 调度者，跳过的反思直接进入下一轮
 
 # 添加条件分支
 workflow.add_conditional_edges(
@@ -31,6 +36,20 @@ workflow.add_conditional_edges(
     should_end,  # 判断是否结束
     {
         True: END,  # 如果返回 True，流程结束
-        False: "executor"  # 如果返回 False，继续执行
+        False: "scheduler"  # 如果返回 False，继续调度剩余步骤
     }
-)
\ No newline at end of file
+)
+_compiled = {}  # (id(checkpointer), id(store)) -> (checkpointer, store, 编译后的图)；持有对象引用，id 不会被复用
+_compile_lock = threading.Lock()
+
+
+def get_app(checkpointer=None, store=None):
+    """编译后的图：同一组 checkpointer 和 store 只编译一次，之后复用"""
+    key = (id(checkpointer), id(store))
+    entry = _compiled.get(key)
+    if entry is None:
+        with _compile_lock:
+            entry = _compiled.get(key)
+            if entry is None:
+                entry = _compiled[key] = (checkpointer, store, workflow.compile(checkpointer=checkpointer, store=store))
+    return entry[2]
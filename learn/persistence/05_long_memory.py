@@ -6,6 +6,8 @@ from langgraph.graph import StateGraph, START, END
 from dotenv import load_dotenv
 from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.store.postgres import PostgresStore
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
 
 class State(TypedDict):
@@ -55,28 +57,29 @@ DB_URI = os.getenv("POSTGRES_URI")
 
 print("正在连接数据库...")
 
-# 1. 打开短期记忆 (Checkpointer) 的连接
-with PostgresSaver.from_conn_string(DB_URI) as checkpointer:
-    # 2. 打开长期记忆 (Store) 的连接
-    with PostgresStore.from_conn_string(DB_URI) as in_memory_store:
-        # --- 初始化建表 ---
-        # 第一次运行时需要 setup，建立 checkpoints 和 store 表
-        checkpointer.setup()
-        in_memory_store.setup()
+# 短期记忆 (Checkpointer) 和长期记忆 (Store) 共用一个连接池，不再各自建立连接
+pool_kwargs = {"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row}
+with ConnectionPool(DB_URI, min_size=1, max_size=4, kwargs=pool_kwargs) as pool:
+    checkpointer = PostgresSaver(pool)
+    in_memory_store = PostgresStore(pool)
+    # --- 初始化建表 ---
+    # 第一次运行时需要 setup，建立 checkpoints 和 store 表（服务中由 graph/db.py 按版本号判断是否需要）
+    checkpointer.setup()
+    in_memory_store.setup()
 
-        # --- 编译图 ---
-        app = workflow.compile(checkpointer=checkpointer, store=in_memory_store)
+    # --- 编译图 ---
+    app = workflow.compile(checkpointer=checkpointer, store=in_memory_store)
 
-        # --- 开始运行业务逻辑 ---
+    # --- 开始运行业务逻辑 ---
 
-        # 聊天窗口1对话
-        config_1 = {"configurable": {"thread_id": "1", "user_id": "xiaoming"}}
-        app.invoke({"messages": ["我喜欢麻辣烫"]}, config_1)
-        print("AI: 已将喜好记录到长期记忆中")
+    # 聊天窗口1对话
+    config_1 = {"configurable": {"thread_id": "1", "user_id": "xiaoming"}}
+    app.invoke({"messages": ["我喜欢麻辣烫"]}, config_1)
+    print("AI: 已将喜好记录到长期记忆中")
 
-        # 聊天窗口2对话
-        config_2 = {"configurable": {"thread_id": "2", "user_id": "xiaoming"}}
-        final_state = app.invoke({"messages": ["今天晚上吃什么"]}, config_2)
+    # 聊天窗口2对话
+    config_2 = {"configurable": {"thread_id": "2", "user_id": "xiaoming"}}
+    final_state = app.invoke({"messages": ["今天晚上吃什么"]}, config_2)
 
-        print(f"AI的回答：{final_state['messages'][-1]}")
+    print(f"AI的回答：{final_state['messages'][-1]}")
 
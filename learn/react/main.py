@@ -1,11 +1,12 @@
-import ast
-import re
 import os
-import operator as op
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
+from graph.transport import endpoint_timeout, get_http_client
+from utils.arith_util import ArithEvaluator
 from utils.logger_util import logger
 
 load_dotenv()
@@ -16,9 +17,11 @@ llm = ChatOpenAI(
     base_url=os.getenv("DEEPSEEK_BASE_URL"),
     temperature=0.0,
     streaming=False,
+    timeout=endpoint_timeout("llm"),
+    http_client=get_http_client("llm"),
 )
 
-STOP_SEQS = ["\nObservation:", "Observation:"]
+STOP_SEQS = ["\nObservation", "Observation:"]
 # stop 参数，会在生成指定内容前，停止大模型继续生成，把前面已经生成的内容返回
 llm_step = llm.bind(stop=STOP_SEQS)
 
@@ -27,38 +30,14 @@ def get_weather(location):
     """模拟查询天气的工具"""
     return f"{location} 今天天气晴朗，气温 25 度。"
 
-_ALLOWED_OPS = {
-    ast.Add: op.add,
-    ast.Sub: op.sub,
-    ast.Mult: op.mul,
-    ast.Div: op.truediv,
-    ast.Pow: op.pow,
-    ast.Mod: op.mod,
-    ast.UAdd: op.pos,
-    ast.USub: op.neg,
-}
-
-
-def _safe_arith_eval(node):
-    if isinstance(node, ast.Expression):
-        return _safe_arith_eval(node.body)
-    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-        return node.value
-    if isinstance(node, ast.BinOp) and type(node.op) in _ALLOWED_OPS:
-        return _ALLOWED_OPS[type(node.op)](_safe_arith_eval(node.left), _safe_arith_eval(node.right))
-    if isinstance(node, ast.UnaryOp) and type(node.op) in _ALLOWED_OPS:
-        return _ALLOWED_OPS[type(node.op)](_safe_arith_eval(node.operand))
-    raise ValueError("仅支持数字与 + - * / ** % 及括号")
+# 金额计算使用 Decimal；结果位数、节点数和耗时都有上限，模型生成的 9**9**9 之类表达式会被直接拒绝
+_calculator = ArithEvaluator(decimal=True)
 
 
 def calculate(expression: str) -> str:
     """安全的算术计算工具"""
     try:
-        tree = ast.parse(expression, mode="eval")
-        value = _safe_arith_eval(tree)
-        if isinstance(value, float) and value.is_integer():
-            value = int(value)
-        return str(value)
+        return _calculator.calculate(expression)
     except Exception as e:
         return f"计算错误: {e}"
 
@@ -67,7 +46,12 @@ tools = {
     "calculate": calculate
 }
 
-REACT_PROMPT = """
+# 同一轮输出的多个 Action 在线程池中并行执行
+_tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("REACT_TOOL_WORKERS", "4")), thread_name_prefix="react-tool")
+
+# 系统提示词只包含工具和格式说明，不随问题和步骤变化；问题和每轮的 Observation 以消息追加在后面，
+# 每次请求的前缀都相同，可以命中服务端的上下文缓存
+REACT_SYSTEM_PROMPT = """
 你是一个遵循 ReAct（Reason + Act）格式的助理。你可以使用工具获得信息或完成计算。
 
 可用工具（Action）：
@@ -80,14 +64,14 @@ Thought: （简短说明下一步）
 Action: get_weather 或 calculate
 Action Input: （纯输入，不要加引号，不要加多余解释）
 
+多个互不依赖的操作可以在同一轮中连续输出多组 Action / Action Input，它们会被同时执行。
+
 2)
 Thought: （简短说明已得到答案）
 Final Answer: （给用户的最终答案）
 
-当你输出 Action 后，我会把 Observation: ... 追加给你，然后你继续推理。
-
-Question: {question}
-"""
+当你输出 Action 后，我会把每个 Action 的结果按顺序以 Observation 1:、Observation 2: ... 发给你，然后你继续推理。
+""".strip()
 
 def _strip_wrapping_quotes(text: str) -> str:
     t = text.strip()
@@ -103,48 +87,66 @@ def _extract_final_answer(text: str) -> str | None:
     return text.rsplit("Final Answer:", 1)[-1].strip() or None
 
 
-def _extract_last_action(text: str) -> tuple[str, str] | None:
-    """提取最后一个 Action 及其输入"""
-    actions = re.findall(r"^Action:\s*(.+)\s*$", text, flags=re.MULTILINE)
-    inputs = re.findall(r"^Action Input:\s*(.+)\s*$", text, flags=re.MULTILINE)
-    if not actions or not inputs:
-        return None
-    return actions[-1].strip(), _strip_wrapping_quotes(inputs[-1])
+def _extract_actions(text: str) -> list[tuple[str, str]]:
+    """按顺序提取所有 Action 及其输入"""
+    actions = []
+    name = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("Action Input:") and name is not None:
+            actions.append((name, _strip_wrapping_quotes(line[len("Action Input:"):])))
+            name = None
+        elif line.startswith("Action:"):
+            name = line[len("Action:"):].strip()
+    return actions
+
+
+def _run_tool(action_name: str, action_input: str) -> str:
+    tool = tools.get(action_name)
+    if not tool:
+        return f"错误：找不到工具 {action_name}"
+    logger.info(f"--> 执行工具: {action_name}, 输入: {action_input}")
+    observation = tool(action_input)
+    logger.info(f"--> 工具输出: {observation}")
+    return observation
+
+
+def _run_tools(actions: list[tuple[str, str]]) -> list[str]:
+    """并行执行同一轮的所有 Action，按输出顺序返回结果"""
+    if len(actions) == 1:
+        return [_run_tool(*actions[0])]
+    futures = [_tool_pool.submit(_run_tool, name, action_input) for name, action_input in actions]
+    return [future.result() for future in futures]
 
 
 def react_agent(question: str) -> str:
-    prompt = REACT_PROMPT.format(question=question).rstrip() + "\n"
+    messages = [SystemMessage(REACT_SYSTEM_PROMPT), HumanMessage(f"Question: {question}")]
     logger.info(f"--- 开始解决问题: {question} ---")
 
     max_steps = 5
     for i in range(max_steps):
         logger.info(f"[Step {i + 1}] 正在思考...")
-        response = llm_step.invoke(prompt).content.strip()
-
-        prompt = prompt.rstrip() + "\n" + response.rstrip() + "\n"
+        message = llm_step.invoke(messages)
+        response = message.content.strip()
+        usage = message.usage_metadata or {}
+        logger.info(f"输入 {usage.get('input_tokens')} tokens，"
+                    f"命中缓存 {usage.get('input_token_details', {}).get('cache_read')} tokens")
+        messages.append(AIMessage(response))
 
         # 提取最终答案
         final_answer = _extract_final_answer(response)
         if final_answer:
             return final_answer
 
-        # 提取最后一个 Action 及其输入
-        parsed = _extract_last_action(response)
-        if not parsed:
-            prompt += "Observation: 解析失败，请严格按 ReAct 格式输出 Action/Action Input 或 Final Answer\n"
-            continue
-
-        action_name, action_input = parsed
-        # 获取对应工具
-        tool = tools.get(action_name)
-        if not tool:
-            prompt += f"Observation: 错误：找不到工具 {action_name}\n"
+        # 提取本轮所有 Action 及其输入
+        actions = _extract_actions(response)
+        if not actions:
+            messages.append(HumanMessage("Observation: 解析失败，请严格按 ReAct 格式输出 Action/Action Input 或 Final Answer"))
             continue
 
-        logger.info(f"--> 执行工具: {action_name}, 输入: {action_input}")
-        observation = tool(action_input)
-        logger.info(f"--> 工具输出: {observation}")
-        prompt += f"Observation: {observation}\n"
+        observations = _run_tools(actions)
+        messages.append(HumanMessage("\n".join(
+            f"Observation {n}: {observation}" for n, observation in enumerate(observations, 1))))
 
     return "达到最大步骤数，未能找到答案。"
 
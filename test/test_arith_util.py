@@ -0,0 +1,58 @@
+import time
+import unittest
+
+from utils.arith_util import ArithEvaluator, ArithLimitError
+
+
+class ArithEvaluatorTestCase(unittest.TestCase):
+    def test_values(self):
+        cases = [("6*99", "594", "594"), ("(12.5+3)*4", "62", "62"), ("0.1+0.2", "0.30000000000000004", "0.3"),
+                 ("7%3", "1", "1"), ("-2**2", "-4", "-4"), ("2**-1", "0.5", "0.5"), ("1000/8", "125", "125")]
+        for expression, float_result, decimal_result in cases:
+            with self.subTest(expression=expression):
+                self.assertEqual(ArithEvaluator().calculate(expression), float_result)
+                self.assertEqual(ArithEvaluator(decimal=True).calculate(expression), decimal_result)
+
+    def test_limits_reject_fast(self):
+        for expression in ["9**9**9", "2**(2**64)", "99999999**99999999", "(10**600)*(10**600)",
+                           "+".join(["1"] * 120), "1" * 300]:
+            for decimal in (False, True):
+                with self.subTest(expression=expression[:20], decimal=decimal):
+                    started = time.perf_counter()
+                    with self.assertRaises(ArithLimitError):
+                        ArithEvaluator(decimal=decimal).calculate(expression)
+                    self.assertLess(time.perf_counter() - started, 0.05)
+
+    def test_rejects_non_arithmetic(self):
+        for expression in ["__import__('os')", "a+1", "[1]*3", "'1'*3", "(-8)**0.5"]:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    ArithEvaluator().calculate(expression)
+
+    def test_division_by_zero(self):
+        for expression in ["1/0", "0**-1", "0**-2.5"]:
+            for decimal in (False, True):
+                with self.subTest(expression=expression, decimal=decimal):
+                    with self.assertRaises(ZeroDivisionError):
+                        ArithEvaluator(decimal=decimal).calculate(expression)
+
+    def test_rounded_results_not_shown_as_exact(self):
+        cases = [("9**999", True, "1.942079168580724010733305132E+953"), ("10**30", True, "1E+30"), ("2.0**100", False, "1.2676506002282294e+30"),
+                 ("1e16+1", False, "1e+16")]
+        for expression, decimal, prefix in cases:
+            with self.subTest(expression=expression, decimal=decimal):
+                self.assertTrue(ArithEvaluator(decimal=decimal).calculate(expression).startswith(prefix))
+        # 精度以内的整数和小数照常输出
+        self.assertEqual(ArithEvaluator(decimal=True).calculate("2**64"), "18446744073709551616")
+        self.assertEqual(ArithEvaluator(decimal=True).calculate("1/3"), "0." + "3" * 28)
+
+    def test_compiled_cache(self):
+        evaluator = ArithEvaluator(cache_size=2)
+        for expression in ["1+1", "1+1", "2+2", "3+3", "1+1"]:
+            evaluator.calculate(expression)
+        self.assertEqual(evaluator.stats()["hits"], 1)
+        self.assertEqual(evaluator.stats()["size"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import math
+import unittest
+from collections import Counter
+
+from utils.compress_util import _terms, bm25_scores, compress_search_result
+
+SENTENCES = [
+    "洛阳水席是当地特色宴席，共有二十四道菜。",
+    "龙门石窟门票旺季90元，淡季70元。",
+    "洛阳老城十字街有很多小吃，推荐不翻汤和浆面条。",
+    "Luoyang is famous for peony and the water banquet.",
+    "",
+]
+
+
+def reference_bm25(query, documents, k1=1.5, b=0.75):
+    """逐词项循环的 BM25，作为矩阵实现的对照"""
+    docs = [_terms(doc) for doc in documents]
+    avg_len = sum(len(doc) for doc in docs) / len(docs) or 1
+    df = Counter(term for doc in docs for term in set(doc))
+    idf = {t: math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5)) for t in set(_terms(query)) if df[t]}
+    scores = []
+    for doc in docs:
+        tf = Counter(doc)
+        norm = k1 * (1 - b + b * len(doc) / avg_len)
+        scores.append(sum(w * tf[t] * (k1 + 1) / (tf[t] + norm) for t, w in idf.items() if tf[t]))
+    return scores
+
+
+class CompressUtilTestCase(unittest.TestCase):
+    def test_bm25_matches_reference(self):
+        for query in ["洛阳 小吃", "龙门石窟 门票", "water banquet 水席", "天气", ""]:
+            with self.subTest(query=query):
+                scores = bm25_scores(query, SENTENCES)
+                self.assertEqual(len(scores), len(SENTENCES))
+                for score, expected in zip(scores, reference_bm25(query, SENTENCES)):
+                    self.assertAlmostEqual(score, expected)
+        self.assertEqual(bm25_scores("洛阳", []), [])
+
+    def test_compress_respects_budget_and_counter(self):
+        result = {"results": [{"title": "洛阳美食", "content": "。".join(SENTENCES[:3]), "url": "https://example.com"}]}
+        compressed = compress_search_result(result, "洛阳 小吃", 100, count_tokens=len)
+        self.assertNotIn("example.com", compressed)
+        self.assertLessEqual(sum(map(len, compressed.split("\n"))), 100)
+        # 预算只够一句时选最相关的句子
+        self.assertEqual(compress_search_result(result, "龙门石窟 门票", 20, count_tokens=len), "龙门石窟门票旺季90元，淡季70元。")
+
+
+if __name__ == "__main__":
+    unittest.main()
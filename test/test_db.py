@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.store.postgres.aio import AsyncPostgresStore
+from psycopg import errors
+
+from graph.db import ensure_schema
+
+LATEST = {"checkpoint_version": len(AsyncPostgresSaver.MIGRATIONS) - 1,
+          "store_version": len(AsyncPostgresStore.MIGRATIONS) - 1}
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    async def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, sql, params=None):
+        self.pool.statements.append(sql.split("(")[0].strip())
+        if "checkpoint_migrations" in sql:
+            if not self.pool.migrated:
+                raise errors.UndefinedTable()
+            return FakeCursor(LATEST)
+        return FakeCursor(None)
+
+
+class FakePool:
+    """按 max_size 限制同时借出的连接数，取不到连接时与 psycopg_pool 一样超时报错"""
+
+    def __init__(self, max_size: int, migrated: bool = False):
+        self.max_size = max_size
+        self.migrated = migrated
+        self.statements = []
+        self._slots = None
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        await asyncio.wait_for(self._slots.acquire(), timeout=0.2)
+        try:
+            yield FakeConnection(self)
+        finally:
+            self._slots.release()
+
+
+class FakeSetup:
+    """setup() 与 AsyncPostgresSaver / AsyncPostgresStore 一样从连接池另取一个连接"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def setup(self):
+        async with self.pool.connection() as conn:
+            await conn.execute("CREATE TABLE")
+        self.pool.migrated = True
+
+
+def ensure(pool):
+    return asyncio.run(ensure_schema(pool, FakeSetup(pool), FakeSetup(pool)))
+
+
+class EnsureSchemaTestCase(unittest.TestCase):
+    def test_up_to_date_with_single_connection(self):
+        pool = FakePool(1, migrated=True)
+        self.assertFalse(ensure(pool))
+        self.assertEqual(len(pool.statements), 1)
+
+    def test_single_connection_fails_fast(self):
+        pool = FakePool(1)
+        with self.assertRaisesRegex(ValueError, "DB_POOL_MAX_SIZE"):
+            ensure(pool)
+        self.assertNotIn("SELECT pg_advisory_lock", pool.statements)
+
+    def test_migrates_with_two_connections(self):
+        pool = FakePool(2)
+        self.assertTrue(ensure(pool))
+        self.assertEqual(pool.statements[1], "SELECT pg_advisory_lock")
+        self.assertIn("CREATE TABLE", pool.statements)
+        self.assertEqual(pool.statements[-1], "SELECT pg_advisory_unlock")
+
+
+if __name__ == "__main__":
+    unittest.main()
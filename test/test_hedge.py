@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+from typing import Any, List, Optional, TypedDict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.graph import StateGraph, START, END
+from pydantic import PrivateAttr
+
+from graph.hedge import HedgedChatModel, HedgeBudget
+from graph.instrumentation import metrics
+
+NODE = "answer"
+
+
+class SlowChatModel(BaseChatModel):
+    """第 i 次调用等待 latencies[i] 秒后返回"第 i 次"，记录被取消的调用"""
+
+    latencies: List[float]
+    _started: List[int] = PrivateAttr(default_factory=list)
+    _cancelled: List[int] = PrivateAttr(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow"
+
+    async def _wait(self) -> int:
+        index = len(self._started)
+        self._started.append(index)
+        try:
+            await asyncio.sleep(self.latencies[index])
+        except asyncio.CancelledError:
+            self._cancelled.append(index)
+            raise
+        return index
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        index = await self._wait()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"第{index}次"))])
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        index = await self._wait()
+        for text in ("第", f"{index}次"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+
+class State(TypedDict):
+    answer: str
+
+
+def build_graph(llm):
+    async def answer(state: State):
+        return {"answer": (await llm.ainvoke("你好")).content}
+
+    builder = StateGraph(State)
+    builder.add_node(NODE, answer)
+    builder.add_edge(START, NODE)
+    builder.add_edge(NODE, END)
+    return builder.compile()
+
+
+def hedge_count(outcome: str) -> float:
+    return metrics.value("agent_llm_hedge_total", node=NODE, outcome=outcome)
+
+
+class HedgedChatModelTestCase(unittest.TestCase):
+    def make(self, latencies, streaming=False, ratio=1.0, samples=0.02) -> HedgedChatModel:
+        inner = SlowChatModel(latencies=latencies)
+        model = HedgedChatModel(inner=inner, nodes={NODE}, min_delay=0, min_samples=5, streaming=streaming)
+        model._budget = HedgeBudget(ratio=ratio, burst=1)
+        for _ in range(5 if samples is not None else 0):
+            model._window.add(NODE, samples)
+        return model
+
+    def run_graph(self, model) -> Any:
+        async def run():
+            result = await build_graph(model).ainvoke({"answer": ""})
+            await asyncio.sleep(0)  # 让被取消的请求处理完取消
+            return result["answer"]
+
+        return asyncio.run(run())
+
+    def test_hedge_fires_and_wins(self):
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                model = self.make([1.0, 0.01], streaming=streaming)
+                fired, won = hedge_count("fired"), hedge_count("won")
+                self.assertEqual(self.run_graph(model), "第1次")
+                self.assertEqual(hedge_count("fired"), fired + 1)
+                self.assertEqual(hedge_count("won"), won + 1)
+                self.assertEqual(model.inner._cancelled, [0])
+                # 样本从原请求开始计时，不小于等待时间加对冲请求的耗时
+                self.assertGreaterEqual(model._window._samples[NODE][-1], 0.02 + 0.01)
+
+    def test_primary_wins_and_hedge_cancelled(self):
+        model = self.make([0.05, 1.0])
+        lost = hedge_count("lost")
+        self.assertEqual(self.run_graph(model), "第0次")
+        self.assertEqual(hedge_count("lost"), lost + 1)
+        self.assertEqual(model.inner._started, [0, 1])
+        self.assertEqual(model.inner._cancelled, [1])
+
+    def test_budget_skip(self):
+        model = self.make([0.05, 0.01], ratio=0)
+        skipped, fired = hedge_count("skipped_budget"), hedge_count("fired")
+        self.assertEqual(self.run_graph(model), "第0次")
+        self.assertEqual(hedge_count("skipped_budget"), skipped + 1)
+        self.assertEqual(hedge_count("fired"), fired)
+        self.assertEqual(model.inner._started, [0])
+
+    def test_no_hedge_without_samples_or_outside_graph(self):
+        model = self.make([0.05, 0.01], samples=None)
+        self.assertEqual(self.run_graph(model), "第0次")
+        self.assertEqual(model.inner._started, [0])
+        self.assertEqual(len(model._window._samples[NODE]), 1)
+
+        model = self.make([0.05, 0.01])
+        self.assertEqual(asyncio.run(model.ainvoke("你好")).content, "第0次")
+        self.assertEqual(model.inner._started, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from bench.import_bench import ROOT, measure
+
+# 导入耗时预算（毫秒），取多次运行的最小值比较；CI 机器较慢时可通过环境变量放宽
+BUDGETS = {
+    "graph.config": float(os.getenv("IMPORT_BUDGET_CONFIG_MS", "500")),
+    "graph.workflow": float(os.getenv("IMPORT_BUDGET_WORKFLOW_MS", "2500")),
+}
+# 只在第一次调用大模型或搜索时才需要的 SDK
+LAZY_MODULES = ["langchain_openai", "openai", "langchain_tavily", "tiktoken", "psycopg"]
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def test_budget(self):
+        for module, budget in BUDGETS.items():
+            with self.subTest(module=module):
+                runs, _ = measure(module, repeats=3)
+                self.assertLessEqual(min(runs), budget, f"{module} 导入耗时 {runs}ms 超过预算 {budget}ms")
+
+    def test_clients_not_imported(self):
+        code = ("import sys, graph.workflow; "
+                f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(proc.stdout.strip(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+
+from graph.intent import IntentClassifier
+
+# 不含规则关键词的问题，只能靠本地模型区分
+PLACES = ["洛阳", "开封", "西安", "成都", "杭州", "苏州", "厦门", "大理", "青岛", "桂林"]
+PLANNER_TEMPLATES = ["{}有什么好玩的地方", "去{}怎么安排比较好", "{}周边值得去哪里", "帮我规划{}的出行", "{}哪里适合拍照"]
+DIRECT_TEMPLATES = ["{}这个名字是怎么来的", "{}话怎么说谢谢", "用{}写一句诗", "{}两个字怎么写", "给我讲个关于{}的笑话"]
+
+
+def samples(seed: int):
+    rng = random.Random(seed)
+    data = [(template.format(place) + suffix, route)
+            for route, templates in (("planner", PLANNER_TEMPLATES), ("direct_answer", DIRECT_TEMPLATES))
+            for template in templates for place in PLACES for suffix in ("", "？", "呀")]
+    rng.shuffle(data)
+    return data
+
+
+def train(classifier, data):
+    for question, route in data:
+        asyncio.run(classifier.record(question, route))
+
+
+class IntentClassifierTestCase(unittest.TestCase):
+    def test_separable_routes_decided_locally(self):
+        classifier = IntentClassifier(log_path="")
+        train(classifier, samples(0))
+        self.assertIsNotNone(classifier.confidence_cutoff())
+        self.assertEqual(classifier.classify("去泉州怎么安排比较好")[0], "planner")
+        self.assertEqual(classifier.classify("泉州这个名字是怎么来的")[0], "direct_answer")
+
+    def test_unreliable_model_defers_to_llm(self):
+        # 标签随机时留出准确率达不到要求，本地模型不做决定
+        rng = random.Random(1)
+        classifier = IntentClassifier(log_path="")
+        train(classifier, [(question, rng.choice(["planner", "direct_answer"])) for question, _ in samples(1)])
+        self.assertIsNone(classifier.confidence_cutoff())
+        self.assertEqual(classifier.classify("去泉州怎么安排比较好"), (None, 0.0))
+
+    def test_duplicates_learned_once_and_log_reloaded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "routes.jsonl")
+            classifier = IntentClassifier(log_path=path)
+            train(classifier, [("洛阳有什么好玩的地方", "planner")] * 3 + [("洛阳 有什么好玩的地方", "planner")])
+            self.assertEqual(classifier.training_samples, 1)
+            self.assertEqual(IntentClassifier(log_path=path).training_samples, 1)
+
+    def test_rules_bypass_model(self):
+        classifier = IntentClassifier(log_path="")
+        self.assertEqual(classifier.classify("你好"), ("direct_answer", 1.0))
+        self.assertEqual(classifier.classify("洛阳明天天气怎么样"), ("planner", 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import asyncio
+import re
+import time
+import unittest
+from unittest import mock
+
+from graph.config import EMBEDDING_DIMS
+from graph.memory import LongTermMemory
+from utils.embedding_util import HashingEmbedder
+
+
+class MemoryFreshnessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.memory = LongTermMemory()
+        asyncio.run(self.memory.remember(None, "u1", [
+            {"kind": "fact", "text": "查询洛阳五一天气", "result": "晴"},
+            {"kind": "fact", "text": "查询洛阳特色美食", "result": "水席"},
+            {"kind": "fact", "text": "查询洛阳5月1日天气", "result": "多云"},
+            {"kind": "preference", "text": "不吃辣"},
+        ]))
+
+    def match(self, task, now):
+        with mock.patch("graph.memory.time.time", return_value=now):
+            return asyncio.run(self.memory.match_steps(None, "u1", [{"id": 0, "task": task}]))
+
+    def test_fresh_fact_skips_step(self):
+        self.assertEqual(self.match("查询洛阳五一天气", time.time()), {0: "晴"})
+
+    def test_other_date_does_not_skip_step(self):
+        self.assertEqual(self.match("查询洛阳5月1日天气", time.time()), {0: "多云"})
+        # 语义向量模型中只差日期的两句话几乎相同，这里用忽略数字的向量化函数模拟
+        hashing = HashingEmbedder(EMBEDDING_DIMS)
+        self.memory.embedder = lambda texts: hashing([re.sub(r"\d+", "", text) for text in texts])
+        asyncio.run(self.memory.remember(None, "u2", [{"kind": "fact", "text": "查询洛阳5月1日天气", "result": "多云"}]))
+        with mock.patch("graph.memory.time.time", return_value=time.time()):
+            matched = asyncio.run(self.memory.match_steps(None, "u2", [{"id": 0, "task": "查询洛阳5月3日天气"},
+                                                                       {"id": 1, "task": "查询洛阳5月1日天气"}]))
+        self.assertEqual(matched, {1: "多云"})
+
+    def test_stale_fact_does_not_skip_step(self):
+        later = time.time() + 7 * 86400
+        self.assertEqual(self.match("查询洛阳五一天气", later), {})
+        # 攻略类事实保鲜时间更长，一周后仍可使用
+        self.assertEqual(self.match("查询洛阳特色美食", later), {0: "水席"})
+
+    def test_preferences_never_expire(self):
+        with mock.patch("graph.memory.time.time", return_value=time.time() + 365 * 86400):
+            hits = asyncio.run(self.memory.recall(None, "u1", "不吃辣", "preference"))
+        self.assertEqual([record["text"] for _, record in hits], ["不吃辣"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from utils.metrics_util import TraceWriter
+
+
+class TraceWriterTestCase(unittest.TestCase):
+    def test_written_by_background_thread(self):
+        writers = []
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = TraceWriter(os.path.join(tmp, "trace", "trace.jsonl"), flush_every=3)
+            original = trace._write_lines
+
+            def record_thread(lines):
+                writers.append(threading.current_thread().name)
+                original(lines)
+
+            with mock.patch.object(trace, "_write_lines", side_effect=record_thread):
+                for i in range(10):
+                    trace.write({"kind": "node", "name": f"n{i}"})
+                trace.flush()
+            with open(trace.path, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual([event["name"] for event in events], [f"n{i}" for i in range(10)])
+        self.assertTrue(all("ts" in event for event in events))
+        self.assertEqual(set(writers), {"trace-writer"})
+
+    def test_full_queue_drops(self):
+        trace = TraceWriter("unused.jsonl", maxsize=2)
+        trace._thread = threading.current_thread()  # 不启动后台线程，队列不会被取走
+        for i in range(5):
+            trace.write({"kind": "node", "name": f"n{i}"})
+        self.assertEqual(trace.dropped, 3)
+
+    def test_disabled_without_path(self):
+        trace = TraceWriter("")
+        trace.write({"kind": "node"})
+        trace.flush()
+        self.assertIsNone(trace._thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
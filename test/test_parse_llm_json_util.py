@@ -0,0 +1,53 @@
+import json
+import os
+import unittest
+
+from utils.parse_llm_json_util import JsonArrayStream, parse_llm_json
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "..", "bench", "corpus", "planner_outputs.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stream(text, chunk_size):
+    parser = JsonArrayStream("steps")
+    steps = []
+    for i in range(0, len(text), chunk_size):
+        steps.extend(parser.feed(text[i:i + chunk_size]))
+    return parser, steps
+
+
+class JsonArrayStreamTestCase(unittest.TestCase):
+    def test_corpus_any_chunk_size(self):
+        for case in load_corpus():
+            for chunk_size in (1, 2, 7, 64, len(case["text"])):
+                with self.subTest(case=case["name"], chunk_size=chunk_size):
+                    parser, steps = stream(case["text"], chunk_size)
+                    self.assertEqual(steps, case["expected_steps"])
+                    self.assertEqual(parser.text, case["text"])
+
+    def test_agrees_with_parse_llm_json(self):
+        for case in load_corpus():
+            try:
+                data = parse_llm_json(case["text"])
+            except ValueError:
+                continue
+            with self.subTest(case=case["name"]):
+                expected = data if isinstance(data, list) else data["steps"]
+                self.assertEqual(stream(case["text"], 3)[1], expected)
+
+    def test_element_emitted_before_stream_ends(self):
+        text = '{"steps": ["查询洛阳天气", "查询洛阳酒店"]}'
+        parser = JsonArrayStream("steps")
+        cut = text.index('"查询洛阳天气"') + len('"查询洛阳天气"')
+        self.assertEqual(parser.feed(text[:cut]), ["查询洛阳天气"])
+        self.assertFalse(parser.done)
+        self.assertEqual(parser.feed(text[cut:]), ["查询洛阳酒店"])
+        self.assertTrue(parser.done)
+
+
+if __name__ == '__main__':
+    unittest.main()
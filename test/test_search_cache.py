@@ -0,0 +1,63 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from graph.search_cache import SearchCache, SqliteSearchBackend
+
+
+class SearchCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+
+    async def fetch(self, query):
+        self.fetched.append(query)
+        return {"query": query, "results": [{"content": "水席"}]}
+
+    def test_local_hit(self):
+        cache = SearchCache()
+
+        async def run():
+            first = await cache.aget_or_fetch("洛阳 美食", self.fetch)
+            second = await cache.aget_or_fetch("洛阳　 美食", self.fetch)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, second)
+        self.assertEqual(self.fetched, ["洛阳 美食"])
+        self.assertEqual(cache.stats()["local_hits"], 1)
+
+    def test_word_order_kept(self):
+        cache = SearchCache()
+
+        async def run():
+            await cache.aget_or_fetch("郑州 洛阳 高铁", self.fetch)
+            return await cache.aget_or_fetch("洛阳 郑州 高铁", self.fetch)
+
+        self.assertEqual(asyncio.run(run())["query"], "洛阳 郑州 高铁")
+        self.assertEqual(self.fetched, ["郑州 洛阳 高铁", "洛阳 郑州 高铁"])
+
+    def test_backend_hit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SqliteSearchBackend(os.path.join(tmp, "search_cache.db"), max_rows=100)
+            asyncio.run(SearchCache(backend=backend).aget_or_fetch("洛阳 美食", self.fetch))
+            # 新的进程内缓存为空，从持久层命中
+            cache = SearchCache(backend=backend)
+            value = asyncio.run(cache.aget_or_fetch("洛阳　 美食", self.fetch))
+            backend._conn.close()
+        self.assertEqual(value["results"][0]["content"], "水席")
+        self.assertEqual(len(self.fetched), 1)
+        self.assertEqual(cache.stats()["backend_hits"], 1)
+
+    def test_concurrent_requests_merged(self):
+        cache = SearchCache()
+
+        async def run():
+            return await asyncio.gather(*(cache.aget_or_fetch("洛阳 美食", self.fetch) for _ in range(5)))
+
+        self.assertEqual(len(set(map(str, asyncio.run(run())))), 1)
+        self.assertEqual(len(self.fetched), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
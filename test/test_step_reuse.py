@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+from graph.step_reuse import StepResultCache
+
+LUOYANG = "我想去洛阳玩两天"
+KAIFENG = "我想去开封玩两天"
+
+
+class StepReuseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = StepResultCache()
+
+    def save(self, task, query, question=LUOYANG):
+        asyncio.run(self.cache.save(task, query, f"{task} 的结果", question))
+
+    def lookup(self, task, query, question=LUOYANG):
+        return asyncio.run(self.cache.lookup(task, query, question))
+
+    def test_same_scope_reused(self):
+        self.save("查询洛阳美食推荐", "洛阳 美食 推荐")
+        self.assertEqual(self.lookup("查询洛阳的美食推荐", "洛阳  美食 推荐", KAIFENG), "查询洛阳美食推荐 的结果")
+
+    def test_other_city_rejected(self):
+        self.save("查询洛阳美食推荐", "洛阳 美食 推荐")
+        self.assertIsNone(self.lookup("查询开封美食推荐", "开封 美食 推荐", KAIFENG))
+
+    def test_generic_task_needs_same_question(self):
+        self.save("查询当地酒店价格", "当地 酒店 价格")
+        self.assertIsNone(self.lookup("查询当地的酒店价格", "当地 酒店 价格", KAIFENG))
+        self.assertEqual(self.lookup("查询当地的酒店价格", "当地 酒店 价格", LUOYANG + "。"), "查询当地酒店价格 的结果")
+
+    def test_word_order_kept(self):
+        self.save("查询郑州到洛阳的高铁", "郑州 洛阳 高铁")
+        self.assertIsNone(self.lookup("查询洛阳到郑州的高铁", "洛阳 郑州 高铁"))
+
+    def test_other_date_rejected(self):
+        self.save("查询洛阳2024年5月1日天气", "洛阳 2024年5月1日 天气")
+        self.assertIsNone(self.lookup("查询洛阳2025年5月1日天气", "洛阳 2025年5月1日 天气"))
+        # 关键词漏掉了年份时，任务中的数字仍然不同
+        self.assertIsNone(self.lookup("查询洛阳2025年5月1日天气", "洛阳 2024年5月1日 天气"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+from typing import TypedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, START, END
+
+from bench.fakes import ScriptedChatModel
+from graph.config import FINAL_ANSWER_TAG
+from graph.function import parse_reflection
+from graph.streaming import astream_answer
+
+ANSWER = "洛阳两日游：第一天龙门石窟，第二天白马寺和老城。"
+
+
+class State(TypedDict):
+    question: str
+    response: str
+
+
+def build_app(output: str):
+    llm = ScriptedChatModel(script=lambda template_id, prompt: output, chunk_size=4)
+
+    async def reflect(state: State):
+        raw = await llm.ainvoke(state["question"], config={"tags": [FINAL_ANSWER_TAG]})
+        return {"response": parse_reflection(raw.content).response}
+
+    builder = StateGraph(State)
+    builder.add_node("reflect", reflect)
+    builder.add_edge(START, "reflect")
+    builder.add_edge("reflect", END)
+    return builder.compile(checkpointer=InMemorySaver())
+
+
+def run(output: str):
+    async def collect():
+        config = {"configurable": {"thread_id": "t1"}}
+        return [event async for event in astream_answer(build_app(output), {"question": "洛阳", "response": ""}, config)]
+
+    events = asyncio.run(collect())
+    text = "".join(event["text"] for event in events if event["type"] == "token")
+    return text, [event["type"] for event in events if event["type"] != "token"], events[-1]["response"]
+
+
+class ReflectStreamingTestCase(unittest.TestCase):
+    def test_answer_streamed(self):
+        text, types, response = run('{"response": "%s", "next_plan": []}' % ANSWER)
+        self.assertEqual((text, response), (ANSWER, ANSWER))
+        self.assertNotIn("discard", types)
+
+    def test_continue_not_streamed(self):
+        text, types, response = run('{"response": "", "next_plan": [{"task": "查询洛阳天气", "depends_on": []}]}')
+        self.assertEqual((text, response), ("", ""))
+        self.assertNotIn("discard", types)
+
+    def test_complete_answer_kept_when_rest_invalid(self):
+        text, types, response = run('{"response": "%s", "next_plan": [{"task": ' % ANSWER)
+        self.assertEqual((text, response), (ANSWER, ANSWER))
+        self.assertNotIn("discard", types)
+
+    def test_truncated_answer_discarded(self):
+        text, types, response = run('{"response": "%s' % ANSWER[:10])
+        self.assertEqual(text, ANSWER[:10])
+        self.assertEqual(response, "")
+        self.assertEqual(types, ["discard", "progress", "done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
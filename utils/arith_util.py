@@ -0,0 +1,166 @@
+import ast
+import math
+import operator as op
+import time
+from decimal import Decimal, DecimalException, DivisionByZero, localcontext
+
+from utils.cache_util import TTLCache
+
+_BIN_OPS = {
+    ast.Add: op.add,
+    ast.Sub: op.sub,
+    ast.Mult: op.mul,
+    ast.Div: op.truediv,
+    ast.Pow: op.pow,
+    ast.Mod: op.mod,
+}
+_UNARY_OPS = {
+    ast.UAdd: op.pos,
+    ast.USub: op.neg,
+}
+
+
+class ArithLimitError(ValueError):
+    """表达式超出长度、节点数、结果位数或耗时限制"""
+
+
+def _digits(value) -> float:
+    """数值的十进制位数（估计值），0 为 0"""
+    if isinstance(value, int):
+        return value.bit_length() * 0.30103
+    value = abs(value)
+    if not value:
+        return 0.0
+    if isinstance(value, Decimal):
+        return float(value.adjusted() + 1)
+    return math.log10(value) + 1 if math.isfinite(value) else math.inf
+
+
+class ArithEvaluator:
+    """有开销上限的四则运算求值器，支持 + - * / ** % 和括号
+
+    - 表达式先检查长度和节点数，再编译成闭包，按表达式原文缓存（LRU），重复计算时不再解析；
+    - 乘方和乘法在计算前按操作数位数估计结果位数，超过 max_digits 直接拒绝，避免 9**9**9 这类表达式长时间占用 CPU；
+    - 每个节点求值后检查结果位数和耗时（单个运算的开销已被位数限制住，耗时检查在节点之间进行）；
+    - decimal=True 时数字按 Decimal 计算（适合金额，0.1+0.2 得到 0.3），精度为 precision 位有效数字；
+      非有限结果报错，整数部分超出精度的结果按科学计数法输出。
+    """
+
+    def __init__(self, max_length: int = 256, max_nodes: int = 100, max_digits: int = 1000, timeout: float = 0.05,
+                 decimal: bool = False, precision: int = 28, cache_size: int = 1024):
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        self.max_digits = max_digits
+        self.timeout = timeout
+        self.decimal = decimal
+        self.precision = precision
+        self._compiled = TTLCache(max_entries=cache_size)
+
+    def compile(self, expression: str):
+        """解析并编译表达式，返回以求值状态（截止时间）为参数的闭包；按表达式原文缓存"""
+        expression = expression.strip()
+        fn = self._compiled.get(expression)
+        if fn is None:
+            fn = self._compile(expression)
+            self._compiled.set(expression, fn)
+        return fn
+
+    def _compile(self, expression: str):
+        if len(expression) > self.max_length:
+            raise ArithLimitError(f"表达式长度超过 {self.max_length} 个字符")
+        tree = ast.parse(expression, mode="eval")
+        nodes = sum(1 for node in ast.walk(tree) if isinstance(node, ast.expr))
+        if nodes > self.max_nodes:
+            raise ArithLimitError(f"表达式节点数 {nodes} 超过上限 {self.max_nodes}")
+        return self._build(tree.body, expression)
+
+    def _build(self, node, expression: str):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            if self.decimal:
+                # 使用原文构造 Decimal，避免 0.1 先变成二进制浮点数
+                value = Decimal(ast.get_source_segment(expression, node) or repr(node.value))
+            else:
+                value = node.value
+            self._check_digits(value)
+            return lambda state: value
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            left, right = self._build(node.left, expression), self._build(node.right, expression)
+            fn, kind = _BIN_OPS[type(node.op)], type(node.op)
+
+            def binary(state):
+                a, b = left(state), right(state)
+                if kind is ast.Pow:
+                    self._check_pow(a, b)
+                elif kind is ast.Mult:
+                    self._check_estimate(_digits(a) + _digits(b))
+                return self._checked(fn(a, b), state)
+
+            return binary
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            operand, fn = self._build(node.operand, expression), _UNARY_OPS[type(node.op)]
+            return lambda state: fn(operand(state))
+        raise ValueError("仅支持数字与 + - * / ** % 及括号")
+
+    def _check_pow(self, base, exponent):
+        if base == 0 and exponent < 0:
+            # Decimal 的 0 ** 负数得到 Infinity 而不报错，这里与浮点数模式一致
+            raise ZeroDivisionError("0 不能取负数次方")
+        if base in (0, 1, -1):
+            return
+        if exponent > 0:
+            self._check_estimate(float(exponent) * math.log10(abs(base)))
+
+    def _check_estimate(self, digits: float):
+        if digits > self.max_digits:
+            raise ArithLimitError(f"结果预计约 {digits:.0f} 位，超过上限 {self.max_digits} 位")
+
+    def _check_digits(self, value):
+        self._check_estimate(_digits(value))
+
+    def _checked(self, value, state):
+        if isinstance(value, complex):
+            raise ValueError("结果不是实数")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ArithLimitError("结果超出浮点数范围")
+        if isinstance(value, Decimal) and not value.is_finite():
+            raise ValueError("结果不是有限数")
+        self._check_digits(value)
+        if time.perf_counter() > state["deadline"]:
+            raise ArithLimitError(f"计算耗时超过 {self.timeout}s")
+        return value
+
+    def evaluate(self, expression: str):
+        fn = self.compile(expression)
+        state = {"deadline": time.perf_counter() + self.timeout}
+        if not self.decimal:
+            return fn(state)
+        with localcontext() as ctx:
+            ctx.prec = self.precision
+            try:
+                return fn(state)
+            except DivisionByZero:
+                raise ZeroDivisionError("division by zero") from None
+            except DecimalException as e:
+                raise ValueError(f"无效运算（{type(e).__name__}）") from None
+
+    def format(self, value) -> str:
+        """整数值的浮点数去掉小数部分，Decimal 不使用科学计数法
+
+        整数部分超出有效位数（Decimal 超过 precision 位、浮点数不小于 2**53）的结果已经被舍入，
+        按科学计数法输出，不写成看起来精确的长整数。
+        """
+        if isinstance(value, Decimal):
+            value = value.normalize()
+            if value.adjusted() >= self.precision:
+                return format(value, "E")
+            text = format(value, "f")
+            return "0" if text == "-0" else text
+        if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+            return str(int(value))
+        return str(value)
+
+    def calculate(self, expression: str) -> str:
+        return self.format(self.evaluate(expression))
+
+    def stats(self) -> dict:
+        return self._compiled.stats()
@@ -0,0 +1,106 @@
+import json
+import re
+
+import numpy as np
+
+from utils.tokenizer_util import estimate_tokens
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[。！？!?；;])|\n+|(?<=\.)\s+")
+
+
+def _terms(text: str):
+    """检索用词项：英文单词/数字 + 汉字二元组"""
+    text = text.lower()
+    terms = _WORD_RE.findall(text)
+    for run in re.findall(r"[\u4e00-\u9fff]+", text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _shingles(text: str, n: int = 3):
+    text = re.sub(r"\s+", "", text)
+    return {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+
+
+def extract_passages(search_result):
+    """从 Tavily 返回结果中只保留标题、正文和直接答案，丢弃 url、图片、打分等字段"""
+    if isinstance(search_result, str):
+        try:
+            search_result = json.loads(search_result)
+        except ValueError:
+            return [search_result]
+    if isinstance(search_result, list):
+        results, answer = search_result, None
+    else:
+        results, answer = search_result.get("results", []), search_result.get("answer")
+    passages = [answer] if answer else []
+    for item in results:
+        if isinstance(item, dict):
+            passages.extend(text for text in (item.get("title"), item.get("content")) if text)
+        elif item:
+            passages.append(str(item))
+    return passages
+
+
+def split_sentences(passages, min_chars: int = 6):
+    sentences = []
+    for passage in passages:
+        for sentence in _SENTENCE_SPLIT_RE.split(passage):
+            sentence = re.sub(r"\s+", " ", sentence).strip(" -|·•")
+            if len(sentence) >= min_chars:
+                sentences.append(sentence)
+    return sentences
+
+
+def dedupe(sentences, threshold: float = 0.8):
+    """去掉与已保留句子 3-gram Jaccard 相似度达到阈值的近重复句"""
+    kept, kept_shingles = [], []
+    for sentence in sentences:
+        shingles = _shingles(sentence)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(sentence)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def bm25_scores(query: str, documents, k1: float = 1.5, b: float = 0.75):
+    """以 query 为查询，对每个文档计算 BM25 得分
+
+    只统计查询词项：(文档, 查询词项) 的词频矩阵用一次 bincount 得到，df、idf 和得分都是矩阵运算。
+    """
+    docs = [_terms(doc) for doc in documents]
+    if not docs:
+        return []
+    index = {term: i for i, term in enumerate(set(_terms(query)))}
+    if not index:
+        return [0.0] * len(docs)
+    lengths = np.fromiter((len(doc) for doc in docs), dtype=float, count=len(docs))
+    pairs = [len(index) * d + index[term] for d, doc in enumerate(docs) for term in doc if term in index]
+    tf = np.bincount(np.asarray(pairs, dtype=np.int64), minlength=len(docs) * len(index)).reshape(len(docs), -1)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / (lengths.mean() or 1))
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1).tolist()
+
+
+def compress_search_result(search_result, query: str, token_budget: int, count_tokens=estimate_tokens) -> str:
+    """抽取式压缩：去字段、去重、按与任务的 BM25 相关度选句，总量不超过 token_budget，保持原文顺序
+
+    count_tokens 为 token 计数函数，应与提示词预算使用同一个计数器（见 graph.config.get_tokenizer）。
+    """
+    sentences = dedupe(split_sentences(extract_passages(search_result)))
+    scores = bm25_scores(query, sentences)
+    ranked = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+    chosen, used = [], 0
+    for i in ranked:
+        cost = count_tokens(sentences[i])
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+    return "\n".join(sentences[i] for i in sorted(chosen))
@@ -0,0 +1,58 @@
+import importlib
+import re
+import zlib
+
+import numpy as np
+
+
+# 任务描述中常见、但不区分内容的词
+_STOPWORDS_RE = re.compile(r"查询|查找|搜索|了解|整理|获取|帮我|一下|情况|信息|相关|的|和|及|与|请|吗|呢|[\s，。、？！,.?!：:]")
+
+
+def _ngrams(text: str):
+    """字符一元、二元、三元组，中文不分词也能衡量相似度"""
+    text = _STOPWORDS_RE.sub("", text.lower())
+    grams = list(text)
+    grams += [text[i:i + 2] for i in range(len(text) - 1)]
+    grams += [text[i:i + 3] for i in range(len(text) - 2)]
+    return grams
+
+
+class HashingEmbedder:
+    """基于字符 n-gram 特征哈希的向量化，纯 CPU、无需下载模型，输出 L2 归一化的向量
+
+    只能衡量字面相似度；需要语义相似度时通过 load_embedder 换成本地句向量模型。
+    """
+
+    def __init__(self, dims: int = 512):
+        self.dims = dims
+
+    def __call__(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for gram in _ngrams(text):
+                h = zlib.crc32(gram.encode("utf-8"))
+                # 最高位决定符号，减少哈希冲突带来的偏差
+                vectors[row, h % self.dims] += 1.0 if h & 0x80000000 else -1.0
+        return normalize(vectors)
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def load_embedder(spec: str = "hashing", dims: int = 512):
+    """按配置加载向量化函数
+
+    spec 为 "hashing" 时使用 HashingEmbedder；否则为 "模块路径:工厂函数"，工厂函数以 dims 为参数，
+    返回一个接收文本列表、返回二维向量数组的可调用对象（如包装 CPU 上运行的 sentence-transformers 模型）。
+    """
+    if spec == "hashing":
+        return HashingEmbedder(dims)
+    module_name, _, factory_name = spec.partition(":")
+    factory = getattr(importlib.import_module(module_name), factory_name)
+    embedder = factory(dims=dims)
+    return lambda texts: normalize(embedder(texts))
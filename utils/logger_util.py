@@ -1,16 +1,200 @@
-import sys
+import atexit
+import json
 import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
 from loguru import logger as loguru_logger
 
+# 日志模式：text（控制台 + 按小时滚动的文件，便于开发调试）/ json（结构化 JSON 行，经有界队列由后台线程写出，用于生产）
+LOG_MODE = os.getenv("LOG_MODE", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_JSON_PATH = os.getenv("LOG_JSON_PATH", "")  # json 模式的输出文件，留空输出到 stdout
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_OVERFLOW = os.getenv("LOG_OVERFLOW", "drop_new")  # 队列满时丢弃新日志（drop_new）或最旧的日志（drop_oldest）
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))  # 计划、摘要等大段内容写出时截断到该长度
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+# 逐步骤的详细内容（计划、关键词、摘要、缓存命中等）按类别采样，格式为 "类别=比例,..."，default 为未列出类别的比例
+LOG_SAMPLE_RATES = {"default": float(os.getenv("LOG_SAMPLE_RATE", "0.1" if LOG_MODE == "json" else "1"))}
+LOG_SAMPLE_RATES.update({kind.strip(): float(rate) for kind, _, rate in
+                         (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item)})
+
+_stats = Counter()  # emitted / dropped / sampled_out 等计数
+
+
+class Truncated:
+    """延迟截断：只有日志真正被格式化写出时才转成字符串并截断"""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = LOG_MAX_FIELD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}...（共 {len(text)} 字）"
+
+    def __format__(self, spec):
+        return format(self.value, spec) if spec else str(self)
+
+
+def log_sampled(kind: str, message: str, *args, level: str = "INFO"):
+    """按类别采样输出逐步骤的详细内容；message 使用 {} 占位，参数在被采样且写出时才格式化和截断"""
+    rate = LOG_SAMPLE_RATES.get(kind, LOG_SAMPLE_RATES["default"])
+    if rate < 1 and random.random() >= rate:
+        _stats["sampled_out"] += 1
+        return
+    loguru_logger.opt(depth=1).bind(kind=kind).log(level, message, *(arg if isinstance(arg, (int, float)) else Truncated(arg) for arg in args))
+
+
+def _add_graph_context(record):
+    """在 LangGraph 节点内部记录日志时，补上 thread_id 和节点名"""
+    extra = record["extra"]
+    if "thread_id" in extra:
+        return
+    # 只在进程已经加载 LangGraph 时查找，不为日志引入额外的导入
+    langgraph_config = sys.modules.get("langgraph.config")
+    if langgraph_config is None:
+        return
+    try:
+        config = langgraph_config.get_config()
+    except RuntimeError:
+        return
+    extra["thread_id"] = config.get("configurable", {}).get("thread_id")
+    extra["node"] = config.get("metadata", {}).get("langgraph_node")
+
+
+class JsonQueueSink:
+    """loguru 的 sink：调用方只把记录放进有界队列，序列化和写出由后台线程批量完成
+
+    队列满时按 overflow 策略丢弃并计数，WARNING 及以上级别总是挤掉最旧的一条；
+    发生丢弃时后台线程每秒最多补写一条汇总日志。
+    """
+
+    def __init__(self, stream, maxsize: int = LOG_QUEUE_SIZE, overflow: str = LOG_OVERFLOW, batch_size: int = 256):
+        self.stream = stream
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._reported_drops = 0
+        self._last_report = 0.0
+        threading.Thread(target=self._run, name="log-writer", daemon=True).start()
+
+    def write(self, message):
+        record = message.record
+        item = (record["time"].timestamp(), record["level"].name, record["message"], record["name"], record["function"],
+                record["line"], record["extra"], record["exception"])
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == "drop_oldest" or record["level"].no >= 30:
+            try:
+                self._count_drop(self._queue.get_nowait()[1])
+                self._queue.task_done()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+        self._count_drop(record["level"].name)
+
+    @staticmethod
+    def _count_drop(level: str):
+        _stats["dropped"] += 1
+        _stats[f"dropped_{level.lower()}"] += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in batch:
+                try:
+                    lines.append(self._serialize(item))
+                except Exception as e:  # 单条日志序列化失败不影响其他日志
+                    lines.append(json.dumps({"level": "ERROR", "msg": f"日志序列化失败：{e}"}, ensure_ascii=False) + "\n")
+            lines += self._drop_report()
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except Exception:
+                pass
+            _stats["emitted"] += len(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    @staticmethod
+    def _serialize(item) -> str:
+        ts, level, message, name, function, line, extra, exception = item
+        if len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = f"{message[:LOG_MAX_MESSAGE_CHARS]}...（共 {len(message)} 字）"
+        data = {"ts": round(ts, 6), "level": level, "msg": message, "logger": name, "func": function, "line": line}
+        data.update((k, str(v) if isinstance(v, Truncated) else v) for k, v in extra.items())
+        if exception is not None:
+            data["exc_type"] = exception.type.__name__ if exception.type else None
+            data["exc"] = str(exception.value)
+        return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+    def _drop_report(self):
+        dropped = _stats["dropped"]
+        now = time.monotonic()
+        if dropped == self._reported_drops or now - self._last_report < 1:
+            return []
+        report = {"ts": round(time.time(), 6), "level": "WARNING", "msg": "日志队列已满，部分日志被丢弃",
+                  "dropped": dropped - self._reported_drops, "dropped_total": dropped}
+        self._reported_drops, self._last_report = dropped, now
+        return [json.dumps(report, ensure_ascii=False) + "\n"]
+
+    def flush(self, timeout: float = 2.0):
+        """等待队列中的日志写完（进程退出前调用），最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+_json_sink = None
+
+
+def log_stats() -> dict:
+    """日志写出、丢弃、采样丢弃的条数及当前队列长度"""
+    return dict(_stats, queue_size=_json_sink.qsize() if _json_sink else 0)
+
 
 def setup_logger():
     """配置日志器"""
+    global _json_sink
     loguru_logger.remove()
 
+    if LOG_MODE == "json":
+        stream = open(LOG_JSON_PATH, "a", encoding="utf-8") if LOG_JSON_PATH else sys.stdout
+        _json_sink = JsonQueueSink(stream)
+        atexit.register(_json_sink.flush)
+        loguru_logger.configure(patcher=_add_graph_context)
+        loguru_logger.add(_json_sink.write, level=LOG_LEVEL, format="{message}", catch=True)
+        return loguru_logger
+
     # 控制台输出
     loguru_logger.add(
         sys.stdout,
-        level="INFO",
+        level=LOG_LEVEL,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
     )
 
@@ -18,7 +202,7 @@ def setup_logger():
     loguru_logger.add(
         sink=os.path.join(os.getcwd(), "logs/app/{time:YYYYMMDDHH}.log"),
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="INFO",
+        level=LOG_LEVEL,
         encoding="utf-8",
         enqueue=True,
         rotation="10 MB",
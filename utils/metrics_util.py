@@ -0,0 +1,149 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """进程内指标：计数器和直方图，可导出为 Prometheus 文本格式"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [每个桶的计数..., sum, count]
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, metric: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[(metric, _label_key(labels))] += value
+
+    def observe(self, metric: str, value: float, **labels):
+        key = (metric, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def value(self, metric: str, **labels) -> float:
+        return self._counters.get((metric, _label_key(labels)), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            header(name, "histogram")
+            for bound, count in zip(self.buckets, hist):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str):
+        """写入 Prometheus textfile（先写临时文件再替换，避免被读到半截内容）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+class TraceWriter:
+    """JSONL 事件追踪：调用方（常在事件循环上的内联回调中）只把事件放进有界队列，
+    序列化和写盘由后台线程批量完成，每批最多 flush_every 条
+
+    队列满或写盘失败时丢弃事件并计入 dropped；flush() 阻塞到已入队的事件全部写出，在事件循环中应放到线程池执行。
+    """
+
+    def __init__(self, path: str, flush_every: int = 100, maxsize: int = 10000):
+        self.path = path
+        self.flush_every = flush_every
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def write(self, event: dict):
+        if not self.path:
+            return
+        event.setdefault("ts", time.time())
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        if self._thread is not None:
+            self._queue.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.flush_every:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_lines([json.dumps(event, ensure_ascii=False, default=str) for event in batch])
+            except Exception:
+                self.dropped += len(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_lines(self, lines):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
@@ -1,4 +1,5 @@
 import json
+import re
 
 def parse_llm_json(content):
     if isinstance(content, (dict, list)):
@@ -27,4 +28,156 @@ def parse_llm_json(content):
         if end == -1 or end <= start:
             raise
         snippet = text[start:end + 1].strip()
-        return json.loads(snippet)
\ No newline at end of file
+        return json.loads(snippet)
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonStringFieldStream:
+    """从流式输出的 JSON 中增量提取某个字符串字段的值，每次 feed 返回新解码出的文本"""
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buf = ""
+        self._pos = None  # 字段值中下一个待解码字符的位置
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done or not chunk:
+            return ""
+        self._buf += chunk
+        if self._pos is None:
+            match = self._key.search(self._buf)
+            if not match:
+                return ""
+            self._pos = match.end()
+        out = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # 转义符被截断，等下一段
+            esc = buf[i + 1]
+            if esc == 'u':
+                code = int(buf[i + 2:i + 6], 16) if i + 6 <= len(buf) else None
+                if code is not None and 0xD800 <= code < 0xDC00:
+                    # 代理对（如 emoji）需要和下一个 \uXXXX 一起解码
+                    if i + 12 > len(buf):
+                        break
+                    out.append(json.loads('"%s"' % buf[i:i + 12]))
+                    i += 12
+                    continue
+                if code is None:
+                    break
+                out.append(chr(code))
+                i += 6
+            else:
+                out.append(_ESCAPES.get(esc, esc))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+class JsonArrayStream:
+    """增量解析流式输出的 JSON，数组 field 中每个元素一完整就立即产出
+
+    与 parse_llm_json 一样容忍 ``` 代码块和 json 前缀；顶层直接是数组时也按该数组处理。
+    无法解析的元素会被跳过，最终结果仍以完整文本的 parse_llm_json 为准。
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*\[' % re.escape(field))
+        self._buf = ""
+        self._pos = None  # 下一个待扫描字符的位置，None 表示还没找到数组开头
+        self._start = None  # 当前元素的起始位置
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.done = False
+        self.count = 0  # 已产出的元素个数
+
+    def _find_array(self):
+        starts = [i for i in (self._buf.find("{"), self._buf.find("[")) if i != -1]
+        if not starts:
+            return None
+        if self._buf[min(starts)] == "[":
+            return min(starts) + 1
+        match = self._key.search(self._buf)
+        return match.end() if match else None
+
+    def feed(self, chunk: str) -> list:
+        """喂入一段新文本，返回本次新完成的元素列表"""
+        if not chunk:
+            return []
+        self._buf += chunk
+        if self.done:
+            return []
+        if self._pos is None:
+            self._pos = self._find_array()
+            if self._pos is None:
+                return []
+        elements = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        self._emit(i + 1, elements)
+            elif ch == '"':
+                if self._start is None:
+                    self._start = i
+                self._in_string = True
+            elif ch in "{[":
+                if self._start is None:
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # 数组结束
+                    self._emit(i, elements)
+                    self.done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(i + 1, elements)
+            elif ch == ",":
+                if self._depth == 0:
+                    self._emit(i, elements)
+            elif not ch.isspace() and self._start is None:
+                self._start = i  # 数字、true/false/null 等
+            i += 1
+        self._pos = i
+        return elements
+
+    def _emit(self, end: int, elements: list):
+        if self._start is None:
+            return
+        text = self._buf[self._start:end].strip()
+        self._start = None
+        if not text:
+            return
+        try:
+            elements.append(json.loads(text))
+            self.count += 1
+        except ValueError:
+            pass
+
+    @property
+    def text(self) -> str:
+        """目前为止收到的完整文本"""
+        return self._buf
@@ -0,0 +1,78 @@
+import asyncio
+import math
+import re
+import threading
+
+from utils.logger_util import logger
+
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：每个汉字约 1 个 token，其余字符约每 4 个计 1 个 token（tiktoken 不可用时使用）"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class Tokenizer:
+    """本地 token 计数：优先使用 tiktoken 编码，未安装或编码文件加载失败时退化为按字符估算
+
+    tiktoken 的编码（默认 o200k_base）并不是 DeepSeek 的分词器，计数只是对模型实际 token 数的近似，
+    预算应留有余量。编码在第一次使用时才加载（可能需要下载编码文件，离线环境可通过 TIKTOKEN_CACHE_DIR
+    指定本地缓存），只尝试一次；在事件循环中应先 await aload()，避免同步下载阻塞其他会话。
+    """
+
+    def __init__(self, encoding: str = "o200k_base"):
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = encoding == "heuristic"
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken 编码 {self.encoding_name} 不可用，按字符估算 token 数：{e}")
+            self._loaded = True
+
+    async def aload(self):
+        """在线程池中加载编码，已加载时立即返回"""
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+    @property
+    def loaded(self) -> bool:
+        """编码是否已尝试加载；未加载时调用 count() 会同步加载"""
+        return self._loaded
+
+    @property
+    def exact(self) -> bool:
+        """是否使用真实编码计数"""
+        if not self._loaded:
+            self._load()
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if not self._loaded:
+            self._load()
+        if self._encoding is None:
+            return estimate_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int, suffix: str = "...") -> str:
+        """截断到不超过 max_tokens 个 token（含省略号）"""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        # 按比例估计截断位置，再逐步收紧，避免逐字符计数
+        end = len(text) * max_tokens // max(self.count(text), 1)
+        while end > 0 and self.count(text[:end] + suffix) > max_tokens:
+            end = end * 9 // 10
+        return text[:end] + suffix if end > 0 else ""
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+
+class VectorIndex:
+    """NumPy 暴力检索的向量索引，向量需已 L2 归一化，用内积作为余弦相似度
+
+    upsert 先写入缓冲区，攒够 batch_size 条或检索前才合并进矩阵，避免逐条 vstack；
+    同一 id 重复写入时覆盖旧值。
+    """
+
+    def __init__(self, dims: int, batch_size: int = 64):
+        self.dims = dims
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, dims), dtype=np.float32)
+        self._ids = []
+        self._payloads = []
+        self._positions = {}  # id -> 矩阵中的行号
+        self._pending = {}  # id -> (向量, payload)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids) + sum(1 for key in self._pending if key not in self._positions)
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        with self._lock:
+            for key, vector, payload in zip(ids, vectors, payloads):
+                self._pending[key] = (vector, payload)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def delete(self, ids):
+        with self._lock:
+            self._flush()
+            doomed = {self._positions[key] for key in ids if key in self._positions}
+            if not doomed:
+                return
+            keep = [i for i in range(len(self._ids)) if i not in doomed]
+            self._matrix = self._matrix[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._payloads = [self._payloads[i] for i in keep]
+            self._positions = {key: i for i, key in enumerate(self._ids)}
+
+    def items(self):
+        """全部 (id, payload)，用于按 payload 做过期清理等维护"""
+        with self._lock:
+            self._flush()
+            return list(zip(self._ids, self._payloads))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        new_rows = []
+        for key, (vector, payload) in self._pending.items():
+            position = self._positions.get(key)
+            if position is None:
+                self._positions[key] = len(self._ids)
+                self._ids.append(key)
+                self._payloads.append(payload)
+                new_rows.append(vector)
+            else:
+                self._matrix[position] = vector
+                self._payloads[position] = payload
+        if new_rows:
+            self._matrix = np.vstack([self._matrix, np.stack(new_rows)])
+        self._pending.clear()
+
+    def search(self, vectors, k: int = 5, threshold: float = 0.0, where=None):
+        """对每个查询向量返回相似度不低于 threshold 的前 k 条 [(id, 相似度, payload)]，where(payload) 用于过滤"""
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        with self._lock:
+            self._flush()
+            if not self._ids:
+                return [[] for _ in range(len(queries))]
+            scores = queries @ self._matrix.T
+            ids, payloads = self._ids, self._payloads
+        results = []
+        for row in scores:
+            order = np.argsort(-row)
+            hits = []
+            for i in order:
+                score = float(row[i])
+                if score < threshold or len(hits) >= k:
+                    break
+                if where is None or where(payloads[i]):
+                    hits.append((ids[i], score, payloads[i]))
+            results.append(hits)
+        return results